@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Tests for the long-lived microphone capture service
+Run with: python -m pytest scripts/test_audio_capture.py
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+audio_capture = pytest.importorskip("voice.audio_capture")
+from voice.vad import StreamingVAD
+
+RATE = 16000
+CHUNK = 1024
+
+
+class FakeStream:
+    """Input stream that delivers audio to the callback when fed"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.active = False
+        self.closed = False
+
+    def start_stream(self):
+        self.active = True
+
+    def stop_stream(self):
+        self.active = False
+
+    def close(self):
+        self.closed = True
+
+    def is_active(self):
+        return self.active
+
+    def feed(self, samples: np.ndarray):
+        for start in range(0, len(samples), CHUNK):
+            block = samples[start:start + CHUNK]
+            assert self.callback(block.tobytes(), len(block), {}, 0)[1] == audio_capture.pyaudio.paContinue
+
+
+class FakePyAudio:
+    instances = []
+
+    def __init__(self):
+        self.streams = []
+        self.terminated = False
+        self.fail_open = False
+        FakePyAudio.instances.append(self)
+
+    def open(self, **kwargs):
+        assert kwargs['input'] and kwargs['rate'] == RATE
+        if FakePyAudio.fail_open:
+            raise OSError("No input device")
+        self.streams.append(FakeStream(kwargs['stream_callback']))
+        return self.streams[-1]
+
+    def terminate(self):
+        self.terminated = True
+
+
+@pytest.fixture
+def fake_pyaudio(monkeypatch):
+    FakePyAudio.instances = []
+    FakePyAudio.fail_open = False
+    monkeypatch.setattr(audio_capture.pyaudio, 'PyAudio', FakePyAudio)
+    return FakePyAudio
+
+
+def tone(seconds: float, amplitude: float = 3000) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * RATE), dtype=np.int16)
+
+
+def capture_service(**kwargs) -> 'audio_capture.AudioCaptureService':
+    vad = StreamingVAD(rate=RATE, min_rms=300, hangover_ms=300)
+    return audio_capture.AudioCaptureService(rate=RATE, chunk=CHUNK, vad=vad, **kwargs)
+
+
+def test_device_is_opened_once(fake_pyaudio):
+    capture = capture_service()
+    with capture:
+        capture.start()
+        assert capture.is_running
+        assert len(fake_pyaudio.instances) == 1
+        assert len(fake_pyaudio.instances[0].streams) == 1
+        stream = fake_pyaudio.instances[0].streams[0]
+
+    assert not capture.is_running
+    assert stream.closed
+    assert fake_pyaudio.instances[0].terminated
+
+
+def test_failed_open_releases_pyaudio(fake_pyaudio):
+    fake_pyaudio.fail_open = True
+    capture = capture_service()
+    with pytest.raises(OSError):
+        capture.start()
+    assert fake_pyaudio.instances[0].terminated
+    assert not capture.is_running
+
+
+def test_reads_return_buffered_audio(fake_pyaudio):
+    with capture_service() as capture:
+        stream = fake_pyaudio.instances[0].streams[0]
+        samples = tone(0.25)
+        stream.feed(samples)
+
+        assert np.array_equal(capture.read(timeout=1), samples[:CHUNK])
+        assert np.array_equal(capture.read(len(samples) - CHUNK, timeout=1), samples[CHUNK:])
+        # Nothing left: times out with an empty read
+        assert len(capture.read(timeout=0.05)) == 0
+
+
+def test_reads_wait_for_the_callback_thread(fake_pyaudio):
+    with capture_service() as capture:
+        stream = fake_pyaudio.instances[0].streams[0]
+        samples = tone(0.5)
+        feeder = threading.Timer(0.05, stream.feed, args=(samples,))
+        feeder.start()
+        received = capture.read(len(samples), timeout=5)
+        feeder.join()
+        assert np.array_equal(received, samples)
+
+
+def test_utterances_are_cut_by_the_vad(fake_pyaudio):
+    with capture_service() as capture:
+        stream = fake_pyaudio.instances[0].streams[0]
+        stream.feed(np.concatenate([silence(0.5), tone(1.0), silence(1.0), tone(0.6), silence(1.0)]))
+
+        first = capture.next_utterance(timeout=1)
+        second = capture.next_segment(timeout=1)
+        assert first is not None and second is not None
+        assert 1.0 <= len(first) / RATE < 1.8
+        assert 0.6 <= len(second.audio) / RATE < 1.4
+        assert capture.next_utterance(timeout=0.1) is None
+
+
+def test_discard_drops_buffered_audio(fake_pyaudio):
+    with capture_service() as capture:
+        stream = fake_pyaudio.instances[0].streams[0]
+        stream.feed(np.concatenate([silence(0.3), tone(1.0)]))
+        capture.discard()
+        stream.feed(silence(1.0))
+        assert capture.next_utterance(timeout=0.2) is None
+
+
+def test_slow_consumers_lose_the_oldest_audio(fake_pyaudio):
+    with capture_service(buffer_seconds=0.5) as capture:
+        stream = fake_pyaudio.instances[0].streams[0]
+        samples = tone(1.0)
+        stream.feed(samples)
+
+        # Losses are counted when the reader catches up
+        assert np.array_equal(capture.read(RATE // 2, timeout=1), samples[-(RATE // 2):])
+        assert capture.dropped_samples == len(samples) - RATE // 2
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for the voice server's audio codecs and resampling
+Run with: python -m pytest scripts/test_audio_codecs.py
+"""
+
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(__file__))
+audio_codecs = pytest.importorskip("voice.audio_codecs")
+from voice.audio_protocol import ProtocolError, CODEC_PCM16, CODEC_WAV, CODEC_OPUS, CODEC_FLAC
+
+
+def tone(frequency: float, rate: int, seconds: float = 1.0, amplitude: float = 10000) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def relative_rms(samples: np.ndarray, amplitude: float = 10000, edge: int = 200) -> float:
+    core = samples[edge:-edge].astype(np.float64)
+    return float(np.sqrt(np.mean(core ** 2)) / (amplitude / np.sqrt(2)))
+
+
+@pytest.mark.parametrize("from_rate", [44100, 48000])
+def test_downsampling_keeps_speech_band(from_rate):
+    resampled = audio_codecs.resample_pcm16(tone(1000, from_rate), from_rate, 16000)
+    assert len(resampled) == 16000
+    assert relative_rms(resampled) == pytest.approx(1.0, abs=0.02)
+
+
+@pytest.mark.parametrize("from_rate, frequency", [(44100, 10000), (48000, 10000), (48000, 15000)])
+def test_downsampling_does_not_alias(from_rate, frequency):
+    # Above the 8 kHz output Nyquist frequency: filtered out, not folded down
+    resampled = audio_codecs.resample_pcm16(tone(frequency, from_rate), from_rate, 16000)
+    assert relative_rms(resampled) < 0.02
+
+
+def test_upsampling_and_same_rate():
+    samples = tone(440, 16000)
+    assert audio_codecs.resample_pcm16(samples, 16000, 16000) is samples
+    upsampled = audio_codecs.resample_pcm16(samples, 16000, 48000)
+    assert len(upsampled) == 48000
+    assert relative_rms(upsampled) == pytest.approx(1.0, abs=0.02)
+
+
+def wav_bytes(samples: np.ndarray, rate: int) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, rate, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def speech():
+    # Synthesized speech arrives at the TTS engine's rate
+    return tone(440, 22050, seconds=1.2)
+
+
+@pytest.mark.parametrize("codec", [CODEC_FLAC, CODEC_PCM16])
+def test_lossless_chunks_round_trip(speech, codec):
+    chunks = audio_codecs.encode_speech_chunks(wav_bytes(speech, 22050), codec, rate=16000, chunk_ms=500)
+    expected = audio_codecs.resample_pcm16(speech, 22050, 16000)
+
+    decoder = audio_codecs.AudioDecoder(codec, rate=16000)
+    decoded = [decoder.decode(memoryview(chunk)) for chunk in chunks]
+    assert [len(chunk) for chunk in decoded] == [8000, 8000, 3200]
+    assert np.array_equal(np.concatenate(decoded), expected)
+
+
+def test_wav_passes_through_and_decodes_to_stream_rate(speech):
+    wav = wav_bytes(speech, 22050)
+    assert audio_codecs.encode_speech_chunks(wav, CODEC_WAV) == [wav]
+
+    decoded = audio_codecs.AudioDecoder(CODEC_WAV, rate=16000).decode(memoryview(wav))
+    assert np.array_equal(decoded, audio_codecs.resample_pcm16(speech, 22050, 16000))
+
+
+def test_stereo_is_mixed_down():
+    left = tone(440, 16000, amplitude=8000)
+    stereo = np.stack([left, np.zeros_like(left)], axis=1)
+    samples, rate = audio_codecs.decode_wav(wav_bytes(stereo, 16000))
+    assert rate == 16000
+    assert np.abs(samples.astype(np.int32) - left // 2).max() <= 1
+
+
+def test_packets_round_trip_without_copies():
+    packets = [b'', b'a', bytes(range(256)) * 3]
+    payload = memoryview(audio_codecs.pack_packets(packets))
+    unpacked = audio_codecs.unpack_packets(payload)
+    assert [bytes(packet) for packet in unpacked] == packets
+    assert all(isinstance(packet, memoryview) for packet in unpacked)
+
+    for truncated in (payload[:1], payload[:-1]):
+        with pytest.raises(ProtocolError):
+            audio_codecs.unpack_packets(truncated)
+
+
+def test_codec_lookup():
+    assert audio_codecs.codec_id('flac') == CODEC_FLAC
+    assert {'flac', 'pcm16', 'wav'} <= set(audio_codecs.available_codecs())
+    with pytest.raises(ProtocolError):
+        audio_codecs.codec_id('mp3')
+    if 'opus' not in audio_codecs.available_codecs():
+        with pytest.raises(ProtocolError):
+            audio_codecs.codec_id('opus')
+
+
+def test_opus_round_trip(speech):
+    if 'opus' not in audio_codecs.available_codecs():
+        pytest.skip("opuslib or libopus is not installed")
+
+    chunks = audio_codecs.encode_speech_chunks(wav_bytes(speech, 22050), CODEC_OPUS, rate=16000, chunk_ms=500)
+    # 60 packets of 20 ms, 25 per chunk
+    assert [len(audio_codecs.unpack_packets(memoryview(chunk))) for chunk in chunks] == [25, 25, 10]
+
+    decoder = audio_codecs.AudioDecoder(CODEC_OPUS, rate=16000)
+    decoded = np.concatenate([decoder.decode(memoryview(chunk)) for chunk in chunks])
+    assert len(decoded) == 19200
+    # Lossy, but the tone keeps its level
+    assert relative_rms(decoded[:19200]) == pytest.approx(1.0, abs=0.15)
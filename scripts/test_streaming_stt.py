@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming partial and final transcription
+Run with: python -m pytest scripts/test_streaming_stt.py
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+streaming_stt = pytest.importorskip("voice.streaming_stt")
+from voice.vad import StreamingVAD
+
+RATE = 16000
+WORDS = "the quick brown fox jumps over the lazy dog".split()
+
+
+class GrowingEngine:
+    """Fake engine that hears one more word per quarter second of audio"""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe_audio(self, audio, language="en-US"):
+        self.calls.append(len(audio))
+        return ' '.join(WORDS[:int(len(audio) / RATE / 0.25)])
+
+
+class ScriptedEngine:
+    """Fake engine that returns the given hypotheses in turn"""
+
+    def __init__(self, hypotheses):
+        self.hypotheses = list(hypotheses)
+
+    def transcribe_audio(self, audio, language="en-US"):
+        return self.hypotheses.pop(0)
+
+
+def tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (3000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * RATE), dtype=np.int16)
+
+
+def session_for(engine, **kwargs) -> 'streaming_stt.StreamingSTTSession':
+    vad = StreamingVAD(rate=RATE, min_rms=300, hangover_ms=300, pre_roll_ms=0, post_roll_ms=0)
+    return streaming_stt.StreamingSTTSession(engine, rate=RATE, vad=vad, **kwargs)
+
+
+def feed_in_chunks(session, samples: np.ndarray, chunk: int = 1600) -> list:
+    events = []
+    for start in range(0, len(samples), chunk):
+        events.extend(session.feed(samples[start:start + chunk]))
+    return events
+
+
+def test_final_transcript_on_vad_endpoint():
+    engine = GrowingEngine()
+    session = session_for(engine, partial_interval=0.5)
+    events = feed_in_chunks(session, np.concatenate([silence(0.5), tone(2.0), silence(1.0)]))
+
+    partials = [event for event in events if event['type'] == 'partial_transcript']
+    finals = [event for event in events if event['type'] == 'final_transcript']
+    assert len(finals) == 1
+    assert events[-1] is finals[0]
+
+    final = finals[0]
+    assert final['segment_id'] == 0
+    assert final['text'] == ' '.join(WORDS[:int(engine.calls[-1] / RATE / 0.25)])
+    assert final['start_time'] == pytest.approx(0.5, abs=0.1)
+    assert final['end_time'] == pytest.approx(2.5, abs=0.4)
+
+    # Partials grow with the audio and are re-decoded at most every half second
+    assert len(partials) >= 2
+    assert all(event['segment_id'] == 0 for event in partials)
+    texts = [event['text'] for event in partials]
+    assert all(final['text'].startswith(text) for text in texts)
+    assert texts == sorted(texts, key=len)
+    assert all(later - earlier >= RATE // 2 for earlier, later in zip(engine.calls, engine.calls[1:-1]))
+
+
+def test_agreed_words_become_stable():
+    engine = ScriptedEngine(["the quack", "the quick brown", "the quick brown fox",
+                             "the quick brown fox", "the quick brown fox"])
+    # VAD frames make each quarter second add at least 0.24 s of speech
+    session = session_for(engine, partial_interval=0.2, min_partial_seconds=0.2)
+    events = feed_in_chunks(session, tone(1.25), chunk=RATE // 4)
+
+    # The fifth hypothesis changes nothing and produces no event
+    assert not engine.hypotheses
+    assert [(event['stable_text'], event['unstable_text']) for event in events] == [
+        ('', 'the quack'),
+        ('the', 'quick brown'),
+        ('the quick brown', 'fox'),
+        ('the quick brown fox', ''),
+    ]
+    assert events[-1]['text'] == 'the quick brown fox'
+
+
+def test_segments_are_numbered_and_finish_flushes():
+    session = session_for(GrowingEngine())
+    first = feed_in_chunks(session, np.concatenate([tone(1.0), silence(1.0)]))
+    second = feed_in_chunks(session, tone(1.0))
+    flushed = session.finish()
+
+    assert [event['segment_id'] for event in first if event['type'] == 'final_transcript'] == [0]
+    assert all(event['segment_id'] == 1 for event in second)
+    assert [event['type'] for event in flushed] == ['final_transcript']
+    assert flushed[0]['segment_id'] == 1
+    assert flushed[0]['text'].startswith('the quick')
+    assert session.finish() == []
+
+
+def test_engine_lock_is_held_while_transcribing():
+    lock = threading.Lock()
+
+    class LockCheckingEngine(GrowingEngine):
+        def transcribe_audio(self, audio, language="en-US"):
+            assert lock.locked()
+            return super().transcribe_audio(audio, language)
+
+    engine = LockCheckingEngine()
+    session = session_for(engine, engine_lock=lock)
+    feed_in_chunks(session, np.concatenate([tone(1.5), silence(1.0)]))
+    assert engine.calls
+    assert not lock.locked()
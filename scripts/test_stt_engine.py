@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the speech-to-text engine's Whisper options
+Run with: python -m pytest scripts/test_stt_engine.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+torch = pytest.importorskip("torch")
+whisper_model = pytest.importorskip("whisper.model")
+stt_engine = pytest.importorskip("voice.stt_engine")
+
+
+def tiny_whisper():
+    """A randomly initialised Whisper small enough to build in a test"""
+    dims = whisper_model.ModelDimensions(
+        n_mels=80, n_audio_ctx=16, n_audio_state=32, n_audio_head=2, n_audio_layer=1,
+        n_vocab=64, n_text_ctx=8, n_text_state=32, n_text_head=2, n_text_layer=1
+    )
+    torch.manual_seed(0)
+    model = whisper_model.Whisper(dims).eval()
+    # Some parameters (e.g. the decoder's positional embedding) start as
+    # uninitialised memory, which may hold NaNs
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.normal_(0, 0.02)
+    return model
+
+
+def test_int8_quantizes_whisper_linear_layers():
+    model = tiny_whisper()
+    float_layers = sum(type(module) is whisper_model.Linear for module in model.modules())
+    assert float_layers > 0
+
+    quantized = stt_engine.quantize_whisper_int8(model)
+
+    assert not any(type(module) is whisper_model.Linear for module in quantized.modules())
+    quantized_layers = sum(isinstance(module, torch.nn.quantized.dynamic.Linear)
+                           for module in quantized.modules())
+    assert quantized_layers == float_layers
+
+    mel = torch.zeros(1, 80, 32)
+    tokens = torch.zeros(1, 4, dtype=torch.long)
+    with torch.no_grad():
+        assert quantized(mel, tokens).shape == (1, 4, 64)
+
+
+def test_stt_options_from_settings_defaults():
+    assert stt_engine.stt_options_from_settings(None) == {
+        'model_name': 'base', 'device': None, 'compute_type': None
+    }
+    options = stt_engine.stt_options_from_settings(
+        {'whisper_model': 'small', 'device': 'cpu', 'compute_type': 'int8'})
+    assert options == {'model_name': 'small', 'device': 'cpu', 'compute_type': 'int8'}
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Tests for the voice server's worker pool and binary audio protocol
+Run with: python -m pytest scripts/test_voice_server.py
+"""
+
+import asyncio
+import base64
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(__file__))
+voice_server = pytest.importorskip("voice.voice_server")
+from voice.audio_protocol import pack_frame, FRAME_AUDIO_IN, FLAG_FINAL, CODEC_PCM16
+
+RATE = 16000
+
+
+def tone(seconds: float, rate: int = RATE) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    return (3000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+class ExclusiveEngine:
+    """Fake engine that records when two threads are inside it at once"""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+
+    def _enter(self):
+        with self._guard:
+            self.active += 1
+            self.calls += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)  # Widen the window for overlapping calls
+        with self._guard:
+            self.active -= 1
+
+
+class FakeSTTEngine(ExclusiveEngine):
+    def __init__(self):
+        super().__init__()
+        self.lengths = []
+
+    def transcribe_audio(self, audio_array, language="en-US"):
+        self._enter()
+        self.lengths.append(len(audio_array))
+        return "hello there" if len(audio_array) else None
+
+
+class FakeTTSEngine(ExclusiveEngine):
+    def save_to_file(self, text, filename, language="en"):
+        self._enter()
+        sf.write(filename, tone(0.3, 22050), 22050, subtype='PCM_16')
+        return True
+
+
+class FakeWebSocket:
+    """Delivers scripted messages, then stays open until the reply arrives"""
+
+    def __init__(self, messages, done_type="tts_response", timeout=10):
+        self.messages = list(messages)
+        self.sent = []
+        self.done_type = done_type
+        self.timeout = timeout
+        self._done = asyncio.Event()
+
+    async def send(self, data):
+        message = data if isinstance(data, (bytes, bytearray)) else json.loads(data)
+        self.sent.append(message)
+        if isinstance(message, dict) and message.get('type') in (self.done_type, 'error'):
+            self._done.set()
+
+    async def close(self):
+        pass
+
+    def json_messages(self, message_type=None):
+        return [m for m in self.sent
+                if isinstance(m, dict) and (message_type is None or m.get('type') == message_type)]
+
+    def __aiter__(self):
+        return self._messages()
+
+    async def _messages(self):
+        for message in self.messages:
+            yield message
+        await asyncio.wait_for(self._done.wait(), self.timeout)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(voice_server, "STTEngine", lambda **kwargs: FakeSTTEngine())
+    monkeypatch.setattr(voice_server, "TTSEngine", lambda **kwargs: FakeTTSEngine())
+    server = voice_server.VoiceServer(worker_threads=4)
+    server.set_ai_callback(lambda text: f"You said {text}")
+    yield server
+    server.executor.shutdown(wait=True)
+
+
+def audio_message(samples: np.ndarray, final: bool) -> str:
+    return json.dumps({
+        'type': 'audio_chunk',
+        'audio': base64.b64encode(samples.tobytes()).decode('ascii'),
+        'final': final
+    })
+
+
+async def run_clients(server, clients):
+    await asyncio.gather(*(server.handle_client(client) for client in clients))
+
+
+def test_concurrent_clients_take_turns_on_engines(server):
+    speech = np.concatenate([tone(1.5), np.zeros(RATE // 2, dtype=np.int16)])
+    clients = [FakeWebSocket([audio_message(speech, final=True)]) for _ in range(3)]
+
+    asyncio.run(run_clients(server, clients))
+
+    for client in clients:
+        finals = client.json_messages('final_transcript')
+        assert [m['text'] for m in finals] == ["hello there"]
+        assert len(client.json_messages('tts_response')) == 1
+        assert not client.json_messages('error')
+
+    # Every client was transcribed and answered, but never two at once
+    assert server.stt_engine.calls >= len(clients)
+    assert server.stt_engine.max_active == 1
+    assert server.tts_engine.calls == len(clients)
+    assert server.tts_engine.max_active == 1
+
+
+def test_replies_to_departed_clients_are_dropped(server):
+    client = FakeWebSocket([])
+    server.connected_clients.add(client)
+    server.loop = asyncio.new_event_loop()
+    server.loop.close()
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        server.reply(client, {'type': 'ack'})  # Server loop has stopped
+        server.connected_clients.discard(client)
+        server.loop = asyncio.new_event_loop()
+        server.reply(client, {'type': 'ack'})  # Client has gone
+        server.loop.close()
+        gc.collect()
+
+    assert client.sent == []
+    assert not [w for w in caught if issubclass(w.category, RuntimeWarning)]
+
+
+def binary_session(samples: np.ndarray, sample_rate: int, chunk_seconds: float = 0.1):
+    """A hello followed by PCM16 frames at sample_rate, the last one final"""
+    messages = [json.dumps({'type': 'hello', 'binary_audio': True})]
+    chunk = int(chunk_seconds * sample_rate)
+    starts = range(0, len(samples), chunk)
+    for sequence, start in enumerate(starts):
+        flags = FLAG_FINAL if start + chunk >= len(samples) else 0
+        messages.append(pack_frame(FRAME_AUDIO_IN, samples[start:start + chunk].tobytes(), sequence,
+                                   codec=CODEC_PCM16, flags=flags, sample_rate=sample_rate))
+    return messages
+
+
+@pytest.mark.parametrize("sample_rate", [8000, 16000, 48000])
+def test_pcm16_frames_are_resampled_to_the_stt_rate(server, sample_rate):
+    speech = np.concatenate([tone(1.5, sample_rate), np.zeros(sample_rate // 2, dtype=np.int16)])
+    client = FakeWebSocket(binary_session(speech, sample_rate))
+
+    asyncio.run(run_clients(server, [client]))
+
+    assert not client.json_messages('error')
+    finals = client.json_messages('final_transcript')
+    assert len(finals) == 1
+    # 1.5 s of speech stays about 1.5 s long, whatever rate it was sent at
+    assert 1.4 <= finals[0]['end_time'] - finals[0]['start_time'] <= 2.0
+    assert max(server.stt_engine.lengths) <= 2.0 * RATE
+
+
+def test_unsupported_pcm16_sample_rate_is_rejected(server):
+    client = FakeWebSocket(binary_session(tone(0.5, 12345), 12345))
+
+    asyncio.run(run_clients(server, [client]))
+
+    errors = client.json_messages('error')
+    assert errors and "Unsupported PCM16 sample rate: 12345" in errors[0]['message']
+    assert server.stt_engine.calls == 0
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming voice activity detector
+Run with: python -m pytest scripts/test_voice_vad.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'voice'))
+from vad import StreamingVAD
+
+RATE = 16000
+
+
+def tone(seconds: float, amplitude: float) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+@pytest.mark.parametrize("amplitude", [500, 800, 1200])
+def test_speech_at_start_of_clip_is_detected(amplitude):
+    vad = StreamingVAD(rate=RATE, min_rms=300)
+    vad.process(tone(1.0, amplitude))
+    assert vad.in_speech
+
+
+def test_quiet_start_raises_no_speech():
+    rng = np.random.default_rng(0)
+    noise = (rng.standard_normal(RATE) * 40).astype(np.int16)
+    vad = StreamingVAD(rate=RATE, min_rms=300)
+    assert vad.process(noise) == []
+    assert not vad.in_speech
+
+
+@pytest.mark.parametrize("amplitude", [500, 800, 1200])
+def test_detect_voice_activity_on_speech_clip(amplitude):
+    audio_utils = pytest.importorskip("audio_utils")
+    assert audio_utils.AudioUtils.detect_voice_activity(tone(1.0, amplitude))
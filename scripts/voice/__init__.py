@@ -4,7 +4,10 @@ Main entry point for voice functionality
 """
 
 from .audio_utils import AudioUtils
+from .vad import StreamingVAD, SpeechSegment
+from .audio_capture import AudioCaptureService
 from .stt_engine import STTEngine
+from .streaming_stt import StreamingSTTSession
 from .tts_engine import TTSEngine
 from .voice_conversation import VoiceConversationManager
 
@@ -12,7 +15,11 @@ __version__ = "1.0.0"
 __author__ = "OpenClaw Voice Team"
 __all__ = [
     'AudioUtils',
+    'StreamingVAD',
+    'SpeechSegment',
+    'AudioCaptureService',
     'STTEngine', 
+    'StreamingSTTSession',
     'TTSEngine',
     'VoiceConversationManager'
 ]
\ No newline at end of file
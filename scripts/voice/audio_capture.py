@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Audio Capture Service for Voice Communication System
+Keeps one microphone stream open and buffers its audio for consumers
+"""
+
+import threading
+import time
+import collections
+import pyaudio
+import numpy as np
+from typing import Optional, Iterator
+from .audio_utils import AudioUtils
+from .vad import RingBuffer, StreamingVAD, SpeechSegment
+
+
+class AudioCaptureService:
+    """
+    Long-lived microphone capture
+
+    PyAudio delivers audio on its own thread (callback mode) into a ring
+    buffer; consumers pull raw chunks or VAD-cut utterances from it. The
+    device is opened once, so no audio is lost between utterances.
+
+    Usage:
+        with AudioCaptureService() as capture:
+            audio = capture.next_utterance(timeout=10)
+    """
+
+    def __init__(self,
+                 rate: int = AudioUtils.RATE,
+                 chunk: int = AudioUtils.CHUNK,
+                 device_index: Optional[int] = None,
+                 buffer_seconds: float = 30.0,
+                 vad: Optional[StreamingVAD] = None):
+        self.rate = rate
+        self.chunk = chunk
+        self.device_index = device_index
+        self.vad = vad or AudioUtils.create_vad(rate=rate)
+
+        self._buffer = RingBuffer(int(buffer_seconds * rate))
+        self._data_ready = threading.Event()
+        self._pending = collections.deque()
+        self._pyaudio = None
+        self._stream = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._stream is not None and self._stream.is_active()
+
+    @property
+    def dropped_samples(self) -> int:
+        """Samples lost because consumers fell more than buffer_seconds behind"""
+        return self._buffer.dropped
+
+    def start(self):
+        """Open the input device and start capturing"""
+        if self._stream is not None:
+            return
+
+        self._pyaudio = pyaudio.PyAudio()
+        try:
+            self._stream = self._pyaudio.open(
+                format=AudioUtils.FORMAT,
+                channels=AudioUtils.CHANNELS,
+                rate=self.rate,
+                input=True,
+                frames_per_buffer=self.chunk,
+                input_device_index=self.device_index,
+                stream_callback=self._on_audio
+            )
+            self._stream.start_stream()
+        except Exception:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+            self._stream = None
+            raise
+
+    def stop(self):
+        """Stop capturing and release the input device"""
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pyaudio is not None:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+        self._data_ready.set()  # Wake any waiting consumer
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _on_audio(self, in_data, frame_count, time_info, status):
+        # Runs on the PyAudio thread: copy into the ring and return quickly
+        self._buffer.write(np.frombuffer(in_data, dtype=np.int16))
+        self._data_ready.set()
+        return (None, pyaudio.paContinue)
+
+    def read(self, count: Optional[int] = None, timeout: Optional[float] = None) -> np.ndarray:
+        """
+        Pull up to count samples (default one chunk), waiting up to timeout
+        seconds for them to arrive; may return fewer on timeout or stop
+        """
+        count = count or self.chunk
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while len(self._buffer) < count and self.is_running:
+            self._data_ready.clear()
+            if len(self._buffer) >= count:
+                break
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            self._data_ready.wait(remaining)
+
+        return self._buffer.read(count)
+
+    def discard(self):
+        """
+        Drop buffered audio and any utterance in progress, e.g. during
+        playback; like the other read methods, call it only from the
+        consuming thread
+        """
+        self._buffer.clear()
+        self._pending.clear()
+        self.vad.reset()
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        """Yield captured chunks until the service stops"""
+        while self.is_running:
+            chunk = self.read(timeout=0.5)
+            if len(chunk):
+                yield chunk
+
+    def next_utterance(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Wait for the next complete utterance and return its samples, or None
+        if none completes within timeout seconds
+        """
+        segment = self.next_segment(timeout)
+        return segment.audio if segment is not None else None
+
+    def next_segment(self, timeout: Optional[float] = None) -> Optional[SpeechSegment]:
+        """
+        Wait for the next complete utterance as a SpeechSegment
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while not self._pending:
+            if not self.is_running:
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            wait = 0.5 if remaining is None else min(0.5, remaining)
+            chunk = self.read(timeout=wait)
+            if len(chunk):
+                self._pending.extend(self.vad.process(chunk))
+
+        return self._pending.popleft()
+
+    def utterances(self) -> Iterator[SpeechSegment]:
+        """Yield utterances until the service stops"""
+        while self.is_running or self._pending:
+            segment = self.next_segment(timeout=0.5)
+            if segment is not None:
+                yield segment
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Audio Codecs for the Voice Server
+Decodes compressed client audio and encodes speech in streamable chunks
+"""
+
+import io
+import struct
+import numpy as np
+import soundfile as sf
+from typing import List
+from .audio_protocol import (
+    ProtocolError, pcm16_from_payload, CODEC_PCM16, CODEC_WAV, CODEC_OPUS, CODEC_FLAC, CODEC_NAMES
+)
+
+# Sample rates Opus accepts; speech is resampled to the stream rate first
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_FRAME_MS = 20
+OPUS_BITRATE = 24000  # Plenty for mono speech, ~1/10 of 16 kHz PCM16
+
+# Outgoing speech is split into frames of about this length
+STREAM_CHUNK_MS = 500
+
+# Anti-aliasing filter for downsampling: the passband ends at this fraction
+# of the output Nyquist frequency, and the filter is 2 * this / ratio taps
+# long, so e.g. 48 kHz to 16 kHz uses 97 taps
+RESAMPLE_CUTOFF = 0.9
+RESAMPLE_FILTER_TAPS_PER_RATIO = 16
+
+# Opus packets are not self-delimiting, so a frame payload holds one or more
+# packets, each prefixed with its length
+_PACKET_LENGTH = struct.Struct('<H')
+
+
+_opuslib = None
+_opuslib_checked = False
+
+
+def _load_opuslib():
+    # Imported lazily and once; opuslib raises a bare Exception when the
+    # libopus shared library is missing
+    global _opuslib, _opuslib_checked
+    if not _opuslib_checked:
+        _opuslib_checked = True
+        try:
+            import opuslib
+            _opuslib = opuslib
+        except Exception:
+            _opuslib = None
+    return _opuslib
+
+
+def available_codecs() -> List[str]:
+    """Names of the codecs usable in this environment"""
+    codecs = [CODEC_NAMES[CODEC_PCM16], CODEC_NAMES[CODEC_WAV], CODEC_NAMES[CODEC_FLAC]]
+    if _load_opuslib() is not None:
+        codecs.append(CODEC_NAMES[CODEC_OPUS])
+    return sorted(codecs)
+
+
+def codec_id(name: str) -> int:
+    """Look up a codec id by name, rejecting codecs that are unavailable here"""
+    for codec, codec_name in CODEC_NAMES.items():
+        if codec_name == name:
+            if name not in available_codecs():
+                raise ProtocolError(f"Codec not available on this server: {name}")
+            return codec
+    raise ProtocolError(f"Unknown codec: {name}. Valid: {', '.join(available_codecs())}")
+
+
+def _lowpass_kernel(ratio: float) -> np.ndarray:
+    """
+    Blackman-windowed sinc low-pass filter passing frequencies below ratio
+    times the input Nyquist frequency (with a margin for the transition band)
+    """
+    taps = 2 * int(np.ceil(RESAMPLE_FILTER_TAPS_PER_RATIO / ratio)) + 1
+    cutoff = RESAMPLE_CUTOFF * ratio
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = cutoff * np.sinc(cutoff * n) * np.blackman(taps)
+    return kernel / kernel.sum()
+
+
+def resample_pcm16(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """
+    Resample int16 samples by linear interpolation; when downsampling, the
+    signal is low-pass filtered first so content above the new Nyquist
+    frequency is removed instead of aliasing into the speech band
+    """
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    signal = samples.astype(np.float32)
+    if to_rate < from_rate:
+        signal = np.convolve(signal, _lowpass_kernel(to_rate / from_rate), mode='same')
+    count = int(round(len(samples) * to_rate / from_rate))
+    positions = np.arange(count) * (from_rate / to_rate)
+    resampled = np.interp(positions, np.arange(len(samples)), signal)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+def decode_wav(wav_bytes: bytes) -> tuple:
+    """Decode a WAV (or any soundfile-readable) file to mono int16 samples and rate"""
+    samples, rate = sf.read(io.BytesIO(wav_bytes), dtype='int16', always_2d=True)
+    if samples.shape[1] > 1:
+        samples = samples.mean(axis=1).astype(np.int16)
+    else:
+        samples = samples[:, 0]
+    return samples, rate
+
+
+def encode_flac(samples: np.ndarray, rate: int) -> bytes:
+    """Encode int16 samples as a complete FLAC file"""
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, rate, format='FLAC', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+def pack_packets(packets: List[bytes]) -> bytes:
+    """Join Opus packets into one frame payload"""
+    parts = []
+    for packet in packets:
+        parts.append(_PACKET_LENGTH.pack(len(packet)))
+        parts.append(packet)
+    return b''.join(parts)
+
+
+def unpack_packets(payload: memoryview) -> List[memoryview]:
+    """Split a frame payload back into Opus packets (views, no copies)"""
+    packets = []
+    offset = 0
+    while offset < len(payload):
+        if offset + _PACKET_LENGTH.size > len(payload):
+            raise ProtocolError("Truncated Opus packet length")
+        (length,) = _PACKET_LENGTH.unpack_from(payload, offset)
+        offset += _PACKET_LENGTH.size
+        if offset + length > len(payload):
+            raise ProtocolError("Truncated Opus packet")
+        packets.append(payload[offset:offset + length])
+        offset += length
+    return packets
+
+
+class OpusDecoder:
+    """Stateful Opus decoder for one client's stream"""
+
+    def __init__(self, rate: int = 16000, channels: int = 1):
+        opuslib = _load_opuslib()
+        if opuslib is None:
+            raise ImportError("Opus support requires opuslib: pip install opuslib")
+        if rate not in OPUS_SAMPLE_RATES:
+            raise ValueError(f"Opus does not support {rate} Hz. Valid: {OPUS_SAMPLE_RATES}")
+        self.rate = rate
+        self.channels = channels
+        self.max_frame_size = rate * 120 // 1000  # Longest Opus packet is 120 ms
+        self._decoder = opuslib.Decoder(rate, channels)
+
+    def decode(self, payload: memoryview) -> np.ndarray:
+        """Decode a frame payload of length-prefixed packets to int16 samples"""
+        pcm = [self._decoder.decode(bytes(packet), self.max_frame_size)
+               for packet in unpack_packets(payload)]
+        return np.frombuffer(b''.join(pcm), dtype='<i2')
+
+
+class OpusEncoder:
+    """Opus encoder producing fixed-length packets from int16 samples"""
+
+    def __init__(self, rate: int = 16000, channels: int = 1, frame_ms: int = OPUS_FRAME_MS,
+                 bitrate: int = OPUS_BITRATE):
+        opuslib = _load_opuslib()
+        if opuslib is None:
+            raise ImportError("Opus support requires opuslib: pip install opuslib")
+        if rate not in OPUS_SAMPLE_RATES:
+            raise ValueError(f"Opus does not support {rate} Hz. Valid: {OPUS_SAMPLE_RATES}")
+        self.rate = rate
+        self.frame_size = rate * frame_ms // 1000
+        self._encoder = opuslib.Encoder(rate, channels, opuslib.APPLICATION_VOIP)
+        self._encoder.bitrate = bitrate
+
+    def encode(self, samples: np.ndarray) -> List[bytes]:
+        """Encode samples, zero-padding the last packet"""
+        remainder = len(samples) % self.frame_size
+        if remainder:
+            samples = np.concatenate([samples, np.zeros(self.frame_size - remainder, dtype=np.int16)])
+        samples = np.ascontiguousarray(samples, dtype='<i2')
+        return [self._encoder.encode(samples[start:start + self.frame_size].tobytes(), self.frame_size)
+                for start in range(0, len(samples), self.frame_size)]
+
+
+class AudioDecoder:
+    """Turns incoming frame payloads of one codec into int16 samples"""
+
+    def __init__(self, codec: int, rate: int = 16000):
+        self.codec = codec
+        self.rate = rate
+        self._opus = OpusDecoder(rate) if codec == CODEC_OPUS else None
+
+    def decode(self, payload: memoryview) -> np.ndarray:
+        if self.codec == CODEC_PCM16:
+            return pcm16_from_payload(payload)
+        if self.codec == CODEC_OPUS:
+            return self._opus.decode(payload)
+        if self.codec in (CODEC_FLAC, CODEC_WAV):
+            samples, rate = decode_wav(bytes(payload))
+            return resample_pcm16(samples, rate, self.rate)
+        raise ProtocolError(f"Unsupported codec: {self.codec}")
+
+
+def encode_speech_chunks(wav_bytes: bytes, codec: int, rate: int = 16000,
+                         chunk_ms: int = STREAM_CHUNK_MS) -> List[bytes]:
+    """
+    Re-encode a synthesized WAV file as a list of frame payloads that can be
+    played as they arrive: Opus packet groups, standalone FLAC files or raw
+    PCM16, each covering about chunk_ms of audio. WAV is passed through whole.
+    """
+    if codec == CODEC_WAV:
+        return [wav_bytes]
+
+    samples, source_rate = decode_wav(wav_bytes)
+    samples = resample_pcm16(samples, source_rate, rate)
+    chunk_samples = max(1, rate * chunk_ms // 1000)
+
+    if codec == CODEC_OPUS:
+        encoder = OpusEncoder(rate)
+        packets = encoder.encode(samples)
+        per_chunk = max(1, chunk_ms // OPUS_FRAME_MS)
+        return [pack_packets(packets[start:start + per_chunk])
+                for start in range(0, len(packets), per_chunk)]
+
+    chunks = [samples[start:start + chunk_samples] for start in range(0, len(samples), chunk_samples)]
+    if codec == CODEC_FLAC:
+        return [encode_flac(chunk, rate) for chunk in chunks]
+    if codec == CODEC_PCM16:
+        return [chunk.astype('<i2').tobytes() for chunk in chunks]
+    raise ProtocolError(f"Unsupported codec: {codec}")
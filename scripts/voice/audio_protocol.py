@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Binary Audio Frame Protocol for the Voice Server
+Raw audio travels in binary WebSocket messages next to the JSON control messages
+"""
+
+import struct
+import numpy as np
+from typing import Tuple, Dict, Any, Union, List
+
+# Header layout (little-endian, 12 bytes):
+#   magic        2s  b'VA'
+#   version      B   PROTOCOL_VERSION
+#   frame_type   B   FRAME_AUDIO_IN / FRAME_AUDIO_OUT
+#   codec        B   CODEC_* id of the payload encoding
+#   flags        B   FLAG_* bits
+#   sample_rate  H   Hz (0 when the payload carries its own, e.g. WAV);
+#                    PCM16 input at any of PCM16_SAMPLE_RATES is resampled
+#   sequence     I   per-direction frame counter
+FRAME_HEADER = struct.Struct('<2sBBBBHI')
+FRAME_MAGIC = b'VA'
+PROTOCOL_VERSION = 1
+
+FRAME_AUDIO_IN = 1  # Client microphone audio
+FRAME_AUDIO_OUT = 2  # Server speech audio
+
+FLAG_FINAL = 0x01  # Last frame of an utterance (in) or of a response (out)
+
+# Rates accepted for raw PCM16 input
+PCM16_SAMPLE_RATES = (8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000)
+
+CODEC_PCM16 = 0  # Raw little-endian int16 samples
+CODEC_WAV = 1  # Complete WAV file
+CODEC_OPUS = 2  # Length-prefixed Opus packets (see audio_codecs)
+CODEC_FLAC = 3  # Complete FLAC file
+CODEC_NAMES = {
+    CODEC_PCM16: 'pcm16',
+    CODEC_WAV: 'wav',
+    CODEC_OPUS: 'opus',
+    CODEC_FLAC: 'flac',
+}
+
+
+class ProtocolError(ValueError):
+    """A binary frame that does not follow the protocol"""
+
+
+def pack_frame(frame_type: int, payload: Union[bytes, bytearray, memoryview], sequence: int,
+               codec: int = CODEC_PCM16, flags: int = 0, sample_rate: int = 16000) -> bytes:
+    """Build a binary frame: header followed by the payload"""
+    header = FRAME_HEADER.pack(FRAME_MAGIC, PROTOCOL_VERSION, frame_type, codec, flags,
+                               sample_rate, sequence & 0xFFFFFFFF)
+    return b''.join((header, payload))
+
+
+def parse_frame(message: Union[bytes, bytearray, memoryview]) -> Tuple[Dict[str, Any], memoryview]:
+    """
+    Split a binary frame into its header fields and a memoryview of the
+    payload (no copy)
+    """
+    view = memoryview(message)
+    if len(view) < FRAME_HEADER.size:
+        raise ProtocolError(f"Frame too short: {len(view)} bytes")
+
+    magic, version, frame_type, codec, flags, sample_rate, sequence = FRAME_HEADER.unpack_from(view)
+    if magic != FRAME_MAGIC:
+        raise ProtocolError("Bad frame magic")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version: {version}")
+
+    header = {
+        'frame_type': frame_type,
+        'codec': codec,
+        'final': bool(flags & FLAG_FINAL),
+        'sample_rate': sample_rate,
+        'sequence': sequence
+    }
+    return header, view[FRAME_HEADER.size:]
+
+
+def pcm16_from_payload(payload: memoryview) -> np.ndarray:
+    """View a PCM16 payload as an int16 array without copying it"""
+    if len(payload) % 2:
+        raise ProtocolError("PCM16 payload has an odd number of bytes")
+    return np.frombuffer(payload, dtype='<i2')
+
+
+def hello_response(binary_audio: bool, codecs: List[str], input_codec: int = CODEC_PCM16,
+                   output_codec: int = CODEC_WAV) -> Dict[str, Any]:
+    """The server's answer to a client's hello message"""
+    return {
+        'type': 'hello_ack',
+        'protocol_version': PROTOCOL_VERSION,
+        'binary_audio': binary_audio,
+        'frame_header': {
+            'format': FRAME_HEADER.format,
+            'size': FRAME_HEADER.size,
+            'magic': FRAME_MAGIC.decode('ascii')
+        },
+        'codecs': codecs,
+        'pcm16_sample_rates': list(PCM16_SAMPLE_RATES),
+        'input_codec': CODEC_NAMES[input_codec],
+        'output_codec': CODEC_NAMES[output_codec]
+    }
@@ -8,9 +8,16 @@ import wave
 import pyaudio
 import numpy as np
 import soundfile as sf
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Iterable, Iterator
 import io
 
+# audio_utils is imported both as part of the package and as a top-level
+# module by the setup/demo scripts
+try:
+    from .vad import StreamingVAD, SpeechSegment
+except ImportError:
+    from vad import StreamingVAD, SpeechSegment
+
 
 class AudioUtils:
     """Utility class for common audio operations"""
@@ -55,11 +62,28 @@ class AudioUtils:
         
         return audio_array
     
+    @staticmethod
+    def create_vad(silence_threshold: int = 300, silence_duration: float = 1.0,
+                   rate: int = RATE, **kwargs) -> StreamingVAD:
+        """
+        Create a streaming VAD; silence_threshold is the minimum RMS treated
+        as speech and silence_duration the pause that ends an utterance
+        """
+        return StreamingVAD(rate=rate, min_rms=silence_threshold,
+                            hangover_ms=int(silence_duration * 1000), **kwargs)
+    
+    @staticmethod
+    def iter_utterances(chunks: Iterable[np.ndarray], vad: Optional[StreamingVAD] = None) -> Iterator[SpeechSegment]:
+        """Yield utterance segments from a stream of int16 chunks"""
+        vad = vad or AudioUtils.create_vad()
+        return vad.segments(chunks)
+    
     @staticmethod
     def record_until_silence(max_duration: int = 10, silence_threshold: int = 300, 
                            silence_duration: float = 1.0) -> np.ndarray:
         """
-        Record audio until a period of silence is detected
+        Record one utterance: waits for speech, then stops after a period of
+        silence. Returns an empty array if no speech starts within max_duration.
         """
         p = pyaudio.PyAudio()
         
@@ -71,38 +95,29 @@ class AudioUtils:
             frames_per_buffer=AudioUtils.CHUNK
         )
         
-        frames = []
-        silent_chunks = 0
-        max_silent_chunks = int(silence_duration * AudioUtils.RATE / AudioUtils.CHUNK)
+        vad = AudioUtils.create_vad(silence_threshold, silence_duration,
+                                    max_segment_seconds=max_duration)
+        segment = None
         total_chunks = 0
         max_chunks = int(max_duration * AudioUtils.RATE / AudioUtils.CHUNK)
         
-        while total_chunks < max_chunks:
-            data = stream.read(AudioUtils.CHUNK)
-            frames.append(data)
-            
-            # Convert to numpy to check amplitude
-            audio_chunk = np.frombuffer(data, dtype=np.int16)
-            amplitude = np.abs(audio_chunk).mean()
-            
-            if amplitude < silence_threshold:
-                silent_chunks += 1
-                if silent_chunks >= max_silent_chunks:
-                    break  # Stop recording after period of silence
-            else:
-                silent_chunks = 0  # Reset counter when voice detected
-            
-            total_chunks += 1
-        
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+        try:
+            while total_chunks < max_chunks and segment is None:
+                data = stream.read(AudioUtils.CHUNK)
+                # frombuffer wraps the bytes without copying
+                segments = vad.process(np.frombuffer(data, dtype=np.int16))
+                if segments:
+                    segment = segments[0]
+                total_chunks += 1
+        finally:
+            stream.stop_stream()
+            stream.close()
+            p.terminate()
         
-        # Convert byte frames to numpy array
-        audio_data = b''.join(frames)
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
+        if segment is None:
+            segment = vad.flush()
         
-        return audio_array
+        return segment.audio if segment is not None else np.zeros(0, dtype=np.int16)
     
     @staticmethod
     def save_wav(audio_array: np.ndarray, filename: str, rate: int = 16000):
@@ -121,8 +136,8 @@ class AudioUtils:
     @staticmethod
     def detect_voice_activity(audio_array: np.ndarray, threshold: int = 300) -> bool:
         """Detect if voice is present in audio array"""
-        avg_amplitude = np.abs(audio_array).mean()
-        return avg_amplitude > threshold
+        vad = AudioUtils.create_vad(threshold)
+        return bool(vad.process(audio_array)) or vad.in_speech
     
     @staticmethod
     def audio_to_bytesio(audio_array: np.ndarray, rate: int = 16000) -> io.BytesIO:
@@ -35,7 +35,8 @@ def main():
         "pyttsx3",           # For text-to-speech
         "pygame",            # For audio playback
         "websockets",        # For WebSocket server (if using voice server)
-        "openai-whisper"     # For local speech recognition
+        "openai-whisper",    # For local speech recognition
+        "opuslib"            # For Opus audio streaming (needs libopus)
     ]
     
     print("\nInstalling required packages...")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Streaming Speech-to-Text for Voice Communication System
+Turns a live audio stream into partial and final transcripts
+"""
+
+import contextlib
+import numpy as np
+from typing import Optional, List, Dict, Any
+from .audio_utils import AudioUtils
+from .vad import StreamingVAD
+
+
+class StreamingSTTSession:
+    """
+    Incremental transcription of one audio stream
+
+    Audio is fed in arbitrary chunks. The VAD tracks the utterance in
+    progress; every partial_interval seconds of new speech the utterance so
+    far is re-transcribed and a partial_transcript event is produced. Words
+    that two consecutive hypotheses agree on are committed as stable and
+    never retracted (local agreement), so clients can render them
+    immediately. When the VAD detects the end of the utterance, or it reaches
+    window_seconds, the whole segment is transcribed once more and a
+    final_transcript event is produced. Pass engine_lock when the engine is
+    shared with sessions on other threads.
+
+    Usage:
+        session = StreamingSTTSession(stt_engine)
+        for event in session.feed(samples):
+            send(event)
+    """
+
+    def __init__(self,
+                 stt_engine,
+                 language: str = "en-US",
+                 rate: int = AudioUtils.RATE,
+                 partial_interval: float = 0.5,
+                 min_partial_seconds: float = 0.5,
+                 window_seconds: float = 20.0,
+                 vad: Optional[StreamingVAD] = None,
+                 engine_lock=None):
+        self.stt_engine = stt_engine
+        self.engine_lock = engine_lock if engine_lock is not None else contextlib.nullcontext()
+        self.language = language
+        self.rate = rate
+        self.partial_samples = int(partial_interval * rate)
+        self.min_partial_samples = int(min_partial_seconds * rate)
+        self.vad = vad or AudioUtils.create_vad(silence_duration=0.6, rate=rate,
+                                                max_segment_seconds=window_seconds)
+
+        self.segment_id = 0
+        self._reset_hypotheses()
+
+    def _reset_hypotheses(self):
+        self._decoded_samples = 0
+        self._previous_words = []
+        self._stable_words = []
+        self._last_partial = None
+
+    def _transcribe(self, audio: np.ndarray) -> Optional[str]:
+        with self.engine_lock:
+            return self.stt_engine.transcribe_audio(audio, language=self.language)
+
+    def _agree(self, words: List[str]) -> List[str]:
+        # Commit the longest prefix shared with the previous hypothesis
+        agreed = 0
+        for previous, current in zip(self._previous_words, words):
+            if previous != current:
+                break
+            agreed += 1
+        if agreed > len(self._stable_words):
+            self._stable_words = words[:agreed]
+        self._previous_words = words
+        return words[len(self._stable_words):]
+
+    def _partial_event(self) -> Optional[Dict[str, Any]]:
+        audio = self.vad.current_audio()
+        if (len(audio) < self.min_partial_samples or
+                len(audio) - self._decoded_samples < self.partial_samples):
+            return None
+        self._decoded_samples = len(audio)
+
+        text = self._transcribe(audio)
+        if text is None:
+            return None
+
+        unstable = self._agree(text.split())
+        stable_text = ' '.join(self._stable_words)
+        unstable_text = ' '.join(unstable)
+        if (stable_text, unstable_text) == self._last_partial:
+            return None
+        self._last_partial = (stable_text, unstable_text)
+
+        return {
+            'type': 'partial_transcript',
+            'segment_id': self.segment_id,
+            'text': ' '.join(filter(None, (stable_text, unstable_text))),
+            'stable_text': stable_text,
+            'unstable_text': unstable_text
+        }
+
+    def _final_event(self, segment) -> Dict[str, Any]:
+        text = self._transcribe(segment.audio)
+        event = {
+            'type': 'final_transcript',
+            'segment_id': self.segment_id,
+            'text': (text or '').strip(),
+            'start_time': round(segment.start_time, 3),
+            'end_time': round(segment.end_time, 3)
+        }
+        self.segment_id += 1
+        self._reset_hypotheses()
+        return event
+
+    def feed(self, samples: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Add int16 samples and return the transcript events they produced
+        """
+        events = [self._final_event(segment) for segment in self.vad.process(samples)]
+
+        if self.vad.in_speech:
+            partial = self._partial_event()
+            if partial is not None:
+                events.append(partial)
+        return events
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        End the stream, finalizing the utterance in progress if any
+        """
+        segment = self.vad.flush()
+        if segment is None:
+            self._reset_hypotheses()
+            return []
+        return [self._final_event(segment)]
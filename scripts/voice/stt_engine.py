@@ -7,21 +7,72 @@ Handles converting spoken words to text
 import speech_recognition as sr
 import numpy as np
 from typing import Optional, Dict, Any
-import tempfile
-import os
 import io
 from .audio_utils import AudioUtils
 
 
+# Whisper precision options: fp16 needs a GPU, int8 applies dynamic
+# quantization to the linear layers for faster CPU inference. Without an
+# explicit choice, CUDA devices use fp16 and CPUs fp32.
+WHISPER_COMPUTE_TYPES = ("fp32", "fp16", "int8")
+
+
+def stt_options_from_settings(stt_settings: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Map the stt_settings section of voice_config.json to STTEngine arguments
+    """
+    stt_settings = stt_settings or {}
+    return {
+        'model_name': stt_settings.get('whisper_model') or 'base',
+        'device': stt_settings.get('device'),
+        'compute_type': stt_settings.get('compute_type')
+    }
+
+
+def quantize_whisper_int8(model):
+    """
+    Apply dynamic int8 quantization to a Whisper model's linear layers
+
+    quantize_dynamic only converts modules whose type is exactly
+    torch.nn.Linear, and Whisper's layers are whisper.model.Linear, a
+    subclass that only casts weights to the input dtype. For an fp32 CPU
+    model that cast is a no-op, so the layers are rebound to torch.nn.Linear
+    first. Raises RuntimeError if no layer was quantized.
+    """
+    import torch
+    import whisper.model
+    
+    whisper_linear = getattr(whisper.model, 'Linear', None)
+    for module in model.modules():
+        if whisper_linear is not None and type(module) is whisper_linear:
+            module.__class__ = torch.nn.Linear
+    
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    count = sum(isinstance(module, torch.nn.quantized.dynamic.Linear) for module in quantized.modules())
+    if count == 0:
+        raise RuntimeError("int8 quantization did not convert any Whisper linear layers")
+    return quantized
+
+
 class STTEngine:
     """Speech-to-Text engine with multiple backend support"""
     
-    def __init__(self, engine_type: str = "whisper"):
+    def __init__(self, engine_type: str = "whisper", model_name: str = "base",
+                 device: Optional[str] = None, compute_type: Optional[str] = None):
         """
         Initialize STT engine
         engine_type: "whisper", "google", "sphinx", "wit", "azure", "houndify", "ibm"
+        model_name: Whisper model ("tiny", "base", "small", "medium", "large", ...)
+        device: Whisper device ("cpu", "cuda"); defaults to CUDA when available
+        compute_type: Whisper precision, one of WHISPER_COMPUTE_TYPES; defaults
+                      to fp16 on CUDA and fp32 otherwise
         """
+        if compute_type is not None and compute_type not in WHISPER_COMPUTE_TYPES:
+            raise ValueError(f"Unknown compute_type: {compute_type}. Valid: {', '.join(WHISPER_COMPUTE_TYPES)}")
+        
         self.engine_type = engine_type
+        self.model_name = model_name
+        self.compute_type = compute_type
         self.recognizer = sr.Recognizer()
         
         # Adjust for ambient noise
@@ -32,9 +83,22 @@ class STTEngine:
         if engine_type == "whisper":
             try:
                 import whisper
-                self.whisper_model = whisper.load_model("base")
+                import torch
             except ImportError:
                 raise ImportError("Please install openai-whisper: pip install openai-whisper")
+            
+            self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+            if compute_type is None:
+                compute_type = "fp16" if self.device.startswith("cuda") else "fp32"
+                self.compute_type = compute_type
+            if compute_type == "fp16" and self.device == "cpu":
+                raise ValueError("fp16 Whisper inference requires a CUDA device")
+            if compute_type == "int8" and self.device != "cpu":
+                raise ValueError("int8 Whisper inference is only supported on CPU")
+            
+            self.whisper_model = whisper.load_model(model_name, device=self.device)
+            if compute_type == "int8":
+                self.whisper_model = quantize_whisper_int8(self.whisper_model)
         elif engine_type == "google":
             # Google requires internet connection
             pass
@@ -47,12 +111,14 @@ class STTEngine:
         Transcribe audio array to text
         """
         try:
+            if self.engine_type == "whisper":
+                # Whisper takes samples directly; no WAV encoding or temp file
+                return self._transcribe_with_whisper(self._to_float32(audio_array), language)
+            
             # Convert numpy array to AudioData object
             audio_data = self._numpy_to_audio_data(audio_array, AudioUtils.RATE)
             
-            if self.engine_type == "whisper":
-                return self._transcribe_with_whisper(audio_data, language)
-            elif self.engine_type == "google":
+            if self.engine_type == "google":
                 return self._transcribe_with_google(audio_data, language)
             elif self.engine_type == "sphinx":
                 return self._transcribe_with_sphinx(audio_data, language)
@@ -89,23 +155,28 @@ class STTEngine:
         
         return audio_data
     
-    def _transcribe_with_whisper(self, audio_data: sr.AudioData, language: str) -> Optional[str]:
+    @staticmethod
+    def _to_float32(audio_array: np.ndarray) -> np.ndarray:
         """
-        Transcribe using OpenAI Whisper (offline/local)
+        Convert 16 kHz samples to the float32 [-1, 1) range Whisper expects
+        """
+        if audio_array.dtype == np.float32:
+            return audio_array
+        if audio_array.dtype == np.int16:
+            return audio_array.astype(np.float32) / 32768.0
+        return audio_array.astype(np.float32)
+    
+    def _transcribe_with_whisper(self, audio: np.ndarray, language: str) -> Optional[str]:
+        """
+        Transcribe float32 16 kHz samples using OpenAI Whisper (offline/local)
         """
         try:
-            # Save audio to temporary file for Whisper
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                tmp_file.write(audio_data.get_wav_data())
-                temp_filename = tmp_file.name
-            
-            try:
-                # Transcribe with Whisper
-                result = self.whisper_model.transcribe(temp_filename, language=language[:2])
-                return result["text"].strip()
-            finally:
-                # Clean up temp file
-                os.unlink(temp_filename)
+            result = self.whisper_model.transcribe(
+                audio,
+                language=language[:2],
+                fp16=self.compute_type == "fp16"
+            )
+            return result["text"].strip()
         
         except Exception as e:
             print(f"Whisper transcription error: {str(e)}")
@@ -147,7 +218,8 @@ class STTEngine:
             
             if self.engine_type == "whisper":
                 # For file-based transcription with Whisper, use the file directly
-                result = self.whisper_model.transcribe(audio_file_path, language=language[:2])
+                result = self.whisper_model.transcribe(audio_file_path, language=language[:2],
+                                                       fp16=self.compute_type == "fp16")
                 return result["text"].strip()
             elif self.engine_type == "google":
                 return self.recognizer.recognize_google(audio_data, language=language)
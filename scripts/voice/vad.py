@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Streaming Voice Activity Detection for Voice Communication System
+Classifies fixed-size frames as speech or silence and cuts utterances
+"""
+
+import numpy as np
+from typing import Optional, List, Iterable, Iterator
+
+
+class RingBuffer:
+    """
+    Fixed-capacity int16 sample buffer allocated once
+
+    Safe without locks for one writer thread and one reader thread: the
+    writer only advances the write position and the reader only the read
+    position. When the writer laps the reader, the oldest samples are lost
+    and counted in dropped.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self._write = 0  # Total samples ever written
+        self._read = 0  # Total samples ever consumed
+        self.dropped = 0  # Samples overwritten before they were read
+
+    def __len__(self) -> int:
+        return min(self._write - self._read, self.capacity)
+
+    def write(self, samples: np.ndarray):
+        """Append samples, overwriting the oldest ones when full"""
+        position = self._write
+        count = len(samples)
+        if count > self.capacity:
+            position += count - self.capacity
+            samples = samples[count - self.capacity:]
+            count = self.capacity
+
+        start = position % self.capacity
+        first = min(count, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[:count - first] = samples[first:]
+        # Publish only after the samples are in place
+        self._write = position + count
+
+    def _copy(self, begin: int, count: int) -> np.ndarray:
+        start = begin % self.capacity
+        first = min(count, self.capacity - start)
+        out = np.empty(count, dtype=np.int16)
+        out[:first] = self._data[start:start + first]
+        out[first:] = self._data[:count - first]
+        return out
+
+    def read(self, count: Optional[int] = None) -> np.ndarray:
+        """Consume up to count of the oldest samples (all by default)"""
+        written = self._write
+        begin = max(self._read, written - self.capacity)
+        self.dropped += begin - self._read
+        available = written - begin
+        count = available if count is None else min(count, available)
+        out = self._copy(begin, count)
+
+        # Discard anything the writer overwrote while we were copying
+        overwritten = self._write - self.capacity - begin
+        if overwritten > 0:
+            self.dropped += min(overwritten, count)
+            out = out[overwritten:]
+        self._read = begin + count
+        return out
+
+    def peek_latest(self, count: int) -> np.ndarray:
+        """Copy up to count of the newest samples without consuming them"""
+        written = self._write
+        count = min(count, len(self))
+        return self._copy(written - count, count)
+
+    def clear(self):
+        """Discard everything written so far (reader side)"""
+        self._read = self._write
+
+
+class SpeechSegment:
+    """An utterance cut by the VAD, with times relative to the start of the stream"""
+
+    def __init__(self, audio: np.ndarray, start_time: float, end_time: float, truncated: bool = False):
+        self.audio = audio
+        self.start_time = start_time
+        self.end_time = end_time
+        self.truncated = truncated  # Cut at max_segment_seconds rather than at silence
+
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time
+
+    def __repr__(self) -> str:
+        return f"SpeechSegment({self.start_time:.2f}s-{self.end_time:.2f}s, {len(self.audio)} samples)"
+
+
+class StreamingVAD:
+    """
+    Energy + zero-crossing voice activity detector with endpointing
+
+    Audio of any chunk size is cut into frames of frame_ms. A frame is speech
+    when its RMS energy is energy_ratio times above the adaptive noise floor
+    (and above min_rms) and its zero-crossing rate is low enough for voiced
+    sound; loud frames count as speech regardless of zero crossings so that
+    fricatives are not cut. An utterance starts after min_speech_ms of speech,
+    includes pre_roll_ms of audio before the onset, and ends after
+    hangover_ms of silence, keeping post_roll_ms of trailing audio.
+
+    Usage:
+        vad = StreamingVAD()
+        for segment in vad.segments(chunks):
+            transcribe(segment.audio)
+    """
+
+    def __init__(self,
+                 rate: int = 16000,
+                 frame_ms: int = 30,
+                 pre_roll_ms: int = 300,
+                 post_roll_ms: int = 200,
+                 hangover_ms: int = 600,
+                 min_speech_ms: int = 90,
+                 max_segment_seconds: float = 30.0,
+                 energy_ratio: float = 3.0,
+                 min_rms: float = 150.0,
+                 max_zero_crossing_rate: float = 0.3,
+                 noise_adaptation: float = 0.05):
+        self.rate = rate
+        self.frame_size = int(rate * frame_ms / 1000)
+        self.energy_ratio = energy_ratio
+        self.min_rms = min_rms
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.noise_adaptation = noise_adaptation
+
+        self.onset_frames = max(1, int(np.ceil(min_speech_ms / frame_ms)))
+        self.hangover_frames = max(1, int(np.ceil(hangover_ms / frame_ms)))
+        self.post_roll_frames = min(self.hangover_frames, int(post_roll_ms / frame_ms))
+        pre_roll_frames = int(pre_roll_ms / frame_ms)
+
+        # Buffers are allocated once and reused for every utterance
+        self._frame = np.zeros(self.frame_size, dtype=np.int16)
+        self._frame_fill = 0
+        self._history = RingBuffer((pre_roll_frames + self.onset_frames) * self.frame_size)
+        self._segment = np.zeros(int(max_segment_seconds * rate), dtype=np.int16)
+        self._segment_fill = 0
+
+        self.noise_floor = None
+        self.reset()
+
+    def reset(self):
+        """Forget any utterance in progress (the noise floor is kept)"""
+        self._frame_fill = 0
+        self._history.clear()
+        self._segment_fill = 0
+        self._in_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+        self._segment_start = 0
+        self._frames_seen = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self._in_speech
+
+    def current_audio(self) -> np.ndarray:
+        """The utterance in progress so far (a view, valid until the next call)"""
+        return self._segment[:self._segment_fill]
+
+    def is_speech_frame(self, frame: np.ndarray) -> bool:
+        """Classify one frame and update the noise floor from silent frames"""
+        samples = frame.astype(np.float32)
+        rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+        signs = np.signbit(frame)
+        zero_crossing_rate = np.count_nonzero(signs[1:] != signs[:-1]) / len(frame)
+
+        if self.noise_floor is None:
+            # Capped so that the first threshold is min_rms: a stream that
+            # starts mid-utterance is still detected
+            self.noise_floor = min(rms, self.min_rms / self.energy_ratio)
+
+        threshold = max(self.min_rms, self.noise_floor * self.energy_ratio)
+        is_speech = rms > threshold and (zero_crossing_rate < self.max_zero_crossing_rate or
+                                         rms > 2 * threshold)
+
+        if not is_speech:
+            self.noise_floor += self.noise_adaptation * (rms - self.noise_floor)
+        return is_speech
+
+    def process(self, samples: np.ndarray) -> List[SpeechSegment]:
+        """Feed int16 samples and return any utterances completed by them"""
+        completed = []
+        offset = 0
+        while offset < len(samples):
+            take = min(self.frame_size - self._frame_fill, len(samples) - offset)
+            self._frame[self._frame_fill:self._frame_fill + take] = samples[offset:offset + take]
+            self._frame_fill += take
+            offset += take
+
+            if self._frame_fill == self.frame_size:
+                self._frame_fill = 0
+                segment = self._process_frame(self._frame)
+                if segment is not None:
+                    completed.append(segment)
+        return completed
+
+    def _process_frame(self, frame: np.ndarray) -> Optional[SpeechSegment]:
+        self._frames_seen += 1
+        is_speech = self.is_speech_frame(frame)
+
+        if not self._in_speech:
+            self._history.write(frame)
+            self._speech_run = self._speech_run + 1 if is_speech else 0
+            if self._speech_run >= self.onset_frames:
+                # Start the utterance with the pre-roll and onset frames
+                pre_roll = self._history.read()
+                self._segment[:len(pre_roll)] = pre_roll
+                self._segment_fill = len(pre_roll)
+                self._segment_start = self._frames_seen * self.frame_size - len(pre_roll)
+                self._in_speech = True
+                self._silence_run = 0
+            return None
+
+        end = self._segment_fill + self.frame_size
+        if end > len(self._segment):
+            # Segment buffer full: cut here and let this frame start the next one
+            segment = self._finish(self._segment_fill, truncated=True)
+            self._history.write(frame)
+            self._speech_run = 1 if is_speech else 0
+            return segment
+        self._segment[self._segment_fill:end] = frame
+        self._segment_fill = end
+
+        if is_speech:
+            self._silence_run = 0
+            return None
+
+        self._silence_run += 1
+        if self._silence_run >= self.hangover_frames:
+            # Drop the hangover silence beyond the post-roll
+            trailing = (self._silence_run - self.post_roll_frames) * self.frame_size
+            return self._finish(self._segment_fill - trailing)
+        return None
+
+    def _finish(self, length: int, truncated: bool = False) -> SpeechSegment:
+        segment = SpeechSegment(
+            audio=self._segment[:length].copy(),
+            start_time=self._segment_start / self.rate,
+            end_time=(self._segment_start + length) / self.rate,
+            truncated=truncated
+        )
+        self._in_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+        self._segment_fill = 0
+        self._history.clear()
+        return segment
+
+    def flush(self) -> Optional[SpeechSegment]:
+        """End the stream, returning the utterance in progress if any"""
+        segment = None
+        if self._in_speech and self._segment_fill:
+            segment = self._finish(self._segment_fill)
+        self.reset()
+        return segment
+
+    def segments(self, chunks: Iterable[np.ndarray]) -> Iterator[SpeechSegment]:
+        """Yield utterances from a stream of int16 chunks, flushing at the end"""
+        for chunk in chunks:
+            for segment in self.process(chunk):
+                yield segment
+        segment = self.flush()
+        if segment is not None:
+            yield segment
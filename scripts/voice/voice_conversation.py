@@ -4,16 +4,22 @@ Voice Conversation Manager for OpenClaw
 Manages voice input/output for conversations with the AI assistant
 """
 
+import json
 import threading
 import time
 import queue
+from pathlib import Path
 from typing import Optional, Callable, Dict, Any
 from .audio_utils import AudioUtils
-from .stt_engine import STTEngine
+from .audio_capture import AudioCaptureService
+from .stt_engine import STTEngine, stt_options_from_settings
 from .tts_engine import TTSEngine
 import openai  # For integration with OpenAI if needed
 
 
+DEFAULT_CONFIG_PATH = Path(__file__).with_name("voice_config.json")
+
+
 class VoiceConversationManager:
     """Manages voice conversations with the AI assistant"""
     
@@ -21,11 +27,13 @@ class VoiceConversationManager:
                  stt_engine_type: str = "whisper",
                  tts_engine_type: str = "pyttsx3",
                  language: str = "en-US",
-                 voice_id: Optional[str] = None):
+                 voice_id: Optional[str] = None,
+                 stt_settings: Optional[Dict[str, Any]] = None):
         """
         Initialize voice conversation manager
+        stt_settings: Whisper options as in the stt_settings of voice_config.json
         """
-        self.stt_engine = STTEngine(engine_type=stt_engine_type)
+        self.stt_engine = STTEngine(engine_type=stt_engine_type, **stt_options_from_settings(stt_settings))
         self.tts_engine = TTSEngine(engine_type=tts_engine_type, voice_id=voice_id)
         self.language = language
         self.is_active = False
@@ -37,6 +45,30 @@ class VoiceConversationManager:
         
         # Event to control conversation flow
         self.conversation_event = threading.Event()
+        
+        # Set while a response is played, so the microphone's echo of it is
+        # not taken as input; responses_spoken counts finished playbacks
+        self.speaking = threading.Event()
+        self.responses_spoken = 0
+        
+        # One microphone stream for the whole conversation
+        self.capture = AudioCaptureService(
+            vad=AudioUtils.create_vad(silence_duration=1.5, max_segment_seconds=10)
+        )
+    
+    @classmethod
+    def from_config(cls, config_path: str = DEFAULT_CONFIG_PATH) -> 'VoiceConversationManager':
+        """Create a manager from the engine, language and STT settings of voice_config.json"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)['voice_communication']
+        
+        return cls(
+            stt_engine_type=config.get('default_stt_engine', 'whisper'),
+            tts_engine_type=config.get('default_tts_engine', 'pyttsx3'),
+            language=config.get('language', 'en-US'),
+            voice_id=config.get('tts_settings', {}).get('preferred_voice'),
+            stt_settings=config.get('stt_settings')
+        )
     
     def start_conversation(self, 
                           ai_response_callback: Callable[[str], str],
@@ -50,6 +82,7 @@ class VoiceConversationManager:
         # Greet the user
         print("Voice conversation started")
         self.tts_engine.speak(greeting)
+        self.capture.start()
         
         # Start threads for different aspects of conversation
         input_thread = threading.Thread(target=self._listen_loop)
@@ -75,26 +108,32 @@ class VoiceConversationManager:
         """
         Continuously listen for voice input
         """
+        print("Listening...")
+        responses_spoken = self.responses_spoken
         while self.is_active:
             try:
-                # Record audio until silence is detected
-                print("Listening...")
-                audio = AudioUtils.record_until_silence(
-                    max_duration=10,
-                    silence_duration=1.5
-                )
+                # Only this thread reads the capture, so only it discards
+                # the audio recorded while a response is played
+                if self.speaking.is_set():
+                    self.capture.discard()
+                    time.sleep(0.1)
+                    continue
+                if responses_spoken != self.responses_spoken:
+                    # Drop the end of the response heard since the last pass
+                    self.capture.discard()
+                    responses_spoken = self.responses_spoken
                 
-                if len(audio) > 0 and AudioUtils.detect_voice_activity(audio):
+                # Wait for the VAD to cut the next utterance from the open stream
+                audio = self.capture.next_utterance(timeout=0.5)
+                if self.speaking.is_set() or responses_spoken != self.responses_spoken:
+                    # A response was played while the utterance was cut
+                    continue
+                
+                if audio is not None and len(audio) > 0:
                     print("Audio detected, processing...")
                     
                     # Add to processing queue
                     self.input_queue.put(audio)
-                    
-                    # Brief pause to avoid overlapping recordings
-                    time.sleep(0.5)
-                else:
-                    # Brief pause to reduce CPU usage
-                    time.sleep(0.2)
             
             except Exception as e:
                 print(f"Listening error: {str(e)}")
@@ -139,8 +178,15 @@ class VoiceConversationManager:
                                 'timestamp': time.time()
                             })
                             
-                            # Speak the response
-                            self.tts_engine.speak(ai_response)
+                            # Speak the response, then drop any utterances
+                            # the microphone picked up of it
+                            self.speaking.set()
+                            try:
+                                self.tts_engine.speak(ai_response)
+                            finally:
+                                self._clear_input_queue()
+                                self.responses_spoken += 1
+                                self.speaking.clear()
                     
                     # Small delay before next input
                     time.sleep(0.2)
@@ -153,6 +199,16 @@ class VoiceConversationManager:
                 print(f"Processing error: {str(e)}")
                 time.sleep(0.1)
     
+    def _clear_input_queue(self):
+        """
+        Drop queued utterances that have not been processed yet
+        """
+        while True:
+            try:
+                self.input_queue.get_nowait()
+            except queue.Empty:
+                return
+    
     def end_conversation(self):
         """
         End the current conversation
@@ -160,6 +216,7 @@ class VoiceConversationManager:
         print("Ending voice conversation...")
         self.is_active = False
         self.conversation_event.set()
+        self.capture.stop()
         
         # Stop any ongoing speech
         self.tts_engine.stop_speaking()
@@ -216,12 +273,9 @@ def main():
     """
     print("Starting voice conversation demo...")
     
-    # Create voice conversation manager
-    voice_manager = VoiceConversationManager(
-        stt_engine_type="whisper",  # Use whisper for offline STT
-        tts_engine_type="pyttsx3",  # Use pyttsx3 for offline TTS
-        language="en-US"
-    )
+    # Create voice conversation manager (whisper STT and pyttsx3 TTS by
+    # default, both offline)
+    voice_manager = VoiceConversationManager.from_config()
     
     try:
         # Start conversation with simple responder
@@ -5,45 +5,127 @@ Implements WebSocket server for real-time voice streaming
 """
 
 import asyncio
+import threading
 import websockets
 import json
 import base64
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Dict, Optional
 from .audio_utils import AudioUtils
-from .stt_engine import STTEngine
+from .stt_engine import STTEngine, stt_options_from_settings
 from .tts_engine import TTSEngine
-import threading
-import queue
+from .streaming_stt import StreamingSTTSession
+from .audio_protocol import (
+    ProtocolError, pack_frame, parse_frame, pcm16_from_payload, hello_response,
+    FRAME_AUDIO_IN, FRAME_AUDIO_OUT, FLAG_FINAL, CODEC_PCM16, CODEC_WAV, CODEC_FLAC, CODEC_NAMES,
+    PCM16_SAMPLE_RATES
+)
+from .audio_codecs import (
+    AudioDecoder, available_codecs, codec_id, encode_speech_chunks, resample_pcm16
+)
+
+
+DEFAULT_CONFIG_PATH = Path(__file__).with_name("voice_config.json")
+REPLY_TIMEOUT_SECONDS = 10
 
 
 class VoiceServer:
-    """WebSocket server for real-time voice communication"""
+    """
+    WebSocket server for real-time voice communication
+
+    STT/TTS work runs on a fixed-size thread pool. Each client has a bounded
+    queue of pending work drained by one task, so a client's audio is
+    processed in order, at most one job per client runs at a time, and a
+    client that sends faster than it can be served is slowed down instead of
+    growing memory. Worker threads deliver replies through the server's own
+    event loop. The STT and TTS engines are shared and not thread-safe
+    (Whisper hooks its kv-cache into the model, pyttsx3's run loop is not
+    reentrant), so workers take turns on each engine through a lock.
+    """
     
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    def __init__(self, host: str = "localhost", port: int = 8765,
+                 max_connections: int = 5, worker_threads: int = 4,
+                 client_queue_size: int = 32, stt_settings: Optional[Dict] = None):
         self.host = host
         self.port = port
+        self.max_connections = max_connections
+        self.client_queue_size = client_queue_size
         self.connected_clients = set()
-        self.stt_engine = STTEngine(engine_type="whisper")
+        self.stt_engine = STTEngine(engine_type="whisper", **stt_options_from_settings(stt_settings))
         self.tts_engine = TTSEngine(engine_type="pyttsx3")
+        self.stt_lock = threading.Lock()
+        self.tts_lock = threading.Lock()
         self.ai_callback = None
         
-        # Audio processing queues
-        self.audio_processing_queue = queue.Queue()
-        self.response_queue = queue.Queue()
+        # Shared by all clients; set when the server starts
+        self.executor = ThreadPoolExecutor(max_workers=worker_threads,
+                                           thread_name_prefix="voice-worker")
+        self.loop = None
+        
+        # Per-client state: streaming transcription session, work queue and
+        # negotiated protocol options
+        self.stt_sessions = {}
+        self.client_queues = {}
+        self.client_workers = {}
+        self.client_protocols = {}
+    
+    @classmethod
+    def from_config(cls, config_path: str = DEFAULT_CONFIG_PATH) -> 'VoiceServer':
+        """Create a server from the server_settings and stt_settings of voice_config.json"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)['voice_communication']
+        settings = config['server_settings']
+        
+        return cls(
+            host=settings.get('host', 'localhost'),
+            port=settings.get('port', 8765),
+            max_connections=settings.get('max_connections', 5),
+            worker_threads=settings.get('worker_threads', 4),
+            client_queue_size=settings.get('client_queue_size', 32),
+            stt_settings=config.get('stt_settings')
+        )
     
     async def register_client(self, websocket):
         """Register a new client"""
         self.connected_clients.add(websocket)
+        self.stt_sessions[websocket] = StreamingSTTSession(self.stt_engine, engine_lock=self.stt_lock)
+        self.client_queues[websocket] = asyncio.Queue(maxsize=self.client_queue_size)
+        self.client_workers[websocket] = asyncio.ensure_future(self._client_worker(websocket))
+        self.client_protocols[websocket] = {
+            'binary_audio': False,
+            'sequence': 0,
+            'input_codec': CODEC_PCM16,
+            'output_codec': CODEC_WAV,
+            'decoders': {}
+        }
         print(f"Client connected. Total clients: {len(self.connected_clients)}")
     
     async def unregister_client(self, websocket):
         """Unregister a client"""
-        self.connected_clients.remove(websocket)
+        self.connected_clients.discard(websocket)
+        worker = self.client_workers.pop(websocket, None)
+        if worker is not None:
+            worker.cancel()
+        self.client_queues.pop(websocket, None)
+        self.stt_sessions.pop(websocket, None)
+        self.client_protocols.pop(websocket, None)
         print(f"Client disconnected. Total clients: {len(self.connected_clients)}")
     
-    async def handle_client(self, websocket, path):
+    async def handle_client(self, websocket, path=None):
         """Handle messages from a client"""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        
+        if len(self.connected_clients) >= self.max_connections:
+            await websocket.send(json.dumps({
+                'type': 'error',
+                'message': 'Server is at capacity, try again later'
+            }))
+            await websocket.close()
+            return
+        
         await self.register_client(websocket)
         try:
             async for message in websocket:
@@ -53,24 +135,71 @@ class VoiceServer:
         finally:
             await self.unregister_client(websocket)
     
+    async def _client_worker(self, websocket):
+        """Drain a client's queue, running one job at a time on the pool"""
+        queue = self.client_queues[websocket]
+        while True:
+            job, payload = await queue.get()
+            try:
+                await asyncio.wrap_future(self.executor.submit(job, websocket, *payload))
+            except Exception as e:
+                print(f"Error processing client job: {str(e)}")
+    
+    async def enqueue(self, websocket, job, *payload):
+        """Queue blocking work for a client; waits while the queue is full"""
+        queue = self.client_queues.get(websocket)
+        if queue is not None:
+            await queue.put((job, payload))
+    
+    def reply(self, websocket, data):
+        """Send a message from a worker thread via the server loop, in order"""
+        # A job already running when its client left (or the server stopped)
+        # keeps going; its replies are dropped instead of scheduled
+        loop = self.loop
+        if loop is None or loop.is_closed() or websocket not in self.connected_clients:
+            return
+        
+        coroutine = self.send_to_client(websocket, data)
+        try:
+            future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        except RuntimeError:
+            coroutine.close()  # The loop closed after the check
+            return
+        # Waiting keeps a client's messages in order; the timeout guards
+        # against a loop that has stopped
+        future.result(timeout=REPLY_TIMEOUT_SECONDS)
+    
     async def handle_message(self, websocket, message):
         """Handle incoming message from client"""
+        if not isinstance(message, str):
+            await self.handle_binary_frame(websocket, message)
+            return
+        
         try:
             data = json.loads(message)
             message_type = data.get('type')
             
-            if message_type == 'audio_chunk':
+            if message_type == 'hello':
+                # Clients opt in to binary audio frames and pick the codecs
+                # used in them; JSON audio keeps working either way
+                binary_audio = bool(data.get('binary_audio', False))
+                input_codec = codec_id(data.get('input_codec', CODEC_NAMES[CODEC_PCM16]))
+                output_codec = codec_id(data.get('output_codec', CODEC_NAMES[CODEC_WAV]))
+                
+                protocol = self.client_protocols[websocket]
+                protocol['binary_audio'] = binary_audio
+                protocol['input_codec'] = input_codec
+                protocol['output_codec'] = output_codec
+                await websocket.send(json.dumps(hello_response(binary_audio, available_codecs(),
+                                                               input_codec, output_codec)))
+            
+            elif message_type == 'audio_chunk':
                 # Process audio chunk
                 audio_data = base64.b64decode(data['audio'])
                 audio_array = np.frombuffer(audio_data, dtype=np.int16)
                 
-                # Add to processing queue
-                self.audio_processing_queue.put((websocket, audio_array))
-                
-                # Process in background thread
-                processing_thread = threading.Thread(target=self.process_audio_chunk)
-                processing_thread.daemon = True
-                processing_thread.start()
+                # 'final' marks the end of the client's utterance
+                await self.enqueue(websocket, self.process_audio_chunk, audio_array, data.get('final', False))
                 
                 await websocket.send(json.dumps({
                     'type': 'ack',
@@ -83,35 +212,7 @@ class VoiceServer:
                 
                 # Process through AI callback if available
                 if self.ai_callback:
-                    response = self.ai_callback(text)
-                    
-                    # Convert to speech if TTS is available
-                    try:
-                        # Generate audio from text
-                        import tempfile
-                        import os
-                        
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                            success = self.tts_engine.save_to_file(text, tmp_file.name, language='en')
-                            if success:
-                                # Read audio file and send back
-                                with open(tmp_file.name, 'rb') as f:
-                                    audio_bytes = f.read()
-                                
-                                await websocket.send(json.dumps({
-                                    'type': 'tts_response',
-                                    'audio': base64.b64encode(audio_bytes).decode('utf-8'),
-                                    'text': response
-                                }))
-                                
-                                # Clean up
-                                os.unlink(tmp_file.name)
-                    except:
-                        # If TTS fails, send text response
-                        await websocket.send(json.dumps({
-                            'type': 'text_response',
-                            'text': response
-                        }))
+                    await self.enqueue(websocket, self.process_text_input, text)
                 else:
                     await websocket.send(json.dumps({
                         'type': 'text_response',
@@ -131,63 +232,202 @@ class VoiceServer:
                 'message': str(e)
             }))
     
-    def process_audio_chunk(self):
-        """Process audio chunk in background thread"""
+    async def handle_binary_frame(self, websocket, message):
+        """Handle a binary audio frame from a client"""
         try:
-            if not self.audio_processing_queue.empty():
-                websocket, audio_array = self.audio_processing_queue.get()
-                
-                # Transcribe audio
-                text = self.stt_engine.transcribe_audio(audio_array)
-                
-                if text:
-                    print(f"Transcribed: {text}")
+            protocol = self.client_protocols[websocket]
+            if not protocol['binary_audio']:
+                raise ProtocolError("Binary audio not negotiated; send a hello message first")
+            
+            header, payload = parse_frame(message)
+            if header['frame_type'] != FRAME_AUDIO_IN:
+                raise ProtocolError(f"Unexpected frame type: {header['frame_type']}")
+            if header['codec'] not in (CODEC_PCM16, protocol['input_codec']):
+                raise ProtocolError(f"Codec not negotiated: {CODEC_NAMES.get(header['codec'], header['codec'])}")
+            
+            if header['codec'] == CODEC_PCM16:
+                if header['sample_rate'] not in PCM16_SAMPLE_RATES:
+                    raise ProtocolError(f"Unsupported PCM16 sample rate: {header['sample_rate']} Hz. "
+                                        f"Valid: {', '.join(map(str, PCM16_SAMPLE_RATES))}")
+                # The array views the received message; nothing is copied here
+                audio_array = pcm16_from_payload(payload)
+                await self.enqueue(websocket, self.process_audio_chunk, audio_array, header['final'],
+                                   header['sample_rate'])
+            else:
+                # Compressed audio is decoded on the worker, in arrival order;
+                # WAV/FLAC carry their own rate and Opus decodes at any rate
+                await self.enqueue(websocket, self.process_encoded_audio, payload,
+                                   header['codec'], header['final'])
+            
+            await websocket.send(json.dumps({
+                'type': 'ack',
+                'sequence': header['sequence']
+            }))
+        
+        except ProtocolError as e:
+            print(f"Error handling binary frame: {str(e)}")
+            await websocket.send(json.dumps({
+                'type': 'error',
+                'message': str(e)
+            }))
+    
+    def process_encoded_audio(self, websocket, payload: memoryview, codec: int, final: bool = False):
+        """Decode a compressed audio frame and process it (runs on a worker thread)"""
+        protocol = self.client_protocols.get(websocket)
+        if protocol is None:
+            return
+        
+        # Decoders keep state between frames (Opus), so one per client and codec
+        decoder = protocol['decoders'].get(codec)
+        if decoder is None:
+            decoder = AudioDecoder(codec, rate=AudioUtils.RATE)
+            protocol['decoders'][codec] = decoder
+        
+        try:
+            audio_array = decoder.decode(payload)
+        except Exception as e:
+            print(f"Error decoding audio frame: {str(e)}")
+            self.reply(websocket, {
+                'type': 'error',
+                'message': f"Could not decode {CODEC_NAMES[codec]} audio"
+            })
+            return
+        
+        self.process_audio_chunk(websocket, audio_array, final)
+    
+    def process_audio_chunk(self, websocket, audio_array: np.ndarray, final: bool = False,
+                            sample_rate: int = AudioUtils.RATE):
+        """
+        Feed audio into the client's streaming session and send partial and
+        final transcripts as they are produced; each final transcript is
+        answered through the AI callback (runs on a worker thread). Audio at
+        another sample_rate is resampled to the rate the VAD and STT expect.
+        """
+        session = self.stt_sessions.get(websocket)
+        if session is None:
+            return
+        
+        if sample_rate != AudioUtils.RATE:
+            audio_array = resample_pcm16(audio_array, sample_rate, AudioUtils.RATE)
+        
+        events = session.feed(audio_array)
+        if final:
+            events += session.finish()
+        
+        for event in events:
+            self.reply(websocket, event)
+            
+            if event['type'] == 'final_transcript' and event['text']:
+                print(f"Transcribed: {event['text']}")
+                response = self.respond_to_transcript(event['text'])
+                if response:
+                    self.reply_with_audio(websocket, response)
+    
+    def process_text_input(self, websocket, text: str):
+        """Answer a text message through the AI callback (runs on a worker thread)"""
+        response = self.respond_to_transcript(text)
+        if response:
+            response.pop('transcribed_text', None)
+            self.reply_with_audio(websocket, response)
+    
+    def respond_to_transcript(self, text: str) -> Optional[Dict]:
+        """
+        Build the reply message for a final transcript (blocking); speech
+        audio is left as raw bytes under 'audio' for reply_with_audio
+        """
+        try:
+            if not self.ai_callback:
+                # Send text response if no AI callback
+                return {
+                    'type': 'text_response',
+                    'text': text
+                }
+            
+            response = self.ai_callback(text)
+            
+            # Convert response to speech
+            import tempfile
+            import os
+            
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
+                temp_filename = tmp_file.name
+            try:
+                with self.tts_lock:
+                    success = self.tts_engine.save_to_file(response, temp_filename, language='en')
+                if success:
+                    # Read audio file and send back
+                    with open(temp_filename, 'rb') as f:
+                        audio_bytes = f.read()
                     
-                    # Process through AI callback if available
-                    if self.ai_callback:
-                        response = self.ai_callback(text)
-                        
-                        # Convert response to speech
-                        import tempfile
-                        import os
-                        
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                            success = self.tts_engine.save_to_file(response, tmp_file.name, language='en')
-                            if success:
-                                # Read audio file and send back
-                                with open(tmp_file.name, 'rb') as f:
-                                    audio_bytes = f.read()
-                                
-                                # Send response back to client
-                                asyncio.run_coroutine_threadsafe(
-                                    self.send_to_client(websocket, {
-                                        'type': 'tts_response',
-                                        'audio': base64.b64encode(audio_bytes).decode('utf-8'),
-                                        'text': response,
-                                        'transcribed_text': text
-                                    }),
-                                    loop=asyncio.get_event_loop()
-                                )
-                                
-                                # Clean up
-                                os.unlink(tmp_file.name)
-                    else:
-                        # Send text response if no AI callback
-                        asyncio.run_coroutine_threadsafe(
-                            self.send_to_client(websocket, {
-                                'type': 'text_response',
-                                'text': text
-                            }),
-                            loop=asyncio.get_event_loop()
-                        )
+                    return {
+                        'type': 'tts_response',
+                        'audio': audio_bytes,
+                        'text': response,
+                        'transcribed_text': text
+                    }
+            finally:
+                # Clean up
+                os.unlink(temp_filename)
+            
+            return {
+                'type': 'text_response',
+                'text': response,
+                'transcribed_text': text
+            }
+        except Exception as e:
+            print(f"Error processing transcript: {str(e)}")
+            return None
+    
+    def reply_with_audio(self, websocket, data: Dict):
+        """
+        Send a reply that may carry speech audio: as binary frames in the
+        client's output codec after the JSON message for clients that
+        negotiated binary audio, otherwise as base64 WAV inside the JSON
+        (runs on a worker thread)
+        """
+        audio_bytes = data.pop('audio', None)
+        if audio_bytes is None:
+            self.reply(websocket, data)
+            return
+        
+        protocol = self.client_protocols.get(websocket)
+        if protocol is None or not protocol['binary_audio']:
+            data['audio'] = base64.b64encode(audio_bytes).decode('utf-8')
+            self.reply(websocket, data)
+            return
+        
+        codec = protocol['output_codec']
+        try:
+            chunks = encode_speech_chunks(audio_bytes, codec, rate=AudioUtils.RATE)
         except Exception as e:
-            print(f"Error processing audio chunk: {str(e)}")
+            print(f"Error encoding speech as {CODEC_NAMES[codec]}, sending WAV: {str(e)}")
+            codec = CODEC_WAV
+            chunks = [audio_bytes]
+        
+        # WAV and FLAC payloads carry their own sample rate
+        sample_rate = 0 if codec in (CODEC_WAV, CODEC_FLAC) else AudioUtils.RATE
+        data['audio_format'] = CODEC_NAMES[codec]
+        data['audio_sequence'] = protocol['sequence'] + 1
+        data['audio_frames'] = len(chunks)
+        if sample_rate:
+            data['sample_rate'] = sample_rate
+        self.reply(websocket, data)
+        
+        # Frames are sent one by one so the client can start playback early
+        for index, chunk in enumerate(chunks):
+            protocol['sequence'] += 1
+            flags = FLAG_FINAL if index == len(chunks) - 1 else 0
+            self.reply(websocket, pack_frame(FRAME_AUDIO_OUT, chunk, protocol['sequence'],
+                                             codec=codec, flags=flags, sample_rate=sample_rate))
     
     async def send_to_client(self, websocket, data):
-        """Send data to a specific client"""
+        """Send data to a specific client; bytes go out as a binary message"""
         if websocket in self.connected_clients:  # Check if client is still connected
             try:
-                await websocket.send(json.dumps(data))
+                if isinstance(data, (bytes, bytearray)):
+                    await websocket.send(data)
+                else:
+                    await websocket.send(json.dumps(data))
             except websockets.exceptions.ConnectionClosed:
                 pass  # Client disconnected
     
@@ -217,6 +457,8 @@ class VoiceServer:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         
+        self.loop = loop
+        
         start_server = websockets.serve(self.handle_client, self.host, self.port)
         server = loop.run_until_complete(start_server)
         
@@ -228,6 +470,7 @@ class VoiceServer:
             server.close()
             loop.run_until_complete(server.wait_closed())
             loop.close()
+            self.executor.shutdown(wait=False)
 
 
 def example_ai_callback(text: str) -> str:
@@ -247,11 +490,11 @@ if __name__ == "__main__":
     # Test the voice server
     print("Initializing voice server...")
     
-    server = VoiceServer(host="localhost", port=8765)
+    server = VoiceServer.from_config()
     server.set_ai_callback(example_ai_callback)
     
     print("Voice server initialized. Starting server...")
-    print("Connect to ws://localhost:8765 from a WebSocket client")
+    print(f"Connect to ws://{server.host}:{server.port} from a WebSocket client")
     
     try:
         server.start_server()
@@ -5,146 +5,953 @@ Implements safe PDF processing with security validations
 """
 
 import os
+import re
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
 import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Iterator, Set
 import pdfplumber
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdftypes import resolve1
 import psutil  # For system monitoring during processing
 
-def validate_pdf_file(file_path: str) -> Dict[str, Any]:
+# Memory usage is sampled at most once per interval instead of on every call
+MEMORY_CHECK_INTERVAL_SECONDS = 1.0
+_memory_sample = {'checked_at': None, 'percent': 0.0}
+
+def _system_memory_percent() -> float:
     """
-    Validates a PDF file for security before processing
+    Returns system memory usage, reusing a recent sample when available
+    """
+    now = time.monotonic()
+    checked_at = _memory_sample['checked_at']
+    if checked_at is None or now - checked_at > MEMORY_CHECK_INTERVAL_SECONDS:
+        _memory_sample['percent'] = psutil.virtual_memory().percent
+        _memory_sample['checked_at'] = now
+    return _memory_sample['percent']
+
+def _page_count_from_catalog(document: PDFDocument) -> Optional[int]:
+    """
+    Reads the page count from the /Count entry of the page tree root
     """
-    result = {
-        'is_valid': True,
-        'errors': [],
-        'size_mb': 0,
-        'page_count': 0
-    }
-    
     try:
-        # Check if file exists
-        if not os.path.exists(file_path):
-            result['is_valid'] = False
-            result['errors'].append("File does not exist")
-            return result
-        
-        # Check file size (limit to 50MB)
-        size_bytes = os.path.getsize(file_path)
-        size_mb = size_bytes / (1024 * 1024)
-        result['size_mb'] = round(size_mb, 2)
-        
-        if size_mb > 50:
-            result['is_valid'] = False
-            result['errors'].append(f"File too large: {size_mb:.2f}MB (max 50MB)")
-        
-        # Check file extension
-        if not file_path.lower().endswith('.pdf'):
-            result['is_valid'] = False
-            result['errors'].append("File is not a PDF")
-        
-        # Attempt to open PDF to check if it's a valid PDF
-        try:
-            with pdfplumber.open(file_path, pages=[1]) as pdf:
-                result['page_count'] = len(pdf.pages)
-        except Exception as e:
-            result['is_valid'] = False
-            result['errors'].append(f"Invalid PDF format: {str(e)}")
-        
-        # Check system resources before processing large files
-        memory_percent = psutil.virtual_memory().percent
-        if memory_percent > 80:
-            result['is_valid'] = False
-            result['errors'].append(f"System memory usage too high ({memory_percent}%)")
-        
-    except Exception as e:
-        result['is_valid'] = False
-        result['errors'].append(f"Validation error: {str(e)}")
-    
-    return result
+        pages = resolve1(document.catalog.get('Pages'))
+        count = resolve1(pages.get('Count'))
+        if isinstance(count, int) and count >= 0:
+            return count
+    except Exception:
+        pass
+    return None
 
-def extract_text_from_pdf_secure(file_path: str, max_pages: int = 20) -> Optional[str]:
+def get_pdf_page_count_fast(file_path: str) -> Optional[int]:
     """
-    Securely extracts text from a PDF with safety limits
+    Gets the page count from the PDF trailer/xref without building any pages
     """
-    # Validate the file first
-    validation_result = validate_pdf_file(file_path)
-    
-    if not validation_result['is_valid']:
-        print(f"PDF validation failed: {'; '.join(validation_result['errors'])}")
-        return None
-    
-    if validation_result['page_count'] > max_pages:
-        print(f"PDF has {validation_result['page_count']} pages, exceeding limit of {max_pages}")
-        return None
-    
     try:
-        # Extract text with security limits
-        extracted_text = ""
-        with pdfplumber.open(file_path, pages=list(range(1, min(max_pages + 1, validation_result['page_count'] + 1)))) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                if page_num >= max_pages:
-                    break
-                
-                text = page.extract_text()
-                if text:
-                    extracted_text += f"\n--- Page {page_num + 1} ---\n{text}\n"
-        
-        return extracted_text.strip()
-    
+        with open(file_path, 'rb') as fp:
+            return _page_count_from_catalog(PDFDocument(PDFParser(fp)))
     except Exception as e:
-        print(f"Error extracting text from PDF: {str(e)}")
+        print(f"Error reading PDF page count: {str(e)}")
         return None
 
-def extract_tables_from_pdf_secure(file_path: str, max_pages: int = 10) -> Optional[list]:
+# Ruling-line pre-screen thresholds for table extraction. pdfplumber's default
+# "lines" strategy only finds cells bounded by horizontal and vertical edges,
+# so a page without enough of both cannot yield a table.
+TABLE_MIN_RULING_EDGES = 2
+TABLE_MIN_CHARS = 1
+_EDGE_TOLERANCE = 1.0
+
+def page_may_contain_tables(page) -> bool:
+    """
+    Cheaply checks page object counts (lines, rects, curves, chars) to decide
+    whether running full table extraction on the page is worthwhile
+    """
+    objects = page.objects
+    if len(objects.get('char', [])) < TABLE_MIN_CHARS:
+        return False
+
+    horizontal = vertical = 0
+    for line in objects.get('line', []):
+        if abs(line['top'] - line['bottom']) <= _EDGE_TOLERANCE:
+            horizontal += 1
+        elif abs(line['x0'] - line['x1']) <= _EDGE_TOLERANCE:
+            vertical += 1
+
+    # Each rectangle contributes two horizontal and two vertical edges
+    rect_count = len(objects.get('rect', []))
+    horizontal += 2 * rect_count
+    vertical += 2 * rect_count
+
+    # pdfplumber splits a curve into one edge per segment, so a whole table
+    # can be drawn as a single polyline or closed path
+    for curve in objects.get('curve', []):
+        points = curve.get('pts', [])
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if abs(y0 - y1) <= _EDGE_TOLERANCE:
+                horizontal += 1
+            elif abs(x0 - x1) <= _EDGE_TOLERANCE:
+                vertical += 1
+
+    return horizontal >= TABLE_MIN_RULING_EDGES and vertical >= TABLE_MIN_RULING_EDGES
+
+_NUMERIC_CLEANUP = re.compile(r'[,$€£¥%\s]')
+
+def _parse_numeric_cell(value: Any) -> Optional[float]:
     """
-    Securely extracts tables from a PDF with safety limits
+    Parses a table cell like '1,234.50', '$12', '45%' or '(300)' as a number
     """
-    # Validate the file first
-    validation_result = validate_pdf_file(file_path)
-    
-    if not validation_result['is_valid']:
-        print(f"PDF validation failed: {'; '.join(validation_result['errors'])}")
+    if value is None:
         return None
-    
-    if validation_result['page_count'] > max_pages:
-        print(f"PDF has {validation_result['page_count']} pages, exceeding limit of {max_pages}")
+    text = str(value).strip()
+    if not text:
         return None
-    
-    try:
-        tables_data = []
-        with pdfplumber.open(file_path, pages=list(range(1, min(max_pages + 1, validation_result['page_count'] + 1)))) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                if page_num >= max_pages:
-                    break
-                
-                tables = page.extract_tables()
+
+    negative = text.startswith('(') and text.endswith(')')
+    if negative:
+        text = text[1:-1]
+
+    number = float(_NUMERIC_CLEANUP.sub('', text))
+    return -number if negative else number
+
+def table_to_dataframe(table: List[List[Any]], header: bool = True):
+    """
+    Converts an extracted table into a DataFrame with typed numeric columns
+    """
+    import pandas as pd
+
+    rows = [list(row) for row in table if row and any(cell not in (None, '') for cell in row)]
+    if not rows:
+        return pd.DataFrame()
+
+    width = max(len(row) for row in rows)
+    rows = [row + [None] * (width - len(row)) for row in rows]
+
+    if header and len(rows) > 1:
+        columns = []
+        seen = {}
+        for idx, name in enumerate(rows[0]):
+            name = ' '.join(str(name).split()) if name not in (None, '') else f"column_{idx + 1}"
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}_{seen[name]}"
+            else:
+                seen[name] = 0
+            columns.append(name)
+        rows = rows[1:]
+    else:
+        columns = [f"column_{idx + 1}" for idx in range(width)]
+
+    df = pd.DataFrame(rows, columns=columns)
+
+    for column in df.columns:
+        cleaned = df[column].map(lambda cell: (cell.strip() or None) if isinstance(cell, str) else cell)
+        try:
+            parsed = cleaned.map(_parse_numeric_cell).astype('float64')
+        except ValueError:
+            df[column] = cleaned
+            continue
+
+        if parsed.notna().any():
+            # Keep integer columns as nullable integers rather than floats
+            if (parsed.dropna() % 1 == 0).all():
+                df[column] = parsed.astype('Int64')
+            else:
+                df[column] = parsed.astype('float64')
+        else:
+            df[column] = cleaned
+
+    return df
+
+def compute_file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Computes the SHA-256 digest of a file's contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+DEFAULT_PDF_CACHE_DIR = str(Path.home() / '.cache' / 'openclaw' / 'pdf_extraction')
+
+class PDFExtractionCache:
+    """
+    On-disk cache of per-page PDF text and tables keyed by file content hash
+
+    Each document is stored as <sha256>.json holding a mapping of page number
+    to extracted 'text' and/or 'tables'. File modification time tracks last
+    access, and the least recently used documents are evicted once the cache
+    grows beyond max_size_mb.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_PDF_CACHE_DIR, max_size_mb: float = 512):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._total_bytes = None
+
+    def _entry_path(self, content_hash: str) -> Path:
+        if len(content_hash) != 64 or not all(c in '0123456789abcdef' for c in content_hash):
+            raise ValueError(f"Invalid content hash: {content_hash!r}")
+        return self.cache_dir / f"{content_hash}.json"
+
+    def get_pages(self, content_hash: str) -> Dict[int, Dict[str, Any]]:
+        """
+        Returns cached page data for a document, or an empty dict on a miss
+        """
+        entry_path = self._entry_path(content_hash)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(entry_path)  # Mark as recently used
+        except (OSError, ValueError):
+            return {}
+        return {int(page): data for page, data in entry.get('pages', {}).items()}
+
+    def update_pages(self, content_hash: str, pages: Dict[int, Dict[str, Any]]):
+        """
+        Merges newly extracted page data into a document's cache entry
+        """
+        if not pages:
+            return
+
+        entry_path = self._entry_path(content_hash)
+        merged = self.get_pages(content_hash)
+        for page_number, data in pages.items():
+            merged.setdefault(page_number, {}).update(data)
+
+        previous_size = entry_path.stat().st_size if entry_path.exists() else 0
+        payload = json.dumps({'pages': {str(page): data for page, data in sorted(merged.items())}})
+
+        # Write atomically so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, entry_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        if self._total_bytes is not None:
+            self._total_bytes += entry_path.stat().st_size - previous_size
+        self._evict_if_needed()
+
+    def _scan(self) -> List[os.DirEntry]:
+        return [entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith('.json')]
+
+    def _evict_if_needed(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(entry.stat().st_size for entry in self._scan())
+        if self._total_bytes <= self.max_size_bytes:
+            return
+
+        # Rescan so entries written by other processes are accounted for
+        entries = sorted(self._scan(), key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_size_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def clear(self):
+        """
+        Removes all cached documents
+        """
+        for entry in self._scan():
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+        self._total_bytes = 0
+
+class _Uncached:
+    """
+    Wraps an extractor result that is returned but not written to the cache
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+class PDFDocumentSession:
+    """
+    Validates and extracts content from a PDF using a single open handle
+
+    Usage:
+        with PDFDocumentSession("report.pdf") as session:
+            if session.is_valid:
+                text = session.extract_text(max_pages=20)
+                tables = session.extract_tables(max_pages=10)
+    """
+
+    def __init__(self, file_path: str, max_size_mb: float = 50):
+        self.file_path = file_path
+        self.max_size_mb = max_size_mb
+        self.validation = {
+            'is_valid': True,
+            'errors': [],
+            'size_mb': 0,
+            'page_count': 0,
+            'retryable': False
+        }
+        self._pdf = None
+        self._content_hash = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def is_valid(self) -> bool:
+        return self.validation['is_valid']
+
+    @property
+    def page_count(self) -> int:
+        return self.validation['page_count']
+
+    @property
+    def content_hash(self) -> str:
+        """
+        SHA-256 of the file contents, computed on first use
+        """
+        if self._content_hash is None:
+            self._content_hash = compute_file_sha256(self.file_path)
+        return self._content_hash
+
+    def _fail(self, message: str):
+        self.validation['is_valid'] = False
+        self.validation['errors'].append(message)
+
+    def open(self) -> Dict[str, Any]:
+        """
+        Validates the file and opens it once for all later extraction
+        """
+        if self._pdf is not None:
+            return self.validation
+
+        try:
+            # Check if file exists
+            if not os.path.exists(self.file_path):
+                self._fail("File does not exist")
+                return self.validation
+
+            # Check file size (limit to 50MB by default)
+            size_bytes = os.path.getsize(self.file_path)
+            size_mb = size_bytes / (1024 * 1024)
+            self.validation['size_mb'] = round(size_mb, 2)
+
+            if size_mb > self.max_size_mb:
+                self._fail(f"File too large: {size_mb:.2f}MB (max {self.max_size_mb}MB)")
+
+            # Check file extension
+            if not self.file_path.lower().endswith('.pdf'):
+                self._fail("File is not a PDF")
+
+            # Check system resources before processing large files
+            memory_percent = _system_memory_percent()
+            if memory_percent > 80:
+                self._fail(f"System memory usage too high ({memory_percent}%)")
+                # The file itself may be fine; a later attempt can succeed
+                self.validation['retryable'] = True
+
+            if not self.is_valid:
+                return self.validation
+
+            # Open the PDF once; the page count comes from the page tree root
+            # so no pdfplumber pages are instantiated during validation
+            try:
+                self._pdf = pdfplumber.open(self.file_path)
+                page_count = _page_count_from_catalog(self._pdf.doc)
+                if page_count is None:
+                    page_count = len(self._pdf.pages)
+                self.validation['page_count'] = page_count
+            except Exception as e:
+                self.close()
+                self._fail(f"Invalid PDF format: {str(e)}")
+
+        except Exception as e:
+            self.close()
+            self._fail(f"Validation error: {str(e)}")
+
+        return self.validation
+
+    def close(self):
+        """
+        Releases the underlying PDF handle
+        """
+        if self._pdf is not None:
+            try:
+                self._pdf.close()
+            finally:
+                self._pdf = None
+
+    def _check_extractable(self, max_pages: int, reject_over_limit: bool) -> bool:
+        if not self.is_valid:
+            print(f"PDF validation failed: {'; '.join(self.validation['errors'])}")
+            return False
+
+        if reject_over_limit and self.page_count > max_pages:
+            print(f"PDF has {self.page_count} pages, exceeding limit of {max_pages}")
+            return False
+
+        if self._pdf is None:
+            print("PDF session is not open")
+            return False
+
+        return True
+
+    def iter_pages(self, max_pages: int) -> Iterator[Any]:
+        """
+        Yields up to max_pages pdfplumber pages from the open document
+        """
+        for page_num, page in enumerate(self._pdf.pages):
+            if page_num >= max_pages:
+                break
+            yield page
+
+    def _extract_pages(self, key: str, max_pages: int, extractor,
+                       cache: Optional[PDFExtractionCache]) -> Dict[int, Any]:
+        """
+        Returns {page_number: extractor(page)} for the first max_pages pages,
+        extracting only the pages missing from the cache; results the
+        extractor wraps in _Uncached are not cached
+        """
+        cached = cache.get_pages(self.content_hash) if cache else {}
+        results = {}
+        extracted = {}
+
+        for page_number in range(1, min(max_pages, self.page_count) + 1):
+            page_cache = cached.get(page_number, {})
+            if key in page_cache:
+                results[page_number] = page_cache[key]
+                continue
+
+            value = extractor(self._pdf.pages[page_number - 1])
+            if isinstance(value, _Uncached):
+                results[page_number] = value.value
+                continue
+            results[page_number] = value
+            extracted[page_number] = {key: value}
+
+        if cache and extracted:
+            cache.update_pages(self.content_hash, extracted)
+
+        return results
+
+    def extract_text(self, max_pages: int = 20,
+                     cache: Optional[PDFExtractionCache] = None,
+                     reject_over_limit: bool = False) -> Optional[str]:
+        """
+        Extracts text from the first max_pages pages of the open PDF
+
+        With reject_over_limit enabled, a PDF with more than max_pages pages
+        is rejected (None) instead.
+        """
+        if not self._check_extractable(max_pages, reject_over_limit):
+            return None
+
+        try:
+            page_texts = self._extract_pages('text', max_pages, lambda page: page.extract_text(), cache)
+
+            extracted_text = "".join(
+                f"\n--- Page {page_number} ---\n{text}\n"
+                for page_number, text in page_texts.items() if text
+            )
+            return extracted_text.strip()
+
+        except Exception as e:
+            print(f"Error extracting text from PDF: {str(e)}")
+            return None
+
+    def extract_tables(self, max_pages: int = 10,
+                       cache: Optional[PDFExtractionCache] = None,
+                       prescreen: bool = True,
+                       as_dataframes: bool = False,
+                       reject_over_limit: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """
+        Extracts tables from the first max_pages pages of the open PDF
+
+        With prescreen enabled, pages without enough ruling lines are skipped
+        before running pdfplumber's table finder. With as_dataframes enabled,
+        each table also carries a 'dataframe' with typed numeric columns.
+        With reject_over_limit enabled, a PDF with more than max_pages pages
+        is rejected (None) instead.
+        """
+        if not self._check_extractable(max_pages, reject_over_limit):
+            return None
+
+        def extract_page_tables(page):
+            if prescreen and not page_may_contain_tables(page):
+                # Not a real extraction result, so a later prescreen=False
+                # call must not find it in the cache
+                return _Uncached([])
+            return page.extract_tables()
+
+        try:
+            page_tables = self._extract_pages('tables', max_pages, extract_page_tables, cache)
+
+            tables_data = []
+            for page_number, tables in page_tables.items():
                 if tables:
                     for table_idx, table in enumerate(tables):
-                        tables_data.append({
-                            'page': page_num + 1,
+                        table_entry = {
+                            'page': page_number,
                             'table_index': table_idx + 1,
                             'data': table
-                        })
-        
-        return tables_data
-    
+                        }
+                        if as_dataframes:
+                            table_entry['dataframe'] = table_to_dataframe(table)
+                        tables_data.append(table_entry)
+
+            return tables_data
+
+        except Exception as e:
+            print(f"Error extracting tables from PDF: {str(e)}")
+            return None
+
+def validate_pdf_file(file_path: str) -> Dict[str, Any]:
+    """
+    Validates a PDF file for security before processing
+    """
+    with PDFDocumentSession(file_path) as session:
+        return session.validation
+
+def extract_text_from_pdf_secure(file_path: str, max_pages: int = 20,
+                                 cache: Optional[PDFExtractionCache] = None,
+                                 reject_over_limit: bool = False) -> Optional[str]:
+    """
+    Securely extracts text from the first max_pages pages of a PDF
+    """
+    with PDFDocumentSession(file_path) as session:
+        return session.extract_text(max_pages=max_pages, cache=cache,
+                                    reject_over_limit=reject_over_limit)
+
+def extract_tables_from_pdf_secure(file_path: str, max_pages: int = 10,
+                                   cache: Optional[PDFExtractionCache] = None,
+                                   prescreen: bool = True,
+                                   as_dataframes: bool = False,
+                                   reject_over_limit: bool = False) -> Optional[list]:
+    """
+    Securely extracts tables from the first max_pages pages of a PDF
+    """
+    with PDFDocumentSession(file_path) as session:
+        return session.extract_tables(max_pages=max_pages, cache=cache,
+                                      prescreen=prescreen, as_dataframes=as_dataframes,
+                                      reject_over_limit=reject_over_limit)
+
+# Extraction caches of a batch worker process, by directory; sharing one per
+# process means the cache directory is scanned for its size only once
+_worker_caches = {}
+
+def _worker_cache(cache_dir: str) -> PDFExtractionCache:
+    cache = _worker_caches.get(cache_dir)
+    if cache is None:
+        cache = _worker_caches[cache_dir] = PDFExtractionCache(cache_dir)
+    return cache
+
+def _ingest_single_pdf(file_path: str, max_pages: int, include_tables: bool,
+                       cache_dir: Optional[str], reject_over_limit: bool = False) -> Dict[str, Any]:
+    """
+    Validates and extracts one PDF for batch ingestion (runs in a worker process)
+    """
+    started = time.perf_counter()
+    record = {
+        'path': file_path,
+        'status': 'ok',
+        'size_mb': 0,
+        'page_count': 0,
+        'pages_extracted': 0,
+        'text': None,
+        'tables': None,
+        'errors': [],
+        'retryable': False
+    }
+
+    try:
+        cache = _worker_cache(cache_dir) if cache_dir else None
+        with PDFDocumentSession(file_path) as session:
+            record['size_mb'] = session.validation['size_mb']
+            record['page_count'] = session.page_count
+
+            if not session.is_valid:
+                record['status'] = 'invalid'
+                record['errors'] = list(session.validation['errors'])
+                record['retryable'] = session.validation['retryable']
+            elif reject_over_limit and session.page_count > max_pages:
+                record['status'] = 'skipped'
+                record['errors'].append(f"PDF has {session.page_count} pages, exceeding limit of {max_pages}")
+            else:
+                record['pages_extracted'] = min(session.page_count, max_pages)
+                record['text'] = session.extract_text(max_pages=max_pages, cache=cache)
+                if record['text'] is None:
+                    record['status'] = 'error'
+                    record['errors'].append("Text extraction failed")
+
+                if include_tables:
+                    record['tables'] = session.extract_tables(max_pages=max_pages, cache=cache)
+                    if record['tables'] is None:
+                        record['status'] = 'error'
+                        record['errors'].append("Table extraction failed")
+
     except Exception as e:
-        print(f"Error extracting tables from PDF: {str(e)}")
-        return None
+        record['status'] = 'error'
+        record['errors'].append(f"Ingestion error: {str(e)}")
+
+    record['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return record
+
+def collect_pdf_paths(source: str, pattern: str = '**/*') -> List[str]:
+    """
+    Resolves a directory (searched with pattern) or a glob expression to PDF paths
+    """
+    if os.path.isdir(source):
+        matches = Path(source).glob(pattern)
+    else:
+        matches = (Path(match) for match in glob.glob(source, recursive=True))
+
+    return sorted(str(path.resolve()) for path in matches
+                  if path.is_file() and path.suffix.lower() == '.pdf')
+
+def _load_completed_paths(progress_path: Path, max_pages: int,
+                          reject_over_limit: bool = False) -> Set[str]:
+    """
+    Reads the progress log and returns paths that need no further attempt:
+    ingested files (unless max_pages now covers pages they were cut short
+    of), files that failed validation permanently, and, with
+    reject_over_limit, files skipped for a page count that still exceeds
+    max_pages
+    """
+    completed = set()
+    if not progress_path.exists():
+        return completed
+
+    with open(progress_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Ignore a partially written last line
+            status = entry.get('status')
+            if status == 'ok':
+                # Entries from older logs carry no count and are kept
+                pages_extracted = entry.get('pages_extracted')
+                done = (pages_extracted is None or
+                        pages_extracted >= min(entry.get('page_count', 0), max_pages))
+            elif status == 'invalid':
+                # Entries from older logs carry no flag and are retried
+                done = entry.get('retryable') is False
+            elif status == 'skipped':
+                done = reject_over_limit and entry.get('page_count', 0) > max_pages
+            else:
+                done = False
 
-def main():
+            if done:
+                completed.add(entry['path'])
+            else:
+                completed.discard(entry.get('path'))
+    return completed
+
+class _IngestionWriter:
     """
-    Example usage of the secure PDF reader
+    Incrementally writes ingestion records as JSONL or Parquet parts,
+    logging each file to the progress log only once its record is on disk
+
+    Without resume, earlier output and progress are discarded. With resume,
+    compact() drops records the progress log does not mark complete (e.g.
+    written just before a crash, or about to be retried) and all but the
+    last record of each file, so a resumed run never duplicates records.
     """
+
+    PART_PATTERN = 'part-*.parquet'
+
+    def __init__(self, output_path: str, output_format: str, parquet_batch_size: int,
+                 resume: bool = True):
+        self.output_format = output_format
+        self.parquet_batch_size = parquet_batch_size
+        self._pending = []
+        mode = 'a' if resume else 'w'
+
+        if output_format == 'parquet':
+            self.output_dir = Path(output_path)
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self.progress_path = self.output_dir / '_progress.jsonl'
+            if not resume:
+                for part_path in self.output_dir.glob(self.PART_PATTERN):
+                    part_path.unlink()
+            self._output = None
+        elif output_format == 'jsonl':
+            self.output_path = Path(output_path)
+            self.output_path.parent.mkdir(parents=True, exist_ok=True)
+            self.progress_path = Path(f"{output_path}.progress.jsonl")
+            self._output = open(self.output_path, mode, encoding='utf-8')
+        else:
+            raise ValueError(f"Unsupported output format: {output_format}")
+
+        self._progress = open(self.progress_path, mode, encoding='utf-8')
+        self._part_index = self._next_part_index()
+
+    def _next_part_index(self) -> int:
+        if self.output_format != 'parquet':
+            return 0
+        indexes = [int(part_path.stem.split('-')[1]) for part_path in self.output_dir.glob(self.PART_PATTERN)]
+        return max(indexes, default=-1) + 1
+
+    def compact(self, completed: Set[str]):
+        """
+        Keeps only the last record of each completed path in the output
+        """
+        if self.output_format == 'jsonl':
+            self._compact_jsonl(completed)
+        else:
+            self._compact_parquet(completed)
+
+    def _compact_jsonl(self, completed: Set[str]):
+        self._output.close()
+
+        # First pass finds the last record line of each completed path
+        last_line = {}
+        with open(self.output_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f):
+                try:
+                    path = json.loads(line)['path']
+                except (ValueError, KeyError, TypeError):
+                    continue  # A partially written last line
+                if path in completed:
+                    last_line[path] = line_number
+        keep = set(last_line.values())
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as out, \
+                    open(self.output_path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f):
+                    if line_number in keep:
+                        out.write(line)
+            os.replace(tmp_path, self.output_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        finally:
+            self._output = open(self.output_path, 'a', encoding='utf-8')
+
+    def _compact_parquet(self, completed: Set[str]):
+        import pandas as pd
+
+        part_paths = sorted(self.output_dir.glob(self.PART_PATTERN))
+        if not part_paths:
+            return
+
+        part_rows = {}
+        last_row = {}
+        for part_path in part_paths:
+            try:
+                paths = pd.read_parquet(part_path, columns=['path'])['path'].tolist()
+            except Exception:
+                paths = []  # A part cut short by a crash; its records were never logged
+            part_rows[part_path] = paths
+            for row, path in enumerate(paths):
+                if path in completed:
+                    last_row[path] = (part_path, row)
+
+        for part_path, paths in part_rows.items():
+            keep = [row for row, path in enumerate(paths) if last_row.get(path) == (part_path, row)]
+            if len(keep) == len(paths) and paths:
+                continue
+            if keep:
+                self._write_part(pd.read_parquet(part_path).iloc[keep], part_path)
+            else:
+                part_path.unlink()
+
+    def _write_part(self, df, part_path: Path):
+        # Written under a temporary name so a crash never leaves a partial part
+        tmp_path = part_path.with_name(f".{part_path.name}.tmp")
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, part_path)
+
+    def _log_progress(self, records: List[Dict[str, Any]]):
+        for record in records:
+            self._progress.write(json.dumps({
+                'path': record['path'],
+                'status': record['status'],
+                'page_count': record['page_count'],
+                'pages_extracted': record['pages_extracted'],
+                'retryable': record['retryable'],
+                'elapsed_seconds': record['elapsed_seconds'],
+                'errors': record['errors']
+            }) + '\n')
+        self._progress.flush()
+
+    def write(self, record: Dict[str, Any]):
+        if self.output_format == 'jsonl':
+            self._output.write(json.dumps(record) + '\n')
+            self._output.flush()
+            self._log_progress([record])
+        else:
+            self._pending.append(record)
+            if len(self._pending) >= self.parquet_batch_size:
+                self.flush()
+
+    def flush(self):
+        if self.output_format != 'parquet' or not self._pending:
+            return
+
+        import pandas as pd
+
+        df = pd.DataFrame(self._pending)
+        # Nested table data is stored as JSON text to keep a flat schema
+        df['tables'] = df['tables'].map(lambda tables: None if tables is None else json.dumps(tables))
+        df['errors'] = df['errors'].map(json.dumps)
+        self._write_part(df, self.output_dir / f"part-{self._part_index:05d}.parquet")
+        self._part_index += 1
+
+        self._log_progress(self._pending)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        if self._output is not None:
+            self._output.close()
+        self._progress.close()
+
+def ingest_pdf_batch(source: str, output_path: str, output_format: str = 'jsonl',
+                     pattern: str = '**/*', max_workers: int = 4, max_pages: int = 20,
+                     include_tables: bool = True, cache_dir: Optional[str] = None,
+                     resume: bool = True, parquet_batch_size: int = 100,
+                     reject_over_limit: bool = False) -> Dict[str, Any]:
+    """
+    Validates and extracts text/tables from many PDFs with a bounded worker pool
+
+    Records are streamed to output_path (a JSONL file, or a directory of
+    Parquet parts) as workers finish. The first max_pages pages of each PDF
+    are extracted; with reject_over_limit, longer PDFs are skipped instead.
+    A progress log next to the output records per-file status and timing,
+    so an interrupted run can be resumed and files that were already
+    ingested are skipped. Files that failed for a transient reason (e.g.
+    high memory usage) are retried, as are files that were cut short or
+    skipped for their page count once max_pages allows more of them; their
+    earlier records are dropped from the output. Without resume, earlier
+    output is overwritten.
+    """
+    summary = {
+        'total': 0,
+        'skipped_completed': 0,
+        'processed': 0,
+        'failed': 0,
+        'elapsed_seconds': 0.0
+    }
+    started = time.perf_counter()
+
+    paths = collect_pdf_paths(source, pattern)
+    summary['total'] = len(paths)
+
+    writer = _IngestionWriter(output_path, output_format, parquet_batch_size, resume=resume)
+    try:
+        if resume:
+            completed = _load_completed_paths(writer.progress_path, max_pages, reject_over_limit)
+            writer.compact(completed)
+            remaining = [path for path in paths if path not in completed]
+            summary['skipped_completed'] = len(paths) - len(remaining)
+            paths = remaining
+
+        max_workers = max(1, max_workers)
+        path_iter = iter(paths)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = set()
+            try:
+                while True:
+                    # Keep a bounded number of files queued per worker
+                    while len(in_flight) < max_workers * 2:
+                        path = next(path_iter, None)
+                        if path is None:
+                            break
+                        in_flight.add(executor.submit(_ingest_single_pdf, path, max_pages,
+                                                      include_tables, cache_dir, reject_over_limit))
+                    if not in_flight:
+                        break
+
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record = future.result()
+                        writer.write(record)
+                        summary['processed'] += 1
+                        if record['status'] != 'ok':
+                            summary['failed'] += 1
+                            print(f"{record['status']}: {record['path']}: {'; '.join(record['errors'])}")
+            except KeyboardInterrupt:
+                print("Ingestion interrupted; completed files are recorded and will be skipped on resume")
+                for future in in_flight:
+                    future.cancel()
+                raise
+    finally:
+        writer.close()
+        summary['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+
+    return summary
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Command line entry point for batch PDF ingestion
+    """
+    parser = argparse.ArgumentParser(
+        description="Secure PDF Reader for OpenClaw - validates and extracts content from PDFs"
+    )
+    parser.add_argument('source', nargs='?', help="Directory of PDFs or a glob expression")
+    parser.add_argument('output', nargs='?', help="Output JSONL file, or directory for Parquet parts")
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl', help="Output format")
+    parser.add_argument('--pattern', default='**/*', help="Glob pattern used when source is a directory (non-PDF matches are ignored)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help="Number of worker processes")
+    parser.add_argument('--max-pages', type=int, default=20, help="Maximum pages per PDF")
+    parser.add_argument('--reject-over-limit', action='store_true',
+                        help="Skip PDFs with more than --max-pages pages instead of extracting their first pages")
+    parser.add_argument('--no-tables', action='store_true', help="Skip table extraction")
+    parser.add_argument('--cache-dir', default=None, help="Directory for the extraction cache")
+    parser.add_argument('--no-resume', action='store_true', help="Discard earlier output and progress and process every file")
+    args = parser.parse_args(argv)
+
     print("Secure PDF Reader for OpenClaw")
     print("Validates and extracts content from PDFs with security measures")
-    
-    # Example usage (commented out since no file is provided)
-    # file_path = "example.pdf"
-    # text_content = extract_text_from_pdf_secure(file_path)
-    # if text_content:
-    #     print(f"Extracted {len(text_content)} characters from PDF")
+
+    if not args.source or not args.output:
+        parser.print_help()
+        return 0
+
+    summary = ingest_pdf_batch(
+        args.source,
+        args.output,
+        output_format=args.format,
+        pattern=args.pattern,
+        max_workers=args.workers,
+        max_pages=args.max_pages,
+        include_tables=not args.no_tables,
+        cache_dir=args.cache_dir,
+        resume=not args.no_resume,
+        reject_over_limit=args.reject_over_limit
+    )
+    print(f"Ingested {summary['processed']} of {summary['total']} PDFs "
+          f"({summary['skipped_completed']} already done, {summary['failed']} failed) "
+          f"in {summary['elapsed_seconds']}s")
+    return 1 if summary['failed'] else 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Tests for the secure PDF reader's table pre-screen and extraction cache
+Run with: python -m pytest tools/data_analysis/test_secure_pdf_reader.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+pdfplumber = pytest.importorskip("pdfplumber")
+secure_pdf_reader = pytest.importorskip("secure_pdf_reader")
+
+EXPECTED_TABLE = [[f"R{row}C{column}" for column in range(3)] for row in range(3)]
+
+
+def build_pdf(*contents: bytes) -> bytes:
+    """Builds a PDF with one page around each raw content stream"""
+    page_ids = [4 + 2 * index for index in range(len(contents))]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(contents)),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id, content in zip(page_ids, contents):
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_id + 1))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def page_text(label: str) -> bytes:
+    return b"BT /F1 12 Tf 72 720 Td (%s) Tj ET\n" % label.encode('ascii')
+
+
+def cell_text() -> bytes:
+    return b"".join(b"BT /F1 10 Tf %d %d Td (R%dC%d) Tj ET\n" % (x + 10, y + 5, row, column)
+                    for row, y in enumerate((680, 660, 640))
+                    for column, x in enumerate((100, 200, 300)))
+
+
+def polyline_table() -> bytes:
+    """A 3x3 grid stroked as one path, which pdfminer reports as a single curve"""
+    points = [(100, 700), (400, 700), (400, 680), (100, 680), (100, 660), (400, 660),
+              (400, 640), (100, 640), (100, 700), (200, 700), (200, 640), (300, 640),
+              (300, 700), (400, 700), (400, 640)]
+    path = b"%d %d m " % points[0] + b" ".join(b"%d %d l" % point for point in points[1:]) + b" S\n"
+    return path + cell_text()
+
+
+@pytest.fixture
+def curve_table_pdf(tmp_path):
+    path = tmp_path / "curve_table.pdf"
+    path.write_bytes(build_pdf(polyline_table()))
+    return str(path)
+
+
+@pytest.fixture
+def text_only_pdf(tmp_path):
+    path = tmp_path / "text_only.pdf"
+    path.write_bytes(build_pdf(cell_text()))
+    return str(path)
+
+
+def test_curve_drawn_table_passes_prescreen(curve_table_pdf):
+    with pdfplumber.open(curve_table_pdf) as pdf:
+        page = pdf.pages[0]
+        assert len(page.objects.get('curve', [])) == 1
+        assert secure_pdf_reader.page_may_contain_tables(page)
+
+    tables = secure_pdf_reader.extract_tables_from_pdf_secure(curve_table_pdf, prescreen=True)
+    assert [table['data'] for table in tables] == [EXPECTED_TABLE]
+
+
+def test_text_only_page_is_screened_out(text_only_pdf):
+    with pdfplumber.open(text_only_pdf) as pdf:
+        assert not secure_pdf_reader.page_may_contain_tables(pdf.pages[0])
+
+
+def test_prescreen_skips_are_not_cached(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "table.pdf"
+    pdf_path.write_bytes(build_pdf(polyline_table()))
+    cache = secure_pdf_reader.PDFExtractionCache(str(tmp_path / "cache"))
+
+    # Force the pre-screen to reject the page
+    monkeypatch.setattr(secure_pdf_reader, "page_may_contain_tables", lambda page: False)
+    assert secure_pdf_reader.extract_tables_from_pdf_secure(str(pdf_path), cache=cache) == []
+
+    tables = secure_pdf_reader.extract_tables_from_pdf_secure(str(pdf_path), cache=cache, prescreen=False)
+    assert [table['data'] for table in tables] == [EXPECTED_TABLE]
+
+    # A full extraction is cached and reused with the pre-screen on
+    tables = secure_pdf_reader.extract_tables_from_pdf_secure(str(pdf_path), cache=cache)
+    assert [table['data'] for table in tables] == [EXPECTED_TABLE]
+
+
+def test_resume_retries_transient_failures_and_page_limit_skips(tmp_path):
+    progress_path = tmp_path / "out.jsonl.progress.jsonl"
+    entries = [
+        {'path': 'ok.pdf', 'status': 'ok', 'page_count': 3, 'retryable': False},
+        {'path': 'corrupt.pdf', 'status': 'invalid', 'page_count': 0, 'retryable': False},
+        {'path': 'busy.pdf', 'status': 'invalid', 'page_count': 0, 'retryable': True},
+        {'path': 'legacy.pdf', 'status': 'invalid'},
+        {'path': 'long.pdf', 'status': 'skipped', 'page_count': 40, 'retryable': False},
+        {'path': 'medium.pdf', 'status': 'skipped', 'page_count': 25, 'retryable': False},
+        {'path': 'broken.pdf', 'status': 'error', 'page_count': 2, 'retryable': False},
+    ]
+    progress_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries), encoding='utf-8')
+
+    completed = secure_pdf_reader._load_completed_paths(progress_path, max_pages=30, reject_over_limit=True)
+    assert completed == {'ok.pdf', 'corrupt.pdf', 'long.pdf'}
+
+    # Without rejection, skipped files are retried for their first pages
+    completed = secure_pdf_reader._load_completed_paths(progress_path, max_pages=30)
+    assert completed == {'ok.pdf', 'corrupt.pdf'}
+
+
+def test_resume_extends_documents_cut_short_by_max_pages(tmp_path):
+    progress_path = tmp_path / "out.jsonl.progress.jsonl"
+    entries = [
+        {'path': 'short.pdf', 'status': 'ok', 'page_count': 5, 'pages_extracted': 5},
+        {'path': 'long.pdf', 'status': 'ok', 'page_count': 40, 'pages_extracted': 20},
+    ]
+    progress_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries), encoding='utf-8')
+
+    assert secure_pdf_reader._load_completed_paths(progress_path, max_pages=20) == {'short.pdf', 'long.pdf'}
+    assert secure_pdf_reader._load_completed_paths(progress_path, max_pages=30) == {'short.pdf'}
+
+
+@pytest.fixture
+def three_page_pdf(tmp_path):
+    path = tmp_path / "three_pages.pdf"
+    path.write_bytes(build_pdf(page_text("First"), page_text("Second"), polyline_table()))
+    return str(path)
+
+
+def test_long_pdfs_extract_their_first_pages(three_page_pdf):
+    text = secure_pdf_reader.extract_text_from_pdf_secure(three_page_pdf, max_pages=2)
+    assert "--- Page 1 ---\nFirst" in text and "--- Page 2 ---\nSecond" in text
+    assert "Page 3" not in text
+
+    assert secure_pdf_reader.extract_tables_from_pdf_secure(three_page_pdf, max_pages=2) == []
+    tables = secure_pdf_reader.extract_tables_from_pdf_secure(three_page_pdf, max_pages=3)
+    assert [(table['page'], table['data']) for table in tables] == [(3, EXPECTED_TABLE)]
+
+
+def test_long_pdfs_can_be_rejected(three_page_pdf):
+    assert secure_pdf_reader.extract_text_from_pdf_secure(
+        three_page_pdf, max_pages=2, reject_over_limit=True) is None
+    assert secure_pdf_reader.extract_tables_from_pdf_secure(
+        three_page_pdf, max_pages=2, reject_over_limit=True) is None
+    assert secure_pdf_reader.extract_text_from_pdf_secure(
+        three_page_pdf, max_pages=3, reject_over_limit=True) is not None
+
+
+def test_batch_worker_scans_the_cache_directory_once(tmp_path, monkeypatch):
+    paths = []
+    for index in range(4):
+        path = tmp_path / f"doc{index}.pdf"
+        path.write_bytes(build_pdf(page_text(f"Document {index}")))
+        paths.append(str(path))
+
+    scans = []
+    scan = secure_pdf_reader.PDFExtractionCache._scan
+    monkeypatch.setattr(secure_pdf_reader.PDFExtractionCache, "_scan",
+                        lambda self: scans.append(self) or scan(self))
+    monkeypatch.setattr(secure_pdf_reader, "_worker_caches", {})
+
+    cache_dir = str(tmp_path / "cache")
+    for path in paths:
+        record = secure_pdf_reader._ingest_single_pdf(path, 20, False, cache_dir)
+        assert record['status'] == 'ok'
+    assert len(scans) == 1
+    assert len(os.listdir(cache_dir)) == len(paths)
+
+
+@pytest.fixture
+def pdf_folder(tmp_path):
+    folder = tmp_path / "pdfs"
+    folder.mkdir()
+    for index in range(3):
+        (folder / f"doc{index}.pdf").write_bytes(build_pdf(page_text(f"Document {index}")))
+    return folder
+
+
+def output_paths(output_path, output_format):
+    if output_format == 'jsonl':
+        with open(output_path, 'r', encoding='utf-8') as f:
+            return sorted(json.loads(line)['path'] for line in f)
+    pd = pytest.importorskip("pandas")
+    return sorted(path for part in sorted(output_path.glob('part-*.parquet'))
+                  for path in pd.read_parquet(part)['path'])
+
+
+def ingest(pdf_folder, output_path, output_format, **kwargs):
+    return secure_pdf_reader.ingest_pdf_batch(str(pdf_folder), str(output_path), output_format=output_format,
+                                              max_workers=1, include_tables=False, **kwargs)
+
+
+@pytest.mark.parametrize("output_format", ["jsonl", "parquet"])
+def test_no_resume_overwrites_earlier_output(tmp_path, pdf_folder, output_format):
+    if output_format == 'parquet':
+        pytest.importorskip("pyarrow")
+    output_path = tmp_path / ("out.jsonl" if output_format == 'jsonl' else "out")
+    expected = sorted(str(path.resolve()) for path in pdf_folder.glob('*.pdf'))
+
+    ingest(pdf_folder, output_path, output_format)
+    summary = ingest(pdf_folder, output_path, output_format, resume=False)
+
+    assert summary['processed'] == 3
+    assert output_paths(output_path, output_format) == expected
+
+
+def test_resume_drops_records_that_were_never_logged(tmp_path, pdf_folder):
+    output_path = tmp_path / "out.jsonl"
+    ingest(pdf_folder, output_path, 'jsonl')
+    done = str((pdf_folder / "doc0.pdf").resolve())
+
+    # A crash after writing a record but before logging it, mid-way through
+    # the next record, with one file due for a retry
+    progress_path = tmp_path / "out.jsonl.progress.jsonl"
+    retried = str((pdf_folder / "doc1.pdf").resolve())
+    with open(progress_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'path': retried, 'status': 'invalid', 'retryable': True}) + '\n')
+    with open(output_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'path': done, 'status': 'ok'}) + '\n')
+        f.write('{"path": "partial')
+
+    summary = ingest(pdf_folder, output_path, 'jsonl')
+
+    assert summary['skipped_completed'] == 2 and summary['processed'] == 1
+    assert output_paths(output_path, 'jsonl') == sorted(str(path.resolve()) for path in pdf_folder.glob('*.pdf'))
+
+
+def test_resume_drops_unlogged_parquet_parts(tmp_path, pdf_folder):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    output_path = tmp_path / "out"
+    ingest(pdf_folder, output_path, 'parquet')
+
+    # A part written just before a crash, and one cut short by it
+    pd.read_parquet(output_path / "part-00000.parquet").to_parquet(output_path / "part-00001.parquet", index=False)
+    (output_path / "part-00002.parquet").write_bytes(b"PAR1 truncated")
+    with open(output_path / "_progress.jsonl", 'r+', encoding='utf-8') as f:
+        entries = f.readlines()
+        f.seek(0)
+        f.truncate()
+        f.writelines(entries[:2])
+
+    summary = ingest(pdf_folder, output_path, 'parquet')
+
+    assert summary['processed'] == 1
+    assert output_paths(output_path, 'parquet') == sorted(str(path.resolve()) for path in pdf_folder.glob('*.pdf'))
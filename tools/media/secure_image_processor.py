@@ -5,15 +5,1262 @@ Implements safe image processing with security validations
 """
 
 import os
+import sys
+import json
+import math
+import time
+import shutil
+import fnmatch
+import itertools
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Dict, Any, Tuple
-from PIL import Image
+from typing import Optional, Dict, Any, Tuple, Iterator, List
+from PIL import Image, ExifTags
 import tempfile
 
+VALID_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+MAX_IMAGE_PIXELS = 100_000_000  # 100 megapixels, guards against decompression bombs
+
+# Limits for streaming tiled processing of scans and orthophotos
+TILED_MAX_IMAGE_PIXELS = 4_000_000_000
+TILED_MAX_FILE_SIZE_MB = 4096
+TILED_FORMATS = {'.tiff', '.tif', '.png'}
+
+# Resize quality/speed presets:
+#   draft_gap     - JPEG DCT-domain downscaling via Image.draft() to at least
+#                   draft_gap times the target size (None disables drafting)
+#   reducing_gap  - integer box reduction to reducing_gap times the target
+#                   size before the final resample (None resamples directly)
+RESIZE_PRESETS = {
+    'quality': {'resample': Image.Resampling.LANCZOS, 'draft_gap': None, 'reducing_gap': None},
+    'balanced': {'resample': Image.Resampling.LANCZOS, 'draft_gap': 2.0, 'reducing_gap': 2.0},
+    'fast': {'resample': Image.Resampling.BILINEAR, 'draft_gap': 1.0, 'reducing_gap': 1.0},
+}
+
+class ImageSession:
+    """
+    Opens an image once and shares it across validation and processing
+
+    Opening only reads the file header (size, format, mode, EXIF); pixels
+    are decoded on the first call to decode() and reused afterwards.
+
+    Usage:
+        with ImageSession("photo.jpg") as session:
+            if session.is_valid:
+                resize_image_secure(session.file_path, "small.jpg", session=session)
+                get_image_info(session.file_path, session=session)
+    """
+
+    def __init__(self, file_path: str, max_size_mb: float = 50, max_pixels: int = MAX_IMAGE_PIXELS):
+        self.file_path = file_path
+        self.max_size_mb = max_size_mb
+        self.max_pixels = max_pixels
+        self.validation = {
+            'is_valid': True,
+            'errors': [],
+            'size_mb': 0,
+            'dimensions': (0, 0),
+            'format': None
+        }
+        self.mode = None
+        self.exif = {}
+        self.exif_bytes = None
+        self._image = None
+        self._decoded = False
+        self.is_drafted = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def is_valid(self) -> bool:
+        return self.validation['is_valid']
+
+    def _fail(self, message: str):
+        self.validation['is_valid'] = False
+        self.validation['errors'].append(message)
+
+    def open(self) -> Dict[str, Any]:
+        """
+        Validates the file and reads its header without decoding pixels
+        """
+        if self._image is not None:
+            return self.validation
+
+        try:
+            # Check if file exists
+            if not os.path.exists(self.file_path):
+                self._fail("File does not exist")
+                return self.validation
+
+            # Check file size (limit to 50MB by default)
+            size_bytes = os.path.getsize(self.file_path)
+            size_mb = size_bytes / (1024 * 1024)
+            self.validation['size_mb'] = round(size_mb, 2)
+
+            if size_mb > self.max_size_mb:
+                self._fail(f"File too large: {size_mb:.2f}MB (max {self.max_size_mb}MB)")
+
+            # Check file extension
+            file_ext = Path(self.file_path).suffix.lower()
+            if file_ext not in VALID_IMAGE_EXTENSIONS:
+                self._fail(f"Invalid file extension: {file_ext}. Valid: {', '.join(VALID_IMAGE_EXTENSIONS)}")
+
+            # Image.open only parses the header; pixel data stays on disk
+            try:
+                self._image = Image.open(self.file_path)
+                self.validation['dimensions'] = self._image.size
+                self.validation['format'] = self._image.format
+                self.mode = self._image.mode
+
+                # Check dimensions to prevent decompression bombs
+                pixel_count = self._image.size[0] * self._image.size[1]
+                if pixel_count > self.max_pixels:
+                    self._fail(f"Image too large: {pixel_count:,} pixels (max {self.max_pixels:,}); "
+                               f"use process_large_image_tiled for TIFF/PNG images above this limit")
+
+                # Parse EXIF from the raw header segment; getexif() can force
+                # a full decode for formats that store EXIF after the pixels
+                self.exif_bytes = self._image.info.get('exif')
+                if self.exif_bytes:
+                    exif = Image.Exif()
+                    exif.load(self.exif_bytes)
+                    # Merge the Exif and GPS sub-IFDs as _getexif() does, so
+                    # tags like DateTimeOriginal and FNumber are included
+                    self.exif = dict(exif)
+                    self.exif.update(exif.get_ifd(ExifTags.IFD.Exif))
+                    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+                    if gps:
+                        self.exif[ExifTags.IFD.GPSInfo] = gps
+            except Exception as e:
+                self.close()
+                self._fail(f"Invalid image format: {str(e)}")
+
+        except Exception as e:
+            self.close()
+            self._fail(f"Validation error: {str(e)}")
+
+        return self.validation
+
+    def decode(self, draft_size: Optional[Tuple[int, int]] = None) -> Image.Image:
+        """
+        Decodes pixel data on first use and returns the shared image
+
+        When draft_size is given, JPEGs are decoded at a reduced DCT scale
+        that is still at least draft_size. A draft decode is reused while it
+        covers the requested draft_size; a larger request, or a call without
+        draft_size, reloads the image from the file.
+        """
+        if self._image is None:
+            raise ValueError("Image session is not open")
+
+        if self._decoded and self.is_drafted:
+            width, height = self._image.size
+            if draft_size is None or width < draft_size[0] or height < draft_size[1]:
+                # A loaded image can't be re-drafted, so start from the file
+                self._image.close()
+                self._image = Image.open(self.file_path)
+                self._decoded = False
+                self.is_drafted = False
+
+        if not self._decoded:
+            if draft_size is not None and self._image.format == 'JPEG':
+                self._image.draft(None, draft_size)
+                self.is_drafted = self._image.size != self.validation['dimensions']
+            self._image.load()
+            self._decoded = True
+
+        return self._image
+
+    def close(self):
+        """
+        Releases the underlying image and file handle
+        """
+        if self._image is not None:
+            try:
+                self._image.close()
+            finally:
+                self._image = None
+                self._decoded = False
+                self.is_drafted = False
+
+@contextmanager
+def _image_session(input_path: str, session: Optional[ImageSession] = None) -> Iterator[ImageSession]:
+    """
+    Yields the caller's session, or a temporary one owned by this call
+    """
+    if session is not None:
+        session.open()
+        yield session
+    else:
+        with ImageSession(input_path) as own_session:
+            yield own_session
+
+def _flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """
+    Composites transparent or palette images onto a white RGB background
+    """
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    if img.mode in ('RGBA', 'LA'):
+        background.paste(img, mask=img.split()[-1])
+    else:
+        background.paste(img)
+    return background
+
+def _prepare_for_format(img: Image.Image, output_format: str) -> Image.Image:
+    """
+    Adjusts image mode for formats that can't store transparency or palettes
+    """
+    if output_format.upper() in ['JPEG', 'JPG'] and img.mode in ('RGBA', 'LA', 'P'):
+        # Create a white background for JPEG conversion
+        return _flatten_to_rgb(img)
+    if img.mode == 'P' and output_format.upper() not in ['PNG', 'TIFF']:
+        # Convert palette mode to RGB for formats that don't support it
+        return img.convert('RGB')
+    return img
+
+def _fit_within(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Computes the aspect-preserving size Image.thumbnail would produce
+    """
+    width, height = size
+    x, y = map(math.floor, max_size)
+    if x >= width and y >= height:
+        return size
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return (x, y)
+
 def validate_image_file(file_path: str) -> Dict[str, Any]:
     """
     Validates an image file for security before processing
     """
+    with ImageSession(file_path) as session:
+        return session.validation
+
+def _preset_settings(preset: str) -> Dict[str, Any]:
+    if preset not in RESIZE_PRESETS:
+        raise ValueError(f"Unknown resize preset: {preset}. Valid: {', '.join(RESIZE_PRESETS)}")
+    return RESIZE_PRESETS[preset]
+
+def _draft_size_for(target_size: Tuple[int, int], settings: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    if settings['draft_gap'] is None:
+        return None
+    return (int(target_size[0] * settings['draft_gap']),
+            int(target_size[1] * settings['draft_gap']))
+
+def _resize_image(img: Image.Image, target_size: Tuple[int, int], settings: Dict[str, Any]) -> Image.Image:
+    if img.size == target_size:
+        return img
+    # Resizing into a new image leaves the source image reusable
+    return img.resize(target_size, settings['resample'], reducing_gap=settings['reducing_gap'])
+
+def _resize_decoded(session: ImageSession, max_size: Tuple[int, int], preset: str) -> Image.Image:
+    """
+    Decodes (drafting when the preset allows) and resizes the session image
+    to fit within max_size, returning a new image
+    """
+    settings = _preset_settings(preset)
+
+    # Target size comes from the header so it is unaffected by drafting
+    target_size = _fit_within(session.validation['dimensions'], max_size)
+
+    img = session.decode(_draft_size_for(target_size, settings))
+    return _resize_image(img, target_size, settings)
+
+def resize_image_secure(input_path: str, output_path: str, max_size: Tuple[int, int] = (1920, 1080),
+                        session: Optional[ImageSession] = None, preset: str = 'balanced') -> bool:
+    """
+    Securely resizes an image with safety limits
+
+    preset selects a RESIZE_PRESETS entry: 'quality' decodes at full
+    resolution and resamples directly, 'balanced' drafts and reduces to
+    twice the target first, 'fast' drafts and reduces as far as possible
+    and finishes with bilinear resampling.
+    """
+    with _image_session(input_path, session) as session:
+        if not session.is_valid:
+            print(f"Image validation failed: {'; '.join(session.validation['errors'])}")
+            return False
+
+        try:
+            # Calculate new size preserving aspect ratio
+            img = _resize_decoded(session, max_size, preset)
+
+            # Convert to RGB if necessary to avoid transparency issues
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = _flatten_to_rgb(img)
+
+            # Preserve EXIF data if it exists
+            if session.exif_bytes:
+                img.save(output_path, exif=session.exif_bytes)
+            else:
+                img.save(output_path)
+
+            return True
+
+        except Exception as e:
+            print(f"Error resizing image: {str(e)}")
+            return False
+
+def get_image_info(file_path: str, session: Optional[ImageSession] = None) -> Optional[Dict[str, Any]]:
+    """
+    Gets information about an image file securely (header only, no decode)
+    """
+    with _image_session(file_path, session) as session:
+        if not session.is_valid:
+            print(f"Image validation failed: {'; '.join(session.validation['errors'])}")
+            return None
+
+        try:
+            width, height = session.validation['dimensions']
+            info = {
+                'path': file_path,
+                'size_mb': session.validation['size_mb'],
+                'dimensions': session.validation['dimensions'],
+                'format': session.validation['format'],
+                'mode': session.mode,
+                'width': width,
+                'height': height
+            }
+
+            # Add additional info if available
+            if session.exif:
+                info['exif'] = dict(list(session.exif.items())[:10])  # Limit EXIF data
+
+            return info
+
+        except Exception as e:
+            print(f"Error getting image info: {str(e)}")
+            return None
+
+def crop_image_secure(input_path: str, output_path: str, box: Tuple[int, int, int, int],
+                      session: Optional[ImageSession] = None) -> bool:
+    """
+    Securely crops an image with bounds checking
+    """
+    with _image_session(input_path, session) as session:
+        if not session.is_valid:
+            print(f"Image validation failed: {'; '.join(session.validation['errors'])}")
+            return False
+
+        try:
+            # Validate crop box coordinates against the header before decoding
+            width, height = session.validation['dimensions']
+            left, top, right, bottom = box
+            if left < 0 or top < 0 or right > width or bottom > height or left >= right or top >= bottom:
+                print(f"Crop box coordinates invalid: {box} for image size {width}x{height}")
+                return False
+
+            # Perform the crop
+            cropped_img = session.decode().crop(box)
+
+            # Save the cropped image
+            cropped_img.save(output_path)
+
+            return True
+
+        except Exception as e:
+            print(f"Error cropping image: {str(e)}")
+            return False
+
+def convert_image_format_secure(input_path: str, output_path: str, output_format: str = 'JPEG',
+                                session: Optional[ImageSession] = None) -> bool:
+    """
+    Securely converts an image to a different format
+    """
+    with _image_session(input_path, session) as session:
+        if not session.is_valid:
+            print(f"Image validation failed: {'; '.join(session.validation['errors'])}")
+            return False
+
+        try:
+            img = _prepare_for_format(session.decode(), output_format)
+
+            # Save in the requested format
+            img.save(output_path, format=output_format)
+
+            return True
+
+        except Exception as e:
+            print(f"Error converting image format: {str(e)}")
+            return False
+
+def _render_derivative(session: ImageSession, spec: Dict[str, Any], preset: str) -> Image.Image:
+    """
+    Applies a derivative's crop -> resize chain to the session image
+    """
+    crop_box = spec.get('crop')
+    max_size = spec.get('max_size')
+
+    if crop_box is None:
+        if max_size is None:
+            return session.decode()
+        return _resize_decoded(session, tuple(max_size), preset)
+
+    width, height = session.validation['dimensions']
+    left, top, right, bottom = crop_box
+    if left < 0 or top < 0 or right > width or bottom > height or left >= right or top >= bottom:
+        raise ValueError(f"Crop box coordinates invalid: {tuple(crop_box)} for image size {width}x{height}")
+
+    img = session.decode().crop(tuple(crop_box))
+    if max_size is not None:
+        settings = _preset_settings(preset)
+        img = _resize_image(img, _fit_within(img.size, tuple(max_size)), settings)
+    return img
+
+def _derivative_draft_size(session: ImageSession, derivatives: List[Dict[str, Any]],
+                           preset: str) -> Optional[Tuple[int, int]]:
+    """
+    Returns a draft size large enough for every derivative, or None when
+    any derivative needs the full-resolution image
+    """
+    settings = _preset_settings(preset)
+    largest = (0, 0)
+    for spec in derivatives:
+        if spec.get('crop') is not None or spec.get('max_size') is None:
+            return None
+        target = _fit_within(session.validation['dimensions'], tuple(spec['max_size']))
+        largest = (max(largest[0], target[0]), max(largest[1], target[1]))
+    return _draft_size_for(largest, settings)
+
+def derivative_output_path(input_path: str, output_base: str, spec: Dict[str, Any]) -> str:
+    """
+    Builds <output_base>_<name>.<ext> for a derivative spec
+    """
+    return f"{output_base}_{spec['name']}{_derivative_extension(input_path, spec)}"
+
+def _derivative_extension(input_path: str, spec: Dict[str, Any]) -> str:
+    output_format = spec.get('format')
+    if output_format:
+        return '.jpg' if output_format.upper() in ('JPEG', 'JPG') else f".{output_format.lower()}"
+    return Path(input_path).suffix.lower()
+
+def _save_derivative(session: ImageSession, spec: Dict[str, Any], preset: str, output_path: str):
+    """
+    Renders a derivative spec from the session image and writes it to output_path
+    """
+    img = _render_derivative(session, spec, preset)
+    output_format = spec.get('format') or session.validation['format']
+    if output_format.upper() == 'JPG':
+        output_format = 'JPEG'
+    img = _prepare_for_format(img, output_format)
+
+    if session.exif_bytes and output_format.upper() in ('JPEG', 'WEBP', 'PNG', 'TIFF'):
+        img.save(output_path, format=output_format, exif=session.exif_bytes)
+    else:
+        img.save(output_path, format=output_format)
+
+def compute_file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Computes the SHA-256 digest of a file's contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _atomic_copy(source_path: str, destination: Path):
+    """
+    Copies a file so that readers never observe a partially written file
+    """
+    tmp_path = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+    try:
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, destination)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+DEFAULT_DERIVATIVE_CACHE_DIR = str(Path.home() / '.cache' / 'openclaw' / 'image_derivatives')
+DERIVATIVE_CACHE_VERSION = 1
+
+class ImageDerivativeCache:
+    """
+    On-disk cache of rendered derivatives keyed by source content hash and
+    operation parameters
+
+    Cached files are named <key><extension>, so any process can check for a
+    hit with a single stat. index.json records size and last access time for
+    each entry and drives least-recently-used eviction once the cache grows
+    beyond max_size_mb. Only one process should update the index; batch
+    workers report hits and new entries back to the parent instead. Files
+    the index does not know about (written by other processes, or by
+    workers that never reported back) are picked up by sync(), which runs
+    on open, before eviction and at the end of a batch. Since a stale index
+    only delays eviction, it is written every flush_every new entries and
+    on flush() or when leaving a with block, not after every entry.
+    """
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, cache_dir: str = DEFAULT_DERIVATIVE_CACHE_DIR, max_size_mb: float = 1024,
+                 flush_every: int = 100):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.flush_every = max(1, flush_every)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / self.INDEX_NAME
+        self._entries = self._load_index()
+        self._total_bytes = sum(entry['size'] for entry in self._entries.values())
+        self._dirty = False
+        self._unflushed = 0
+        self.sync()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('entries', {})
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def derivative_key(content_hash: str, spec: Dict[str, Any], preset: str) -> str:
+        """
+        Builds a cache key from the source hash and the parameters that
+        affect the rendered output (the spec name only affects file naming)
+        """
+        params = {
+            'version': DERIVATIVE_CACHE_VERSION,
+            'source': content_hash,
+            'preset': preset,
+            'crop': list(spec['crop']) if spec.get('crop') is not None else None,
+            'max_size': list(spec['max_size']) if spec.get('max_size') is not None else None,
+            'format': spec['format'].upper() if spec.get('format') else None
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str, extension: str) -> Path:
+        return self.cache_dir / f"{key}{extension}"
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached derivative path for key, or None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        path = self.cache_dir / entry['file']
+        if not path.exists():
+            self._forget(key)
+            return None
+
+        self.touch(key)
+        return str(path)
+
+    def touch(self, key: str):
+        """
+        Marks an entry as recently used
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry['last_access'] = time.time()
+            self._dirty = True
+
+    def put(self, key: str, rendered_path: str, extension: str) -> str:
+        """
+        Copies a rendered derivative into the cache and returns its cached path
+        """
+        destination = self.path_for(key, extension)
+        _atomic_copy(rendered_path, destination)
+        self.record(key, destination.name)
+        return str(destination)
+
+    def record(self, key: str, file_name: str):
+        """
+        Registers a file that was already written into the cache directory
+        """
+        path = self.cache_dir / file_name
+        if not path.exists():
+            return
+
+        previous = self._entries.get(key)
+        if previous is not None:
+            self._total_bytes -= previous['size']
+
+        size = path.stat().st_size
+        self._entries[key] = {'file': file_name, 'size': size, 'last_access': time.time()}
+        self._total_bytes += size
+        self._dirty = True
+        self._evict_if_needed()
+
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def _scan(self):
+        """
+        Rebuilds the index from the files in the cache directory; unknown
+        files are added with their modification time as last access
+        """
+        on_disk = {}
+        for path in self.cache_dir.iterdir():
+            if path.name.startswith('.') or path.name == self.INDEX_NAME or not path.is_file():
+                continue
+            on_disk[path.name] = path.stat()
+
+        entries = {}
+        for key, entry in self._entries.items():
+            stat = on_disk.pop(entry['file'], None)
+            if stat is not None:
+                entries[key] = dict(entry, size=stat.st_size)
+        for file_name, stat in on_disk.items():
+            key = file_name.partition('.')[0]
+            entries[key] = {'file': file_name, 'size': stat.st_size, 'last_access': stat.st_mtime}
+
+        if entries != self._entries:
+            self._entries = entries
+            self._dirty = True
+        self._total_bytes = sum(entry['size'] for entry in self._entries.values())
+
+    def sync(self):
+        """
+        Reconciles the index with the cache directory and evicts down to
+        max_size_mb
+        """
+        self._scan()
+        self._evict_if_needed(scan=False)
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry['size']
+            self._dirty = True
+
+    def _evict_if_needed(self, scan: bool = True):
+        if self._total_bytes <= self.max_size_bytes:
+            return
+        if scan:
+            # Count files written behind the index's back before choosing
+            self._scan()
+
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1]['last_access']):
+            if self._total_bytes <= self.max_size_bytes:
+                break
+            try:
+                (self.cache_dir / entry['file']).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            self._forget(key)
+
+    def flush(self):
+        """
+        Writes the index to disk if it changed
+        """
+        if not self._dirty:
+            return
+
+        tmp_path = self.index_path.with_name(f".{self.INDEX_NAME}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': DERIVATIVE_CACHE_VERSION, 'entries': self._entries}, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+        self._unflushed = 0
+
+def get_or_create_derivative(input_path: str, spec: Dict[str, Any], cache: ImageDerivativeCache,
+                             preset: str = 'balanced',
+                             session: Optional[ImageSession] = None) -> Optional[str]:
+    """
+    Returns the cached path of a derivative, rendering and caching it on a miss
+
+    The cache index is written in batches; use the cache as a context
+    manager, or call cache.flush(), once done creating derivatives.
+    """
+    try:
+        content_hash = compute_file_sha256(input_path)
+        key = cache.derivative_key(content_hash, spec, preset)
+        cached_path = cache.get(key)
+        if cached_path:
+            return cached_path
+    except Exception as e:
+        print(f"Error reading derivative cache: {str(e)}")
+        return None
+
+    with _image_session(input_path, session) as session:
+        if not session.is_valid:
+            print(f"Image validation failed: {'; '.join(session.validation['errors'])}")
+            return None
+
+        extension = _derivative_extension(input_path, spec)
+        destination = cache.path_for(key, extension)
+        tmp_path = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+        try:
+            _save_derivative(session, spec, preset, str(tmp_path))
+            os.replace(tmp_path, destination)
+            cache.record(key, destination.name)
+            return str(destination)
+        except Exception as e:
+            print(f"Error creating derivative: {str(e)}")
+            return None
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+def _process_image_job(input_path: str, output_base: str, derivatives: List[Dict[str, Any]],
+                       preset: str, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Validates one image and writes all of its derivatives from a single decode
+    (runs in a worker process)
+
+    With a cache_dir, derivatives already in the cache are copied out without
+    decoding, and newly rendered ones are stored; the keys are reported in
+    'cache_hits' / 'cache_stored' so the parent can update the cache index.
+    """
+    started = time.perf_counter()
+    record = {
+        'path': input_path,
+        'status': 'ok',
+        'outputs': [],
+        'errors': [],
+        'cache_hits': [],
+        'cache_stored': []
+    }
+
+    try:
+        Path(output_base).parent.mkdir(parents=True, exist_ok=True)
+
+        pending = []
+        if cache_dir:
+            content_hash = compute_file_sha256(input_path)
+            for spec in derivatives:
+                extension = _derivative_extension(input_path, spec)
+                key = ImageDerivativeCache.derivative_key(content_hash, spec, preset)
+                cached_path = Path(cache_dir) / f"{key}{extension}"
+                output_path = derivative_output_path(input_path, output_base, spec)
+                try:
+                    shutil.copyfile(cached_path, output_path)
+                    record['outputs'].append(output_path)
+                    record['cache_hits'].append(key)
+                except FileNotFoundError:
+                    pending.append((spec, key, cached_path))
+        else:
+            pending = [(spec, None, None) for spec in derivatives]
+
+        if pending:
+            with ImageSession(input_path) as session:
+                if not session.is_valid:
+                    record['status'] = 'invalid'
+                    record['errors'] = list(session.validation['errors'])
+                else:
+                    # Decode once, drafted to the largest derivative when possible
+                    pending_specs = [spec for spec, _, _ in pending]
+                    session.decode(_derivative_draft_size(session, pending_specs, preset))
+
+                    for spec, key, cached_path in pending:
+                        output_path = derivative_output_path(input_path, output_base, spec)
+                        try:
+                            _save_derivative(session, spec, preset, output_path)
+                            record['outputs'].append(output_path)
+                            if cached_path is not None:
+                                _atomic_copy(output_path, cached_path)
+                                record['cache_stored'].append((key, cached_path.name))
+                        except Exception as e:
+                            record['status'] = 'error'
+                            record['errors'].append(f"{spec['name']}: {str(e)}")
+
+    except Exception as e:
+        record['status'] = 'error'
+        record['errors'].append(f"Processing error: {str(e)}")
+
+    record['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return record
+
+def _unique_output_bases(pairs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Renames output bases that would be written twice (e.g. img.jpg and
+    img.png in one directory) so that no derivative overwrites another
+    """
+    seen = set()
+    unique = []
+    for input_path, output_base in pairs:
+        if output_base in seen:
+            candidate = f"{output_base}_{Path(input_path).suffix.lstrip('.').lower()}"
+            counter = 2
+            while candidate in seen:
+                candidate = f"{output_base}_{counter}"
+                counter += 1
+            print(f"Output name collision for {input_path}; writing to {candidate} instead")
+            output_base = candidate
+        seen.add(output_base)
+        unique.append((input_path, output_base))
+    return unique
+
+def collect_image_inputs(source: str, output_dir: str, pattern: str = '**/*') -> List[Tuple[str, str]]:
+    """
+    Resolves a directory or a manifest (JSON list or one path per line) to
+    (input_path, output_base) pairs; directory structure is mirrored under
+    output_dir, for a manifest relative to the deepest directory shared by
+    its paths
+    """
+    pairs = []
+    if os.path.isdir(source):
+        root = Path(source)
+        for path in sorted(root.glob(pattern)):
+            if path.is_file() and path.suffix.lower() in VALID_IMAGE_EXTENSIONS:
+                relative = path.relative_to(root).with_suffix('')
+                pairs.append((str(path), str(Path(output_dir) / relative)))
+        return _unique_output_bases(pairs)
+
+    with open(source, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if source.lower().endswith('.json'):
+        paths = json.loads(content)
+    else:
+        paths = [line.strip() for line in content.splitlines() if line.strip() and not line.startswith('#')]
+
+    if not paths:
+        return pairs
+
+    absolute_paths = [os.path.abspath(path) for path in paths]
+    root = os.path.commonpath([os.path.dirname(path) for path in absolute_paths])
+    for path, absolute_path in zip(paths, absolute_paths):
+        relative = Path(os.path.relpath(absolute_path, root)).with_suffix('')
+        pairs.append((path, str(Path(output_dir) / relative)))
+    return _unique_output_bases(pairs)
+
+def process_images_batch(source: str, output_dir: str, derivatives: List[Dict[str, Any]],
+                         max_workers: Optional[int] = None, preset: str = 'balanced',
+                         pattern: str = '**/*',
+                         cache: Optional[ImageDerivativeCache] = None) -> Dict[str, Any]:
+    """
+    Validates and renders derivatives for many images across a process pool
+
+    derivatives is a list of specs, each producing one output file per image:
+        {'name': 'web', 'max_size': (1920, 1080), 'format': 'WEBP'}
+        {'name': 'thumb', 'crop': (0, 0, 800, 800), 'max_size': (200, 200)}
+    A spec applies crop, then resize, then format conversion; every spec
+    for an image is rendered from one decode of the source. With a cache,
+    derivatives of unchanged sources are copied from the cache instead.
+    """
+    _preset_settings(preset)  # Fail fast on an unknown preset
+    for spec in derivatives:
+        if not spec.get('name'):
+            raise ValueError(f"Derivative spec needs a name: {spec}")
+
+    summary = {
+        'total': 0,
+        'processed': 0,
+        'failed': 0,
+        'outputs': 0,
+        'cache_hits': 0,
+        'failures': [],
+        'elapsed_seconds': 0.0
+    }
+    started = time.perf_counter()
+
+    jobs = collect_image_inputs(source, output_dir, pattern)
+    summary['total'] = len(jobs)
+
+    cache_dir = str(cache.cache_dir) if cache else None
+    max_workers = max(1, max_workers or os.cpu_count() or 1)
+    job_iter = iter(jobs)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+        while True:
+            # Keep a bounded number of images queued per worker
+            while len(in_flight) < max_workers * 2:
+                job = next(job_iter, None)
+                if job is None:
+                    break
+                in_flight.add(executor.submit(_process_image_job, job[0], job[1], derivatives,
+                                              preset, cache_dir))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                summary['processed'] += 1
+                summary['outputs'] += len(record['outputs'])
+                summary['cache_hits'] += len(record['cache_hits'])
+                if cache:
+                    # Only this process updates the cache index
+                    for key in record['cache_hits']:
+                        cache.touch(key)
+                    for key, file_name in record['cache_stored']:
+                        cache.record(key, file_name)
+                if record['status'] != 'ok':
+                    summary['failed'] += 1
+                    summary['failures'].append(record)
+                    print(f"{record['status']}: {record['path']}: {'; '.join(record['errors'])}")
+
+    if cache:
+        cache.sync()
+        cache.flush()
+    summary['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return summary
+
+PERCEPTUAL_HASH_METHODS = ('ahash', 'dhash', 'phash')
+
+def _dct_matrix(size: int):
+    """
+    Orthonormal DCT-II basis used for pHash
+    """
+    import numpy as np
+
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2 / size)
+    matrix[0, :] = np.sqrt(1 / size)
+    return matrix
+
+def _bits_to_int(bits) -> int:
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+def _perceptual_hash_from_image(img: Image.Image, method: str, hash_size: int) -> int:
+    import numpy as np
+
+    if method == 'ahash':
+        small = img.convert('L').resize((hash_size, hash_size), Image.Resampling.BOX)
+        pixels = np.asarray(small, dtype=np.float32)
+        return _bits_to_int(pixels > pixels.mean())
+
+    if method == 'dhash':
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+        pixels = np.asarray(small, dtype=np.float32)
+        return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+    if method == 'phash':
+        dct_size = hash_size * 4
+        small = img.convert('L').resize((dct_size, dct_size), Image.Resampling.BOX)
+        pixels = np.asarray(small, dtype=np.float64)
+        basis = _dct_matrix(dct_size)
+        low_freq = (basis @ pixels @ basis.T)[:hash_size, :hash_size]
+        # Median excludes the DC term, which only reflects overall brightness
+        return _bits_to_int(low_freq > np.median(low_freq.ravel()[1:]))
+
+    raise ValueError(f"Unknown hash method: {method}. Valid: {', '.join(PERCEPTUAL_HASH_METHODS)}")
+
+def compute_perceptual_hash(file_path: str, method: str = 'dhash', hash_size: int = 8,
+                            session: Optional[ImageSession] = None) -> Optional[int]:
+    """
+    Computes an aHash/dHash/pHash of hash_size*hash_size bits
+
+    JPEGs are decoded at a reduced DCT scale, since the hash only needs a
+    tiny grayscale thumbnail.
+    """
+    with _image_session(file_path, session) as session:
+        if not session.is_valid:
+            print(f"Image validation failed: {'; '.join(session.validation['errors'])}")
+            return None
+
+        try:
+            draft_edge = hash_size * (4 if method == 'phash' else 2)
+            img = session.decode((draft_edge, draft_edge))
+            return _perceptual_hash_from_image(img, method, hash_size)
+        except Exception as e:
+            print(f"Error computing perceptual hash: {str(e)}")
+            return None
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    return bin(hash_a ^ hash_b).count('1')
+
+class MultiIndexHashTable:
+    """
+    Multi-index hashing over integer hashes for Hamming-radius queries
+
+    Each hash is split into `chunks` substrings, each indexed in its own
+    table. By the pigeonhole principle, any hash within distance r of the
+    query matches it within floor(r / chunks) bits on at least one chunk,
+    so a query only probes those chunk neighbourhoods and verifies the
+    small candidate set instead of comparing against every stored hash.
+    """
+
+    def __init__(self, bits: int = 64, chunks: int = 4):
+        self.bits = bits
+        self.chunks = chunks
+        self.chunk_bits = math.ceil(bits / chunks)
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables = [{} for _ in range(chunks)]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _chunk_values(self, value: int) -> List[int]:
+        return [(value >> (i * self.chunk_bits)) & self._mask for i in range(self.chunks)]
+
+    def add(self, value: int):
+        chunk_values = self._chunk_values(value)
+        if value in self._tables[0].get(chunk_values[0], ()):
+            return  # Already present
+        for table, chunk_value in zip(self._tables, chunk_values):
+            table.setdefault(chunk_value, set()).add(value)
+        self._size += 1
+
+    def discard(self, value: int):
+        chunk_values = self._chunk_values(value)
+        if value not in self._tables[0].get(chunk_values[0], ()):
+            return
+        for table, chunk_value in zip(self._tables, chunk_values):
+            bucket = table[chunk_value]
+            bucket.discard(value)
+            if not bucket:
+                del table[chunk_value]
+        self._size -= 1
+
+    def _chunk_neighbours(self, chunk_value: int, radius: int) -> Iterator[int]:
+        yield chunk_value
+        for flips in range(1, radius + 1):
+            for positions in itertools.combinations(range(self.chunk_bits), flips):
+                flipped = chunk_value
+                for position in positions:
+                    flipped ^= 1 << position
+                yield flipped
+
+    def query(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """
+        Returns (hash, distance) pairs within max_distance of value
+        """
+        radius = max_distance // self.chunks
+        candidates = set()
+        for table, chunk_value in zip(self._tables, self._chunk_values(value)):
+            for neighbour in self._chunk_neighbours(chunk_value, radius):
+                bucket = table.get(neighbour)
+                if bucket:
+                    candidates.update(bucket)
+
+        results = []
+        for candidate in candidates:
+            distance = hamming_distance(value, candidate)
+            if distance <= max_distance:
+                results.append((candidate, distance))
+        return results
+
+def _matches_glob(relative_path: str, pattern: str) -> bool:
+    """
+    Approximates Path.glob matching for a path that may no longer exist
+    ('**/' also matches no directory at all)
+    """
+    if fnmatch.fnmatch(relative_path, pattern):
+        return True
+    return pattern.startswith('**/') and _matches_glob(relative_path, pattern[3:])
+
+def _hash_image_job(file_path: str, method: str, hash_size: int) -> Tuple[str, Optional[int]]:
+    """
+    Hashes one image (runs in a worker process)
+    """
+    return file_path, compute_perceptual_hash(file_path, method, hash_size)
+
+class PerceptualHashIndex:
+    """
+    Persistent near-duplicate index over perceptual image hashes
+
+    Hashes are stored in a JSON file along with each file's size and
+    modification time, so update() only hashes new or changed images. An
+    in-memory multi-index hash table answers Hamming-distance queries
+    without pairwise comparison.
+
+    Usage:
+        index = PerceptualHashIndex("media_hashes.json")
+        index.update("client_media/")
+        index.save()
+        matches = index.query("new_upload.jpg", max_distance=6)
+    """
+
+    def __init__(self, index_path: str, method: str = 'dhash', hash_size: int = 8):
+        if method not in PERCEPTUAL_HASH_METHODS:
+            raise ValueError(f"Unknown hash method: {method}. Valid: {', '.join(PERCEPTUAL_HASH_METHODS)}")
+
+        self.index_path = Path(index_path)
+        self.method = method
+        self.hash_size = hash_size
+        self._entries = {}
+        self._paths_by_hash = {}
+        self._table = MultiIndexHashTable(bits=hash_size * hash_size)
+        self._dirty = False
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('method') != self.method or data.get('hash_size') != self.hash_size:
+            print(f"Ignoring index built with {data.get('method')}/{data.get('hash_size')}; "
+                  f"rebuilding for {self.method}/{self.hash_size}")
+            self._dirty = True
+            return
+
+        for path, entry in data.get('entries', {}).items():
+            entry['hash'] = int(entry['hash'], 16)
+            self._insert(path, entry)
+
+    def _insert(self, path: str, entry: Dict[str, Any]):
+        self._entries[path] = entry
+        self._paths_by_hash.setdefault(entry['hash'], set()).add(path)
+        self._table.add(entry['hash'])
+
+    def _remove(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            paths = self._paths_by_hash.get(entry['hash'], set())
+            paths.discard(path)
+            if not paths:
+                self._paths_by_hash.pop(entry['hash'], None)
+                self._table.discard(entry['hash'])
+            self._dirty = True
+
+    def update(self, source: str, pattern: str = '**/*', max_workers: Optional[int] = None,
+               prune: bool = True) -> Dict[str, int]:
+        """
+        Hashes new or changed images under a directory; with prune, entries
+        for files matching pattern under that directory that no longer exist
+        are dropped
+        """
+        stats = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        root = Path(source).resolve()
+
+        found = {}
+        for path in root.glob(pattern):
+            if path.is_file() and path.suffix.lower() in VALID_IMAGE_EXTENSIONS:
+                stat = path.stat()
+                found[str(path)] = (stat.st_size, stat.st_mtime)
+
+        to_hash = []
+        for path, (size, mtime) in found.items():
+            entry = self._entries.get(path)
+            if entry is not None and entry['size'] == size and entry['mtime'] == mtime:
+                stats['unchanged'] += 1
+            else:
+                to_hash.append(path)
+
+        if prune:
+            # Only entries this scan could have found, and whose file is gone
+            prefix = str(root) + os.sep
+            for path in [p for p in self._entries if p.startswith(prefix) and p not in found]:
+                if _matches_glob(Path(path).relative_to(root).as_posix(), pattern) and not os.path.exists(path):
+                    self._remove(path)
+                    stats['removed'] += 1
+
+        if to_hash:
+            max_workers = max(1, max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                chunksize = max(1, len(to_hash) // (max_workers * 8))
+                for path, value in executor.map(_hash_image_job, to_hash,
+                                                [self.method] * len(to_hash),
+                                                [self.hash_size] * len(to_hash),
+                                                chunksize=chunksize):
+                    if value is None:
+                        stats['failed'] += 1
+                        continue
+                    stats['updated' if path in self._entries else 'added'] += 1
+                    self._remove(path)
+                    size, mtime = found[path]
+                    self._insert(path, {'hash': value, 'size': size, 'mtime': mtime})
+                    self._dirty = True
+
+        return stats
+
+    def add(self, file_path: str) -> Optional[int]:
+        """
+        Hashes and indexes a single image
+        """
+        value = compute_perceptual_hash(file_path, self.method, self.hash_size)
+        if value is None:
+            return None
+
+        path = str(Path(file_path).resolve())
+        stat = os.stat(path)
+        self._remove(path)
+        self._insert(path, {'hash': value, 'size': stat.st_size, 'mtime': stat.st_mtime})
+        self._dirty = True
+        return value
+
+    def query(self, image, max_distance: int = 6) -> List[Dict[str, Any]]:
+        """
+        Finds indexed images within max_distance bits of an image path or hash
+        """
+        value = image if isinstance(image, int) else compute_perceptual_hash(image, self.method, self.hash_size)
+        if value is None:
+            return []
+
+        matches = []
+        for match_hash, distance in self._table.query(value, max_distance):
+            for path in self._paths_by_hash.get(match_hash, ()):
+                matches.append({'path': path, 'distance': distance})
+        return sorted(matches, key=lambda match: (match['distance'], match['path']))
+
+    def find_duplicates(self, max_distance: int = 6) -> List[List[str]]:
+        """
+        Groups indexed images whose hashes are within max_distance bits
+        """
+        parent = {value: value for value in self._paths_by_hash}
+
+        def find(value):
+            while parent[value] != value:
+                parent[value] = parent[parent[value]]
+                value = parent[value]
+            return value
+
+        for value in self._paths_by_hash:
+            for match_hash, _ in self._table.query(value, max_distance):
+                if match_hash in parent:
+                    root_a, root_b = find(value), find(match_hash)
+                    if root_a != root_b:
+                        parent[root_b] = root_a
+
+        groups = {}
+        for value, paths in self._paths_by_hash.items():
+            groups.setdefault(find(value), []).extend(paths)
+        return sorted((sorted(paths) for paths in groups.values() if len(paths) > 1), key=len, reverse=True)
+
+    def save(self):
+        """
+        Writes the index to disk if it changed
+        """
+        if not self._dirty:
+            return
+
+        entries = {
+            path: {'hash': format(entry['hash'], 'x'), 'size': entry['size'], 'mtime': entry['mtime']}
+            for path, entry in self._entries.items()
+        }
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_name(f".{self.index_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'method': self.method, 'hash_size': self.hash_size, 'entries': entries}, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+def validate_large_image_file(file_path: str, max_size_mb: float = TILED_MAX_FILE_SIZE_MB,
+                              max_pixels: int = TILED_MAX_IMAGE_PIXELS) -> Dict[str, Any]:
+    """
+    Validates a large TIFF/PNG for tiled processing by reading only its header
+    """
     result = {
         'is_valid': True,
         'errors': [],
@@ -21,212 +1268,182 @@ def validate_image_file(file_path: str) -> Dict[str, Any]:
         'dimensions': (0, 0),
         'format': None
     }
-    
+
+    try:
+        import pyvips
+    except (ImportError, OSError):
+        # pyvips raises OSError when the libvips shared library is missing
+        result['is_valid'] = False
+        result['errors'].append("Tiled processing requires pyvips. Please install with: pip install pyvips")
+        return result
+
     try:
         # Check if file exists
         if not os.path.exists(file_path):
             result['is_valid'] = False
             result['errors'].append("File does not exist")
             return result
-        
-        # Check file size (limit to 50MB)
-        size_bytes = os.path.getsize(file_path)
-        size_mb = size_bytes / (1024 * 1024)
+
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
         result['size_mb'] = round(size_mb, 2)
-        
-        if size_mb > 50:
+        if size_mb > max_size_mb:
             result['is_valid'] = False
-            result['errors'].append(f"File too large: {size_mb:.2f}MB (max 50MB)")
-        
-        # Check file extension
-        valid_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+            result['errors'].append(f"File too large: {size_mb:.2f}MB (max {max_size_mb}MB)")
+
         file_ext = Path(file_path).suffix.lower()
-        if file_ext not in valid_extensions:
+        if file_ext not in TILED_FORMATS:
             result['is_valid'] = False
-            result['errors'].append(f"Invalid file extension: {file_ext}. Valid: {', '.join(valid_extensions)}")
-        
-        # Attempt to open image to check if it's a valid image
+            result['errors'].append(f"Invalid file extension for tiled processing: {file_ext}. "
+                                    f"Valid: {', '.join(sorted(TILED_FORMATS))}")
+
         try:
-            with Image.open(file_path) as img:
-                result['dimensions'] = img.size
-                result['format'] = img.format
-                # Check dimensions (limit to 100MP to prevent decompression bombs)
-                pixel_count = img.size[0] * img.size[1]
-                if pixel_count > 100_000_000:  # 100 megapixels
-                    result['is_valid'] = False
-                    result['errors'].append(f"Image too large: {pixel_count:,} pixels (max 100,000,000)")
+            header = pyvips.Image.new_from_file(file_path, access='sequential')
+            result['dimensions'] = (header.width, header.height)
+            result['format'] = header.get('vips-loader')
+
+            pixel_count = header.width * header.height
+            if pixel_count > max_pixels:
+                result['is_valid'] = False
+                result['errors'].append(f"Image too large: {pixel_count:,} pixels (max {max_pixels:,})")
         except Exception as e:
             result['is_valid'] = False
             result['errors'].append(f"Invalid image format: {str(e)}")
-        
+
     except Exception as e:
         result['is_valid'] = False
         result['errors'].append(f"Validation error: {str(e)}")
-    
+
     return result
 
-def resize_image_secure(input_path: str, output_path: str, max_size: Tuple[int, int] = (1920, 1080)) -> bool:
+def process_large_image_tiled(input_path: str, output_path: str,
+                              crop_box: Optional[Tuple[int, int, int, int]] = None,
+                              max_size: Optional[Tuple[int, int]] = None,
+                              memory_budget_mb: int = 256, tile_size: int = 512) -> bool:
     """
-    Securely resizes an image with safety limits
+    Crops, resizes and/or converts a very large TIFF/PNG in bounded memory
+
+    The image is opened with libvips in sequential mode, so pixels stream
+    through the crop -> resize -> save pipeline in strips instead of being
+    decoded into one bitmap. TIFF output is written tiled (tile_size pixels)
+    and as BigTIFF, so it can be read back tile by tile. The output format
+    follows the output_path extension.
+
+    memory_budget_mb sets the number of libvips worker threads, which is
+    what bounds pixel memory in a sequential pipeline, and caps libvips'
+    operation cache at half the budget; the cache limit does not cover the
+    pixel buffers themselves.
     """
-    # Validate the input file first
-    validation_result = validate_image_file(input_path)
-    
+    validation_result = validate_large_image_file(input_path)
+
     if not validation_result['is_valid']:
         print(f"Image validation failed: {'; '.join(validation_result['errors'])}")
         return False
-    
-    try:
-        with Image.open(input_path) as img:
-            # Preserve EXIF data if it exists
-            exif_data = img.info.get('exif')
-            
-            # Calculate new size preserving aspect ratio
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Save the resized image
-            if img.mode in ('RGBA', 'LA', 'P') and img.mode != 'RGB':
-                # Convert to RGB if necessary to avoid transparency issues
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    # Create a white background to paste the image on
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                    img = background
-                else:
-                    img = img.convert('RGB')
-            
-            if exif_data:
-                img.save(output_path, exif=exif_data)
-            else:
-                img.save(output_path)
-        
-        return True
-    
-    except Exception as e:
-        print(f"Error resizing image: {str(e)}")
+
+    output_ext = Path(output_path).suffix.lower()
+    if output_ext not in TILED_FORMATS | {'.jpg', '.jpeg'}:
+        print(f"Unsupported output format for tiled processing: {output_ext}")
         return False
 
-def get_image_info(file_path: str) -> Optional[Dict[str, Any]]:
-    """
-    Gets information about an image file securely
-    """
-    validation_result = validate_image_file(file_path)
-    
-    if not validation_result['is_valid']:
-        print(f"Image validation failed: {'; '.join(validation_result['errors'])}")
-        return None
-    
-    try:
-        with Image.open(file_path) as img:
-            info = {
-                'path': file_path,
-                'size_mb': validation_result['size_mb'],
-                'dimensions': validation_result['dimensions'],
-                'format': validation_result['format'],
-                'mode': img.mode,
-                'width': img.width,
-                'height': img.height
-            }
-            
-            # Add additional info if available
-            if hasattr(img, '_getexif') and img._getexif():
-                exif = img._getexif()
-                if exif:
-                    info['exif'] = dict(list(exif.items())[:10])  # Limit EXIF data
-            
-            return info
-    
-    except Exception as e:
-        print(f"Error getting image info: {str(e)}")
-        return None
+    import pyvips
 
-def crop_image_secure(input_path: str, output_path: str, box: Tuple[int, int, int, int]) -> bool:
-    """
-    Securely crops an image with bounds checking
-    """
-    validation_result = validate_image_file(input_path)
-    
-    if not validation_result['is_valid']:
-        print(f"Image validation failed: {'; '.join(validation_result['errors'])}")
-        return False
-    
+    # Each worker thread holds a handful of strips of the pipeline, so the
+    # thread count is what bounds pixel memory. libvips is already
+    # initialised at this point, so VIPS_CONCURRENCY would be ignored.
+    previous_threads = pyvips.concurrency_get()
+    threads = max(1, min(os.cpu_count() or 1, memory_budget_mb // 64))
     try:
-        with Image.open(input_path) as img:
-            width, height = img.size
-            
-            # Validate crop box coordinates
-            left, top, right, bottom = box
+        pyvips.concurrency_set(threads)
+        # Only limits the cache of recent operation results, not pixel buffers
+        pyvips.cache_set_max_mem(memory_budget_mb * 1024 * 1024 // 2)
+
+        image = pyvips.Image.new_from_file(input_path, access='sequential')
+        width, height = image.width, image.height
+
+        if crop_box is not None:
+            left, top, right, bottom = crop_box
             if left < 0 or top < 0 or right > width or bottom > height or left >= right or top >= bottom:
-                print(f"Crop box coordinates invalid: {box} for image size {width}x{height}")
+                print(f"Crop box coordinates invalid: {crop_box} for image size {width}x{height}")
                 return False
-            
-            # Perform the crop
-            cropped_img = img.crop(box)
-            
-            # Save the cropped image
-            cropped_img.save(output_path)
-        
-        return True
-    
-    except Exception as e:
-        print(f"Error cropping image: {str(e)}")
-        return False
+            image = image.crop(left, top, right - left, bottom - top)
+
+        if max_size is not None:
+            target_width, target_height = _fit_within((image.width, image.height), max_size)
+            if (target_width, target_height) != (image.width, image.height):
+                image = image.resize(target_width / image.width,
+                                     vscale=target_height / image.height,
+                                     kernel='lanczos3')
+
+        if output_ext in ('.jpg', '.jpeg'):
+            # Flatten transparency onto white, matching the non-tiled JPEG path
+            if image.hasalpha():
+                image = image.flatten(background=[255] * (image.bands - 1))
+            image.write_to_file(output_path, Q=90)
+        elif output_ext in ('.tif', '.tiff'):
+            image.write_to_file(output_path, tile=True, tile_width=tile_size, tile_height=tile_size,
+                                compression='deflate', bigtiff=True)
+        else:
+            image.write_to_file(output_path)
 
-def convert_image_format_secure(input_path: str, output_path: str, output_format: str = 'JPEG') -> bool:
-    """
-    Securely converts an image to a different format
-    """
-    validation_result = validate_image_file(input_path)
-    
-    if not validation_result['is_valid']:
-        print(f"Image validation failed: {'; '.join(validation_result['errors'])}")
-        return False
-    
-    try:
-        with Image.open(input_path) as img:
-            # Handle transparency for formats that don't support it
-            if output_format.upper() in ['JPEG', 'JPG'] and img.mode in ('RGBA', 'LA', 'P'):
-                # Create a white background for JPEG conversion
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                else:
-                    background.paste(img)
-                img = background
-            elif img.mode == 'P' and output_format.upper() not in ['PNG', 'TIFF']:
-                # Convert palette mode to RGB for formats that don't support it
-                img = img.convert('RGB')
-            
-            # Save in the requested format
-            img.save(output_path, format=output_format)
-        
         return True
-    
+
     except Exception as e:
-        print(f"Error converting image format: {str(e)}")
+        print(f"Error processing large image: {str(e)}")
         return False
+    finally:
+        pyvips.concurrency_set(previous_threads)
 
-def main():
+def _parse_size(value: str) -> Tuple[int, int]:
+    width, _, height = value.lower().partition('x')
+    return (int(width), int(height))
+
+def main(argv: Optional[List[str]] = None):
     """
-    Example usage of the secure image processor
+    Command line entry point for batch image processing
     """
+    parser = argparse.ArgumentParser(
+        description="Secure Image Processor for OpenClaw - validates and processes images in batch"
+    )
+    parser.add_argument('source', nargs='?', help="Directory of images, or a manifest (.json list or one path per line)")
+    parser.add_argument('output_dir', nargs='?', help="Directory for derivative images")
+    parser.add_argument('--size', action='append', default=[],
+                        help="Derivative bounding box WIDTHxHEIGHT; repeat for several sizes")
+    parser.add_argument('--crop', help="Crop box LEFT,TOP,RIGHT,BOTTOM applied before resizing")
+    parser.add_argument('--format', help="Output format for all derivatives (e.g. JPEG, WEBP, PNG)")
+    parser.add_argument('--preset', choices=sorted(RESIZE_PRESETS), default='balanced', help="Resize preset")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--pattern', default='**/*', help="Glob pattern used when source is a directory")
+    parser.add_argument('--cache-dir', default=None, help="Directory for the derivative cache")
+    parser.add_argument('--cache-size-mb', type=float, default=1024, help="Maximum derivative cache size")
+    args = parser.parse_args(argv)
+
     print("Secure Image Processor for OpenClaw")
     print("Validates and processes images with security measures")
-    
-    # Example usage (commented out since no file is provided)
-    # file_path = "example.jpg"
-    # info = get_image_info(file_path)
-    # if info:
-    #     print(f"Image info: {info}")
+
+    if not args.source or not args.output_dir:
+        parser.print_help()
+        return 0
+
+    crop_box = tuple(int(v) for v in args.crop.split(',')) if args.crop else None
+    derivatives = []
+    for size in args.size or [None]:
+        spec = {'name': size.lower() if size else 'converted'}
+        if size:
+            spec['max_size'] = _parse_size(size)
+        if crop_box:
+            spec['crop'] = crop_box
+        if args.format:
+            spec['format'] = args.format
+        derivatives.append(spec)
+
+    cache = ImageDerivativeCache(args.cache_dir, args.cache_size_mb) if args.cache_dir else None
+    summary = process_images_batch(args.source, args.output_dir, derivatives,
+                                   max_workers=args.workers, preset=args.preset,
+                                   pattern=args.pattern, cache=cache)
+    print(f"Processed {summary['processed']} of {summary['total']} images "
+          f"({summary['outputs']} derivatives, {summary['cache_hits']} from cache, "
+          f"{summary['failed']} failed) "
+          f"in {summary['elapsed_seconds']}s")
+    return 1 if summary['failed'] else 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
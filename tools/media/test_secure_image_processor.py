@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Tests for the secure image processor
+Run with: python -m pytest tools/media/test_secure_image_processor.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+secure_image_processor = pytest.importorskip("secure_image_processor")
+
+
+def write_photo(path, size=(4000, 3000), quality=90):
+    """Saves a detailed RGB JPEG (noise over a gradient) and returns its path"""
+    rng = np.random.default_rng(0)
+    width, height = size
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[None, :, None]
+    pixels = gradient + rng.integers(0, 56, (height, width, 3))
+    Image.fromarray(pixels.astype(np.uint8)).save(path, quality=quality)
+    return str(path)
+
+
+@pytest.fixture
+def photo(tmp_path):
+    return write_photo(tmp_path / "photo.jpg")
+
+
+@pytest.mark.parametrize("first_use", ["resize", "hash"])
+def test_reused_session_redecodes_for_a_larger_draft(tmp_path, photo, first_use):
+    reference = tmp_path / "reference.jpg"
+    assert secure_image_processor.resize_image_secure(photo, str(reference), max_size=(1920, 1080))
+
+    output = tmp_path / "large.jpg"
+    with secure_image_processor.ImageSession(photo) as session:
+        if first_use == "resize":
+            assert secure_image_processor.resize_image_secure(
+                photo, str(tmp_path / "small.jpg"), max_size=(200, 200), session=session)
+        else:
+            assert secure_image_processor.compute_perceptual_hash(photo, session=session) is not None
+        assert session.is_drafted
+
+        assert secure_image_processor.resize_image_secure(
+            photo, str(output), max_size=(1920, 1080), session=session)
+        # 'balanced' drafts to at least twice the 1440x1080 target
+        assert session.decode().size == (4000, 3000)
+
+    with Image.open(output) as resized, Image.open(reference) as expected:
+        assert resized.size == (1440, 1080)
+        assert np.array_equal(np.asarray(resized), np.asarray(expected))
+
+
+def test_smaller_draft_reuses_the_decoded_image(photo):
+    with secure_image_processor.ImageSession(photo) as session:
+        first = session.decode((1000, 750))
+        assert first.size == (1000, 750)
+        assert session.decode((200, 150)) is first
+
+
+@pytest.fixture
+def small_photos(tmp_path):
+    sources = tmp_path / "sources"
+    sources.mkdir()
+    return [write_photo(sources / f"photo{index}.jpg", size=(64 + index, 48)) for index in range(3)]
+
+
+WEB_SPEC = {'name': 'web', 'max_size': (32, 32), 'format': 'PNG'}
+
+
+def test_derivative_cache_hits_and_misses(tmp_path, small_photos, monkeypatch):
+    cache = secure_image_processor.ImageDerivativeCache(str(tmp_path / "cache"))
+    renders = []
+    save_derivative = secure_image_processor._save_derivative
+    monkeypatch.setattr(secure_image_processor, "_save_derivative",
+                        lambda *args: renders.append(args[-1]) or save_derivative(*args))
+
+    first = secure_image_processor.get_or_create_derivative(small_photos[0], WEB_SPEC, cache)
+    assert len(renders) == 1
+    with Image.open(first) as derivative:
+        assert derivative.format == 'PNG' and max(derivative.size) == 32
+
+    # Same source and spec is a hit; a different spec or source is a miss
+    assert secure_image_processor.get_or_create_derivative(small_photos[0], WEB_SPEC, cache) == first
+    assert len(renders) == 1
+    thumb = secure_image_processor.get_or_create_derivative(
+        small_photos[0], dict(WEB_SPEC, max_size=(16, 16)), cache)
+    other = secure_image_processor.get_or_create_derivative(small_photos[1], WEB_SPEC, cache)
+    assert len({first, thumb, other}) == 3
+    assert len(renders) == 3
+
+    # A deleted file is a miss and is rendered again
+    os.unlink(first)
+    assert secure_image_processor.get_or_create_derivative(small_photos[0], WEB_SPEC, cache) == first
+    assert len(renders) == 4
+
+
+def test_derivative_cache_version_invalidates_entries(tmp_path, small_photos, monkeypatch):
+    cache = secure_image_processor.ImageDerivativeCache(str(tmp_path / "cache"))
+    first = secure_image_processor.get_or_create_derivative(small_photos[0], WEB_SPEC, cache)
+
+    monkeypatch.setattr(secure_image_processor, "DERIVATIVE_CACHE_VERSION",
+                        secure_image_processor.DERIVATIVE_CACHE_VERSION + 1)
+    second = secure_image_processor.get_or_create_derivative(small_photos[0], WEB_SPEC, cache)
+    assert second != first
+    assert os.path.exists(first) and os.path.exists(second)
+
+
+def test_derivative_cache_index_is_written_in_batches(tmp_path, small_photos):
+    cache_dir = tmp_path / "cache"
+    with secure_image_processor.ImageDerivativeCache(str(cache_dir), flush_every=2) as cache:
+        secure_image_processor.get_or_create_derivative(small_photos[0], WEB_SPEC, cache)
+        assert not cache.index_path.exists()
+        secure_image_processor.get_or_create_derivative(small_photos[1], WEB_SPEC, cache)
+        assert len(cache._load_index()) == 2
+        secure_image_processor.get_or_create_derivative(small_photos[2], WEB_SPEC, cache)
+        assert len(cache._load_index()) == 2
+    assert len(cache._load_index()) == 3
+
+    # A reopened cache serves hits from the saved index
+    reopened = secure_image_processor.ImageDerivativeCache(str(cache_dir))
+    key = reopened.derivative_key(secure_image_processor.compute_file_sha256(small_photos[2]),
+                                  WEB_SPEC, 'balanced')
+    assert reopened.get(key) is not None
+
+
+@pytest.fixture
+def count_decodes(monkeypatch):
+    """Counts pixel decodes of images opened from files"""
+    from PIL import ImageFile
+
+    decodes = []
+    load = ImageFile.ImageFile.load
+
+    def counting_load(self):
+        if self.tile:  # Cleared once pixel data is decoded
+            decodes.append(self.filename)
+        return load(self)
+
+    monkeypatch.setattr(ImageFile.ImageFile, "load", counting_load)
+    return decodes
+
+
+def write_photo_with_exif(path):
+    from PIL import ExifTags
+
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make] = "TestCam"
+    exif.get_ifd(ExifTags.IFD.Exif)[ExifTags.Base.DateTimeOriginal] = "2024:01:02 03:04:05"
+    exif.get_ifd(ExifTags.IFD.GPSInfo)[ExifTags.GPS.GPSLatitudeRef] = "N"
+    Image.new('RGB', (64, 48), (200, 100, 50)).save(path, exif=exif.tobytes())
+    return str(path)
+
+
+def test_validation_and_info_read_only_the_header(tmp_path, count_decodes):
+    from PIL import ExifTags
+
+    path = write_photo_with_exif(tmp_path / "exif.jpg")
+
+    validation = secure_image_processor.validate_image_file(path)
+    info = secure_image_processor.get_image_info(path)
+
+    assert validation['is_valid'] and validation['dimensions'] == (64, 48)
+    assert info['format'] == 'JPEG' and (info['width'], info['height']) == (64, 48)
+    # Tags from the Exif and GPS sub-IFDs are merged in
+    assert info['exif'][ExifTags.Base.Make] == "TestCam"
+    assert info['exif'][ExifTags.Base.DateTimeOriginal] == "2024:01:02 03:04:05"
+    assert info['exif'][ExifTags.IFD.GPSInfo][ExifTags.GPS.GPSLatitudeRef] == "N"
+    assert count_decodes == []
+
+
+def test_oversized_image_is_rejected_before_decoding(tmp_path, count_decodes):
+    path = write_photo(tmp_path / "large.jpg", size=(64, 48))
+
+    with secure_image_processor.ImageSession(path, max_pixels=1000) as session:
+        assert not session.is_valid
+        assert "Image too large: 3,072 pixels" in session.validation['errors'][0]
+        assert not secure_image_processor.resize_image_secure(path, str(tmp_path / "out.jpg"), session=session)
+    assert count_decodes == []
+
+
+def test_invalid_files_are_rejected(tmp_path):
+    assert "File does not exist" in secure_image_processor.validate_image_file(
+        str(tmp_path / "missing.jpg"))['errors']
+
+    not_an_image = tmp_path / "fake.png"
+    not_an_image.write_bytes(b"not an image")
+    validation = secure_image_processor.validate_image_file(str(not_an_image))
+    assert not validation['is_valid'] and validation['errors'][0].startswith("Invalid image format")
+
+
+def test_session_decodes_once_for_several_operations(tmp_path, count_decodes):
+    path = write_photo(tmp_path / "photo.png", size=(64, 48))
+
+    with secure_image_processor.ImageSession(path) as session:
+        assert secure_image_processor.crop_image_secure(path, str(tmp_path / "crop.png"), (0, 0, 32, 24),
+                                                        session=session)
+        assert secure_image_processor.convert_image_format_secure(path, str(tmp_path / "out.jpg"),
+                                                                  session=session)
+        assert secure_image_processor.get_image_info(path, session=session)['dimensions'] == (64, 48)
+    assert count_decodes == [path]
+
+    with Image.open(tmp_path / "crop.png") as cropped:
+        assert cropped.size == (32, 24)
+
+
+DERIVATIVES = [
+    {'name': 'web', 'max_size': (32, 32)},
+    {'name': 'thumb', 'crop': (0, 0, 40, 40), 'max_size': (16, 16), 'format': 'PNG'},
+]
+
+
+@pytest.fixture
+def image_tree(tmp_path):
+    root = tmp_path / "images"
+    (root / "nested").mkdir(parents=True)
+    write_photo(root / "a.jpg", size=(64, 48))
+    write_photo(root / "nested" / "b.jpg", size=(48, 64))
+    Image.new('RGBA', (50, 50), (0, 0, 255, 128)).save(root / "a.png")  # Same base name as a.jpg
+    (root / "broken.jpg").write_bytes(b"not a jpeg")
+    return root
+
+
+def test_batch_renders_every_derivative(tmp_path, image_tree):
+    output_dir = tmp_path / "out"
+    summary = secure_image_processor.process_images_batch(str(image_tree), str(output_dir), DERIVATIVES,
+                                                          max_workers=2)
+
+    assert (summary['total'], summary['processed'], summary['failed']) == (4, 4, 1)
+    assert summary['failures'][0]['path'].endswith("broken.jpg")
+    assert summary['outputs'] == 6
+    outputs = sorted(str(path.relative_to(output_dir)) for path in output_dir.rglob('*') if path.is_file())
+    assert outputs == ['a_png_thumb.png', 'a_png_web.png', 'a_thumb.png', 'a_web.jpg',
+                       'nested/b_thumb.png', 'nested/b_web.jpg']
+    with Image.open(output_dir / "a_web.jpg") as web, Image.open(output_dir / "nested" / "b_thumb.png") as thumb:
+        assert web.size == (32, 24)
+        assert thumb.size == (16, 16)
+
+
+def test_manifest_outputs_keep_files_with_the_same_name_apart(tmp_path):
+    for folder in ("day1", "day2"):
+        (tmp_path / "shoot" / folder).mkdir(parents=True)
+        write_photo(tmp_path / "shoot" / folder / "img.jpg", size=(40, 30))
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps([str(tmp_path / "shoot" / folder / "img.jpg") for folder in ("day1", "day2")]))
+
+    pairs = secure_image_processor.collect_image_inputs(str(manifest), str(tmp_path / "out"))
+    assert [os.path.relpath(base, tmp_path / "out") for _, base in pairs] == [
+        os.path.join("day1", "img"), os.path.join("day2", "img")]
+
+
+def test_batch_reuses_cached_derivatives(tmp_path, image_tree):
+    os.unlink(image_tree / "broken.jpg")
+    cache = secure_image_processor.ImageDerivativeCache(str(tmp_path / "cache"))
+
+    first = secure_image_processor.process_images_batch(str(image_tree), str(tmp_path / "out1"), DERIVATIVES,
+                                                        max_workers=2, cache=cache)
+    second = secure_image_processor.process_images_batch(str(image_tree), str(tmp_path / "out2"), DERIVATIVES,
+                                                         max_workers=2, cache=cache)
+
+    assert first['cache_hits'] == 0
+    assert second['cache_hits'] == second['outputs'] == 6
+    assert len(cache._load_index()) == 6
+    for path in (tmp_path / "out1").rglob('*.*'):
+        assert path.read_bytes() == (tmp_path / "out2" / path.relative_to(tmp_path / "out1")).read_bytes()
+
+
+@pytest.fixture
+def pyvips():
+    try:
+        import pyvips
+    except (ImportError, OSError):
+        pytest.skip("pyvips and libvips are not installed")
+    return pyvips
+
+
+@pytest.fixture
+def large_png(tmp_path):
+    # Left half red, right half blue, so crops can be checked by colour
+    pixels = np.zeros((1200, 1600, 4), dtype=np.uint8)
+    pixels[:, :800] = (255, 0, 0, 255)
+    pixels[:, 800:] = (0, 0, 255, 128)
+    path = tmp_path / "scan.png"
+    Image.fromarray(pixels, 'RGBA').save(path)
+    return str(path)
+
+
+def test_tiled_crop_and_resize_to_tiled_tiff(tmp_path, pyvips, large_png):
+    output = tmp_path / "out.tiff"
+    assert secure_image_processor.process_large_image_tiled(
+        large_png, str(output), crop_box=(400, 0, 1600, 1200), max_size=(300, 300), tile_size=128)
+
+    with Image.open(output) as result:
+        assert result.size == (300, 300)
+        assert (result.tag_v2[322], result.tag_v2[323]) == (128, 128)  # TileWidth, TileLength
+        pixels = np.asarray(result.convert('RGBA'))
+    # The crop keeps a third red and two thirds blue
+    assert tuple(pixels[150, 50]) == (255, 0, 0, 255)
+    assert tuple(pixels[150, 250]) == (0, 0, 255, 128)
+
+
+def test_tiled_jpeg_output_flattens_transparency(tmp_path, pyvips, large_png):
+    output = tmp_path / "out.jpg"
+    assert secure_image_processor.process_large_image_tiled(large_png, str(output), max_size=(160, 120))
+
+    with Image.open(output) as result:
+        assert (result.mode, result.size) == ('RGB', (160, 120))
+        red, green, blue = result.getpixel((150, 60))
+    # Half-transparent blue over white
+    assert red > 100 and blue > 240
+
+
+def test_tiled_processing_restores_libvips_threads(tmp_path, pyvips, large_png, monkeypatch):
+    previous = pyvips.concurrency_get()
+    calls = []
+    concurrency_set = pyvips.concurrency_set
+    monkeypatch.setattr(pyvips, "concurrency_set", lambda threads: calls.append(threads) or concurrency_set(threads))
+
+    assert secure_image_processor.process_large_image_tiled(large_png, str(tmp_path / "out.png"),
+                                                            max_size=(100, 100), memory_budget_mb=64)
+    assert calls == [1, previous]
+    assert pyvips.concurrency_get() == previous
+
+
+def test_tiled_validation_rejects_unsupported_files(tmp_path, pyvips, large_png):
+    jpeg = write_photo(tmp_path / "photo.jpg", size=(64, 48))
+    validation = secure_image_processor.validate_large_image_file(jpeg)
+    assert not validation['is_valid']
+    assert validation['errors'][0].startswith("Invalid file extension for tiled processing")
+
+    validation = secure_image_processor.validate_large_image_file(large_png, max_pixels=1000)
+    assert validation['dimensions'] == (1600, 1200)
+    assert "Image too large: 1,920,000 pixels (max 1,000)" in validation['errors']
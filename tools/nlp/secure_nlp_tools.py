@@ -6,42 +6,264 @@ Implements safe natural language processing with security validations
 
 import nltk
 import spacy
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Iterator
+import os
 import re
+import time
+import hashlib
+from collections import OrderedDict, Counter
 from pathlib import Path
 
-def initialize_nlp_models():
+# Parsed spaCy documents are memoized by text hash so that running several
+# analyses over the same text parses it only once
+DOC_CACHE_SIZE = 32
+_doc_cache = OrderedDict()
+
+# Models and analyzers are loaded lazily, once per process, and shared by
+# every caller; load times are recorded for reporting
+_model_registry = {}
+_model_load_times = {}
+_nltk_data_checked = False
+
+# NLTK resources used by the fallbacks, with their nltk.data lookup paths
+REQUIRED_NLTK_DATA = {
+    'punkt': 'tokenizers/punkt',  # Tokenizer
+    'stopwords': 'corpora/stopwords',  # Stop words
+    'wordnet': 'corpora/wordnet',  # WordNet lexical database
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',  # POS tagger
+    'vader_lexicon': 'sentiment/vader_lexicon.zip'  # Sentiment analysis
+}
+
+def _model_components(model_name: str) -> List[str]:
     """
-    Initializes NLP models with security considerations
+    Reads a spaCy model's component names from its meta without loading it
+    """
+    from spacy.util import get_model_meta, get_package_path, is_package
+
+    model_path = get_package_path(model_name) if is_package(model_name) else Path(model_name)
+    meta = get_model_meta(model_path)
+    return list(meta.get('components') or meta.get('pipeline') or [])
+
+def get_nlp_model(model_name: str = "en_core_web_sm", components: Optional[Iterable[str]] = None,
+                  outputs: Optional[Iterable[str]] = None):
     """
+    Returns a shared spaCy pipeline, loading it on first use
+
+    components limits loading to the named pipes; outputs (e.g. ('tokens',)
+    or ('entities',)) selects the pipes those outputs need. Excluded pipes
+    are never loaded. Returns None if the model is not installed.
+    """
+    if outputs is not None:
+        components = set(components or ())
+        for output in outputs:
+            if output not in BATCH_OUTPUT_COMPONENTS:
+                raise ValueError(f"Unknown output: {output}. Valid: {', '.join(BATCH_OUTPUT_COMPONENTS)}")
+            components |= BATCH_OUTPUT_COMPONENTS[output]
+
+    key = (model_name, tuple(sorted(components)) if components is not None else None)
+    if key in _model_registry:
+        return _model_registry[key]
+
+    started = time.perf_counter()
     try:
-        # Try to load spaCy English model
+        if components is None:
+            nlp = spacy.load(model_name)
+        else:
+            exclude = [name for name in _model_components(model_name) if name not in components]
+            nlp = spacy.load(model_name, exclude=exclude)
+    except OSError:
+        print(f"spaCy model '{model_name}' not found. Please install with: python -m spacy download {model_name}")
+        nlp = None
+
+    _model_registry[key] = nlp
+    if nlp is not None:
+        label = model_name if components is None else f"{model_name}[{','.join(nlp.pipe_names)}]"
+        _model_load_times[label] = round(time.perf_counter() - started, 3)
+    return nlp
+
+def get_sentiment_analyzer():
+    """
+    Returns a shared VADER SentimentIntensityAnalyzer, loading the lexicon once
+    """
+    key = ('vader', None)
+    if key not in _model_registry:
+        from nltk.sentiment import SentimentIntensityAnalyzer
+
+        started = time.perf_counter()
+        _model_registry[key] = SentimentIntensityAnalyzer()
+        _model_load_times['vader'] = round(time.perf_counter() - started, 3)
+    return _model_registry[key]
+
+def get_model_load_times() -> Dict[str, float]:
+    """
+    Reports how long each loaded model or analyzer took to load, in seconds
+    """
+    return dict(_model_load_times)
+
+def check_nltk_data() -> List[str]:
+    """
+    Returns the names of required NLTK resources that are not installed
+    """
+    missing = []
+    for item, resource_path in REQUIRED_NLTK_DATA.items():
         try:
-            nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            print("spaCy English model not found. Please install with: python -m spacy download en_core_web_sm")
-            nlp = None
-        
-        # Download required NLTK data with security
-        required_nltk_data = [
-            'punkt',      # Tokenizer
-            'stopwords',  # Stop words
-            'wordnet',    # WordNet lexical database
-            'averaged_perceptron_tagger',  # POS tagger
-            'vader_lexicon'  # Sentiment analysis
-        ]
-        
-        for item in required_nltk_data:
-            try:
-                nltk.data.find(f'tokenizers/{item}')
-            except LookupError:
+            nltk.data.find(resource_path)
+        except LookupError:
+            missing.append(item)
+    return missing
+
+def initialize_nlp_models(model_name: str = "en_core_web_sm", components: Optional[Iterable[str]] = None):
+    """
+    Initializes NLP models with security considerations
+    """
+    global _nltk_data_checked
+
+    try:
+        nlp = get_nlp_model(model_name, components=components)
+
+        # Check required NLTK data once per process
+        if not _nltk_data_checked:
+            for item in check_nltk_data():
                 print(f"NLTK data '{item}' not found. This may need to be downloaded separately.")
-        
+            _nltk_data_checked = True
+
         return nlp
     except Exception as e:
         print(f"Error initializing NLP models: {str(e)}")
         return None
 
+# Single-pass security scanner. One compiled alternation finds every
+# indicator in a linear scan. Only the short literal prefix of each
+# indicator is consumed (optional payloads are captured via lookahead) so
+# overlapping indicators, e.g. a handler whose value is a javascript: URL,
+# are all reported. Closing </script> and </iframe> tags are located with a
+# forward search instead of a backtracking `.*?`.
+_SECURITY_SCANNER = re.compile(
+    r'(?=[<jvo])'  # First-character prefilter lets the regex engine skip ahead
+    r'(?:(?P<script><script)'
+    r'|(?P<iframe><iframe)'
+    r'|(?P<javascript>javascript:)(?:(?=(?P<javascript_payload>\s*\w+)))?'
+    r'|(?P<vbscript>vbscript:)(?:(?=(?P<vbscript_payload>\s*\w+)))?'
+    r'|(?P<handler>on\w+\s*=)(?:(?=(?P<handler_value>\s*["\'][^"\']*["\'])))?)',
+    re.IGNORECASE
+)
+_CLOSING_TAGS = {
+    'script': re.compile(r'</script>', re.IGNORECASE),
+    'iframe': re.compile(r'</iframe>', re.IGNORECASE),
+}
+
+def _scan_indicators(text: str):
+    """
+    Runs the single-pass scanner over text, returning the indicator flags
+    and the (start, end) spans that cleaning removes
+    """
+    result = {
+        'length': len(text),
+        'has_scripts': False,
+        'has_javascript_urls': False,
+        'has_vbscript_urls': False,
+        'has_event_handlers': False,
+        'has_iframes': False,
+        'blocks_input': False,
+        'is_safe': True
+    }
+    removals = []
+    has_javascript_scheme = False
+    has_loose_handler = False
+
+    # Once a closing-tag search fails from some position, no closing tag
+    # exists after it; remembering that keeps unterminated tags linear
+    no_close_after = {'script': None, 'iframe': None}
+
+    def block_end(tag: str, start: int) -> Optional[int]:
+        tag_end = text.find('>', start)
+        if tag_end == -1:
+            return None
+        limit = no_close_after[tag]
+        if limit is not None and tag_end >= limit:
+            return None
+        closing = _CLOSING_TAGS[tag].search(text, tag_end + 1)
+        if closing is None:
+            no_close_after[tag] = tag_end if limit is None else min(limit, tag_end)
+            return None
+        return closing.end()
+
+    for match in _SECURITY_SCANNER.finditer(text):
+        if match.group('script') is not None:
+            end = block_end('script', match.end())
+            if end is not None:
+                result['has_scripts'] = True
+                removals.append((match.start(), end))
+        elif match.group('iframe') is not None:
+            if block_end('iframe', match.end()) is not None:
+                result['has_iframes'] = True
+        elif match.group('javascript') is not None:
+            has_javascript_scheme = True
+            payload = match.group('javascript_payload')
+            if payload is not None:
+                result['has_javascript_urls'] = True
+                removals.append((match.start(), match.end() + len(payload)))
+        elif match.group('vbscript') is not None:
+            payload = match.group('vbscript_payload')
+            if payload is not None:
+                result['has_vbscript_urls'] = True
+                removals.append((match.start(), match.end() + len(payload)))
+        else:
+            has_loose_handler = True
+            value = match.group('handler_value')
+            if value is not None:
+                result['has_event_handlers'] = True
+                removals.append((match.start(), match.end() + len(value)))
+
+    # NLP input validation is stricter than the safety report: any
+    # "javascript:" or unquoted "on...=" handler rejects the text
+    result['blocks_input'] = result['has_scripts'] or has_javascript_scheme or has_loose_handler
+    result['is_safe'] = not (
+        result['has_scripts'] or 
+        result['has_javascript_urls'] or 
+        result['has_event_handlers'] or 
+        result['has_iframes']
+    )
+
+    return result, removals
+
+def _remove_spans(text: str, spans) -> str:
+    """
+    Removes possibly overlapping (start, end) spans from text
+    """
+    pieces = []
+    position = 0
+    for start, end in sorted(spans):
+        if end <= position:
+            continue  # Already inside a removed span
+        pieces.append(text[position:max(start, position)])
+        position = end
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+def scan_text_security(text: str, clean: bool = False) -> Dict[str, Any]:
+    """
+    Scans text for injection indicators in a single pass
+
+    Returns the indicator flags, whether the text should be rejected as NLP
+    input ('blocks_input'), whether it is safe ('is_safe'), and with clean
+    enabled the text with scripts, script URLs and quoted event handlers
+    removed ('cleaned_text').
+    """
+    result, removals = _scan_indicators(text)
+
+    if clean:
+        # Removing a span joins the text on either side, which can form a
+        # new indicator (e.g. "javascript:<script></script>alert(1)"), so
+        # the cleaned text is scanned again until nothing more is removed
+        cleaned_text = text
+        while removals:
+            cleaned_text = _remove_spans(cleaned_text, removals)
+            removals = _scan_indicators(cleaned_text)[1]
+        result['cleaned_text'] = cleaned_text
+
+    return result
+
 def validate_text_input(text: str, max_length: int = 100000) -> bool:
     """
     Validates text input for NLP processing
@@ -54,19 +276,465 @@ def validate_text_input(text: str, max_length: int = 100000) -> bool:
         return False
     
     # Check for potential code injection patterns
-    dangerous_patterns = [
-        r'<script[^>]*>.*?</script>',  # Script tags
-        r'javascript:',               # JavaScript URLs
-        r'on\w+\s*=',                # Event handlers
-    ]
-    
-    for pattern in dangerous_patterns:
-        if re.search(pattern, text, re.IGNORECASE):
-            print("Potential code injection detected in text")
-            return False
+    if scan_text_security(text)['blocks_input']:
+        print("Potential code injection detected in text")
+        return False
     
     return True
 
+def _text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+def parse_text_cached(text: str, nlp_model):
+    """
+    Parses text with the spaCy model, reusing a recent parse of the same text
+    """
+    key = (id(nlp_model), _text_digest(text))
+    cached = _doc_cache.get(key)
+    if cached is not None and cached[0] is nlp_model:
+        _doc_cache.move_to_end(key)
+        return cached[1]
+
+    doc = nlp_model(text)
+    _doc_cache[key] = (nlp_model, doc)
+    if len(_doc_cache) > DOC_CACHE_SIZE:
+        _doc_cache.popitem(last=False)
+    return doc
+
+def clear_document_cache():
+    """
+    Drops all memoized spaCy documents
+    """
+    _doc_cache.clear()
+
+def _tokens_from(text: str, doc) -> List[str]:
+    if doc is not None:
+        return [token.text for token in doc if not token.is_space]
+
+    # Fallback to NLTK if spaCy not available
+    from nltk.tokenize import word_tokenize
+    return word_tokenize(text)
+
+def _pos_tags_from(text: str, doc) -> List[tuple]:
+    if doc is not None:
+        return [(token.text, token.pos_) for token in doc if not token.is_space]
+
+    # Fallback to NLTK
+    from nltk.tokenize import word_tokenize
+    from nltk.tag import pos_tag
+    tokens = word_tokenize(text)
+    return pos_tag(tokens)
+
+def _entities_from(doc) -> List[Dict[str, Any]]:
+    entities = []
+    for ent in doc.ents:
+        entities.append({
+            'text': ent.text,
+            'label': ent.label_,
+            'description': spacy.explain(ent.label_),
+            'start': ent.start_char,
+            'end': ent.end_char
+        })
+    return entities
+
+def _keyword_counts_from(text: str, doc, lemmatize: bool = False) -> Counter:
+    # Counts keyword candidates, keyed in order of first appearance
+    if doc is not None:
+        # Extract noun phrases and important tokens
+        keywords = []
+        for token in doc:
+            if (not token.is_stop and 
+                not token.is_punct and 
+                token.pos_ in ['NOUN', 'PROPN', 'ADJ'] and 
+                len(token.text) > 2):
+                keywords.append((lemmatize and token.lemma_ or token.text).lower())
+        
+        # Also include noun chunks
+        for chunk in doc.noun_chunks:
+            if len(chunk.text) > 2 and not chunk.text.isspace():
+                keywords.append(chunk.text.lower())
+        
+        return Counter(keywords)
+    else:
+        # Fallback using basic NLTK approach
+        from nltk.tokenize import word_tokenize
+        from nltk.corpus import stopwords
+        from nltk.tag import pos_tag
+        
+        stop_words = set(stopwords.words('english'))
+        tokens = word_tokenize(text.lower())
+        pos_tags = pos_tag(tokens)
+        
+        keywords = [
+            word for word, pos in pos_tags 
+            if word not in stop_words and 
+            pos.startswith(('NN', 'JJ')) and 
+            len(word) > 2
+        ]
+        
+        return Counter(keywords)
+
+def _keywords_from(text: str, doc, max_keywords: int) -> List[str]:
+    # Counter keys are unique and keep first-appearance order
+    return list(_keyword_counts_from(text, doc))[:max_keywords]
+
+# Extractive summarization. Sentences are vectorized with TF-IDF and scored
+# either by similarity to the document centroid ('tfidf') or by PageRank over
+# the sentence similarity graph ('textrank'); 'lead' keeps leading sentences.
+SUMMARY_METHODS = ('textrank', 'tfidf', 'lead')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+def _sentences_from(text: str, doc) -> List[str]:
+    if doc is not None and doc.has_annotation("SENT_START"):
+        return [sent.text.strip() for sent in doc.sents if sent.text.strip()]
+    return [sentence.strip() for sentence in _SENTENCE_SPLIT.split(text) if sentence.strip()]
+
+def _textrank_scores(matrix, damping: float, max_iter: int, tol: float):
+    import numpy as np
+
+    # Rows are L2-normalized, so the product holds cosine similarities
+    similarity = (matrix @ matrix.T).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+
+    count = similarity.shape[0]
+    out_weight = np.asarray(similarity.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    out_weight[dangling] = 1.0
+    transition = similarity.multiply(1.0 / out_weight[:, None]).tocsr().T.tocsr()
+
+    scores = np.full(count, 1.0 / count)
+    for _ in range(max_iter):
+        # Sentences without neighbours spread their rank uniformly
+        updated = (1 - damping) / count + damping * (transition @ scores + scores[dangling].sum() / count)
+        if np.abs(updated - scores).sum() < tol:
+            return updated
+        scores = updated
+    return scores
+
+def _centroid_scores(matrix):
+    import numpy as np
+
+    centroid = np.asarray(matrix.mean(axis=0)).ravel()
+    norm = np.linalg.norm(centroid)
+    if norm == 0:
+        return np.zeros(matrix.shape[0])
+    return matrix @ (centroid / norm)
+
+def _lead_scores(count: int):
+    import numpy as np
+    return np.arange(count, 0, -1, dtype=float)
+
+def _select_sentences(sentences: List[str], scores, max_length: int) -> str:
+    import numpy as np
+
+    # Take the best sentences that fit the budget, then restore text order
+    chosen = []
+    used = 0
+    for index in np.argsort(-scores, kind='stable'):
+        length = len(sentences[index]) + (1 if chosen else 0)
+        if used + length <= max_length:
+            chosen.append(index)
+            used += length
+
+    if not chosen:
+        best = sentences[int(np.argmax(scores))]
+        return best[:max_length].rsplit(' ', 1)[0] if ' ' in best[:max_length] else best[:max_length]
+    return ' '.join(sentences[index] for index in sorted(chosen))
+
+class ExtractiveSummarizer:
+    """
+    TF-IDF / TextRank extractive summarizer
+
+    A summarizer fitted on a corpus shares its vocabulary and IDF weights
+    across every document it summarizes; an unfitted one weights terms
+    within each document.
+
+    Usage:
+        summarizer = ExtractiveSummarizer().fit(corpus)
+        summaries = summarizer.summarize_batch(texts, max_length=500)
+    """
+
+    def __init__(self, method: str = 'textrank', stop_words: Optional[str] = 'english',
+                 max_features: Optional[int] = 50000, damping: float = 0.85,
+                 max_iter: int = 100, tol: float = 1e-6):
+        if method not in ('textrank', 'tfidf'):
+            raise ValueError(f"Unknown method: {method}. Valid: textrank, tfidf")
+        self.method = method
+        self.stop_words = stop_words
+        self.max_features = max_features
+        self.damping = damping
+        self.max_iter = max_iter
+        self.tol = tol
+        self.vectorizer = None
+
+    def _new_vectorizer(self):
+        import numpy as np
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        return TfidfVectorizer(stop_words=self.stop_words, max_features=self.max_features,
+                               sublinear_tf=True, dtype=np.float64)
+
+    def fit(self, texts: Iterable[str]) -> 'ExtractiveSummarizer':
+        """
+        Learns the vocabulary and IDF weights from a corpus of documents
+        """
+        self.vectorizer = self._new_vectorizer().fit(
+            text for text in texts if validate_text_input(text))
+        return self
+
+    def _score(self, matrix):
+        if self.method == 'textrank':
+            return _textrank_scores(matrix, self.damping, self.max_iter, self.tol)
+        return _centroid_scores(matrix)
+
+    def _summarize_sentences(self, sentences: List[str], matrix, max_length: int) -> str:
+        if len(sentences) <= 1 or matrix.nnz == 0:
+            return _select_sentences(sentences, _lead_scores(len(sentences)), max_length)
+        return _select_sentences(sentences, self._score(matrix), max_length)
+
+    def summarize_sentence_lists(self, sentence_lists: List[List[str]], max_length: int = 1000) -> List[str]:
+        """
+        Summarizes documents that are already split into sentences,
+        vectorizing all of their sentences in one pass
+        """
+        all_sentences = [sentence for sentences in sentence_lists for sentence in sentences]
+        vectorizer = self.vectorizer
+        if vectorizer is None:
+            try:
+                vectorizer = self._new_vectorizer().fit(all_sentences)
+            except ValueError:
+                # Only stop words: fall back to leading sentences
+                vectorizer = None
+        matrix = vectorizer.transform(all_sentences) if vectorizer is not None else None
+
+        summaries = []
+        start = 0
+        for sentences in sentence_lists:
+            end = start + len(sentences)
+            if not sentences:
+                summaries.append('')
+            elif matrix is None:
+                summaries.append(_select_sentences(sentences, _lead_scores(len(sentences)), max_length))
+            else:
+                summaries.append(self._summarize_sentences(sentences, matrix[start:end], max_length))
+            start = end
+        return summaries
+
+    def summarize(self, text: str, max_length: int = 1000, nlp_model=None) -> Optional[str]:
+        """
+        Securely summarizes a document within max_length characters
+        """
+        return self.summarize_batch([text], max_length=max_length, nlp_model=nlp_model)[0]
+
+    def summarize_batch(self, texts: Iterable[str], max_length: int = 1000, nlp_model=None,
+                        batch_size: int = 256, n_process: int = 1) -> List[Optional[str]]:
+        """
+        Securely summarizes many documents, vectorizing all of their sentences
+        in one pass (None for texts that fail validation or errors)
+        """
+        texts = list(texts)
+        results = [None] * len(texts)
+        valid = [index for index, text in enumerate(texts) if validate_text_input(text)]
+
+        try:
+            pending = []
+            for index in valid:
+                if len(texts[index]) <= max_length:
+                    results[index] = texts[index]  # Already short enough
+                else:
+                    pending.append(index)
+            if not pending:
+                return results
+
+            if nlp_model:
+                disable = components_to_disable(nlp_model, ('summary',))
+                docs = nlp_model.pipe((texts[index] for index in pending), batch_size=batch_size,
+                                      n_process=n_process, disable=disable)
+                sentence_lists = [_sentences_from(texts[index], doc) for index, doc in zip(pending, docs)]
+            else:
+                sentence_lists = [_sentences_from(texts[index], None) for index in pending]
+
+            summaries = self.summarize_sentence_lists(sentence_lists, max_length)
+            for index, summary in zip(pending, summaries):
+                results[index] = summary
+        except ImportError:
+            raise
+        except Exception as e:
+            print(f"Error during text summarization: {str(e)}")
+            return [None] * len(texts)
+
+        return results
+
+def _summary_from(text: str, doc, max_length: int, method: str = 'textrank',
+                  summarizer: Optional[ExtractiveSummarizer] = None) -> str:
+    # Shared by the standalone, session and batch APIs so that they return
+    # the same summary for the same text
+    if len(text) <= max_length:
+        return text  # Already short enough
+
+    sentences = _sentences_from(text, doc)
+    if not sentences:
+        return ''
+
+    if summarizer is not None or method != 'lead':
+        try:
+            summarizer = summarizer or ExtractiveSummarizer(method=method)
+            return summarizer.summarize_sentence_lists([sentences], max_length)[0]
+        except ImportError:
+            print("Extractive summarization requires scikit-learn. Falling back to leading sentences")
+    return _select_sentences(sentences, _lead_scores(len(sentences)), max_length)
+
+# Corpus keyword statistics. Document frequencies are kept in SQLite and
+# updated incrementally, so keywords are scored by TF-IDF against everything
+# indexed so far without rescanning the corpus.
+DEFAULT_KEYWORD_INDEX_PATH = str(Path.home() / '.cache' / 'openclaw' / 'keyword_index.sqlite3')
+_SQLITE_MAX_PARAMS = 500
+
+class KeywordIndex:
+    """
+    Persistent document-frequency store for TF-IDF keyword extraction
+
+    Usage:
+        with KeywordIndex() as index:
+            index.add_documents(enumerate(articles), nlp_model)
+            keywords = index.extract(text, nlp_model)
+    """
+
+    def __init__(self, db_path: str = DEFAULT_KEYWORD_INDEX_PATH):
+        import sqlite3
+
+        self.db_path = db_path
+        if db_path != ':memory:':
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    @property
+    def document_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _term_counts(self, texts: List[str], nlp_model, batch_size: int, n_process: int) -> Iterator[Counter]:
+        if not nlp_model:
+            for text in texts:
+                yield _keyword_counts_from(text, None)
+            return
+
+        # Keywords need the tagger and parser; keep the lemmatizer for lemmas
+        disable = [name for name in components_to_disable(nlp_model, ('keywords',)) if name != 'lemmatizer']
+        for doc in nlp_model.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable):
+            yield _keyword_counts_from(doc.text, doc, lemmatize=True)
+
+    def _document_frequencies(self, terms: List[str]) -> Dict[str, int]:
+        frequencies = {}
+        for start in range(0, len(terms), _SQLITE_MAX_PARAMS):
+            chunk = terms[start:start + _SQLITE_MAX_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            frequencies.update(self._conn.execute(
+                f"SELECT term, df FROM terms WHERE term IN ({placeholders})", chunk))
+        return frequencies
+
+    def add_documents(self, items: Iterable[tuple], nlp_model=None, batch_size: int = 256,
+                      n_process: int = 1) -> int:
+        """
+        Adds (doc_id, text) pairs to the document frequencies; documents
+        already indexed are skipped. Returns the number added.
+        """
+        accepted = []
+        pending_ids = set()
+        for doc_id, text in items:
+            doc_id = str(doc_id)
+            if doc_id in pending_ids or not validate_text_input(text):
+                continue
+            accepted.append((doc_id, text))
+            pending_ids.add(doc_id)
+
+        known = set()
+        ids = [doc_id for doc_id, _ in accepted]
+        for start in range(0, len(ids), _SQLITE_MAX_PARAMS):
+            chunk = ids[start:start + _SQLITE_MAX_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            known.update(row[0] for row in self._conn.execute(
+                f"SELECT doc_id FROM documents WHERE doc_id IN ({placeholders})", chunk))
+        accepted = [(doc_id, text) for doc_id, text in accepted if doc_id not in known]
+        if not accepted:
+            return 0
+
+        increments = Counter()
+        for counts in self._term_counts([text for _, text in accepted], nlp_model, batch_size, n_process):
+            increments.update(counts.keys())
+
+        # One transaction per batch keeps the store consistent on failure
+        with self._conn:
+            self._conn.executemany("INSERT INTO documents (doc_id) VALUES (?)",
+                                   ((doc_id,) for doc_id, _ in accepted))
+            self._conn.executemany("INSERT OR IGNORE INTO terms (term, df) VALUES (?, 0)",
+                                   ((term,) for term in increments))
+            self._conn.executemany("UPDATE terms SET df = df + ? WHERE term = ?",
+                                   ((count, term) for term, count in increments.items()))
+        return len(accepted)
+
+    def add_document(self, doc_id: str, text: str, nlp_model=None) -> bool:
+        """
+        Adds a single document to the document frequencies
+        """
+        return self.add_documents([(doc_id, text)], nlp_model) == 1
+
+    def extract_batch(self, texts: Iterable[str], nlp_model=None, max_keywords: int = 10,
+                      with_scores: bool = False, batch_size: int = 256,
+                      n_process: int = 1) -> List[Optional[List[Any]]]:
+        """
+        Ranks each text's terms and noun chunks by TF-IDF against the indexed
+        corpus (None for texts that fail validation)
+        """
+        import numpy as np
+
+        texts = list(texts)
+        results = [None] * len(texts)
+        valid = [index for index, text in enumerate(texts) if validate_text_input(text)]
+        if not valid:
+            return results
+
+        all_counts = list(self._term_counts([texts[index] for index in valid], nlp_model,
+                                            batch_size, n_process))
+        terms = list({term for counts in all_counts for term in counts})
+        frequencies = self._document_frequencies(terms)
+        total = self.document_count
+
+        for index, counts in zip(valid, all_counts):
+            if not counts:
+                results[index] = []
+                continue
+            keywords = list(counts)
+            tf = np.fromiter(counts.values(), dtype=np.float64, count=len(keywords))
+            df = np.fromiter((frequencies.get(term, 0) for term in keywords), dtype=np.float64,
+                             count=len(keywords))
+            # Sublinear term frequency and smoothed IDF, as in TfidfVectorizer
+            scores = (1.0 + np.log(tf)) * (np.log((1.0 + total) / (1.0 + df)) + 1.0)
+            top = np.argsort(-scores, kind='stable')[:max_keywords]
+            if with_scores:
+                results[index] = [{'keyword': keywords[i], 'score': float(scores[i])} for i in top]
+            else:
+                results[index] = [keywords[i] for i in top]
+        return results
+
+    def extract(self, text: str, nlp_model=None, max_keywords: int = 10,
+                with_scores: bool = False) -> Optional[List[Any]]:
+        """
+        Ranks a text's keywords by TF-IDF against the indexed corpus
+        """
+        return self.extract_batch([text], nlp_model, max_keywords, with_scores)[0]
+
 def secure_tokenize(text: str, nlp_model=None) -> Optional[List[str]]:
     """
     Securely tokenizes text
@@ -75,15 +743,8 @@ def secure_tokenize(text: str, nlp_model=None) -> Optional[List[str]]:
         return None
     
     try:
-        if nlp_model:
-            doc = nlp_model(text)
-            tokens = [token.text for token in doc if not token.is_space]
-        else:
-            # Fallback to NLTK if spaCy not available
-            from nltk.tokenize import word_tokenize
-            tokens = word_tokenize(text)
-        
-        return tokens
+        doc = parse_text_cached(text, nlp_model) if nlp_model else None
+        return _tokens_from(text, doc)
     except Exception as e:
         print(f"Error during tokenization: {str(e)}")
         return None
@@ -96,17 +757,8 @@ def secure_pos_tag(text: str, nlp_model=None) -> Optional[List[tuple]]:
         return None
     
     try:
-        if nlp_model:
-            doc = nlp_model(text)
-            pos_tags = [(token.text, token.pos_) for token in doc if not token.is_space]
-        else:
-            # Fallback to NLTK
-            from nltk.tokenize import word_tokenize
-            from nltk.tag import pos_tag
-            tokens = word_tokenize(text)
-            pos_tags = pos_tag(tokens)
-        
-        return pos_tags
+        doc = parse_text_cached(text, nlp_model) if nlp_model else None
+        return _pos_tags_from(text, doc)
     except Exception as e:
         print(f"Error during POS tagging: {str(e)}")
         return None
@@ -120,17 +772,7 @@ def secure_named_entity_recognition(text: str, nlp_model=None) -> Optional[List[
     
     try:
         if nlp_model:
-            doc = nlp_model(text)
-            entities = []
-            for ent in doc.ents:
-                entities.append({
-                    'text': ent.text,
-                    'label': ent.label_,
-                    'description': spacy.explain(ent.label_),
-                    'start': ent.start_char,
-                    'end': ent.end_char
-                })
-            return entities
+            return _entities_from(parse_text_cached(text, nlp_model))
         else:
             print("NER requires spaCy model. Please install en_core_web_sm model.")
             return None
@@ -146,10 +788,7 @@ def secure_sentiment_analysis(text: str) -> Optional[Dict[str, float]]:
         return None
     
     try:
-        from nltk.sentiment import SentimentIntensityAnalyzer
-        
-        sia = SentimentIntensityAnalyzer()
-        scores = sia.polarity_scores(text)
+        scores = get_sentiment_analyzer().polarity_scores(text)
         
         # Return normalized scores
         return {
@@ -162,99 +801,391 @@ def secure_sentiment_analysis(text: str) -> Optional[Dict[str, float]]:
         print(f"Error during sentiment analysis: {str(e)}")
         return None
 
-def secure_text_summarization(text: str, max_length: int = 1000, nlp_model=None) -> Optional[str]:
+def secure_text_summarization(text: str, max_length: int = 1000, nlp_model=None,
+                              method: str = 'textrank',
+                              summarizer: Optional[ExtractiveSummarizer] = None) -> Optional[str]:
     """
-    Securely summarizes text (basic implementation)
+    Securely summarizes text by extracting its most central sentences
+
+    method is 'textrank', 'tfidf' or 'lead' (leading sentences); pass a fitted
+    ExtractiveSummarizer to weight terms by a shared corpus vocabulary.
     """
+    if method not in SUMMARY_METHODS:
+        print(f"Unknown summarization method: {method}. Valid: {', '.join(SUMMARY_METHODS)}")
+        return None
+
     if not validate_text_input(text):
         return None
     
     try:
-        # For now, implement a simple extractive summary
-        # In the future, this could use more sophisticated methods
-        
-        if len(text) <= max_length:
-            return text  # Already short enough
-        
-        # Split into sentences and take the first few
-        if nlp_model:
-            doc = nlp_model(text)
-            sentences = [sent.text.strip() for sent in doc.sents]
-        else:
-            # Simple split by sentence endings
-            import re
-            sentences = re.split(r'[.!?]+', text)
-            sentences = [s.strip() for s in sentences if s.strip()]
-        
-        # Build summary
-        summary = ""
-        for sentence in sentences:
-            if len(summary) + len(sentence) > max_length:
-                break
-            summary += sentence + ". "
-        
-        return summary.strip()
+        # Only parse when the text actually needs shortening
+        doc = parse_text_cached(text, nlp_model) if nlp_model and len(text) > max_length else None
+        return _summary_from(text, doc, max_length, method=method, summarizer=summarizer)
     except Exception as e:
         print(f"Error during text summarization: {str(e)}")
         return None
 
-def secure_keyword_extraction(text: str, nlp_model=None, max_keywords: int = 10) -> Optional[List[str]]:
+def secure_keyword_extraction(text: str, nlp_model=None, max_keywords: int = 10,
+                              keyword_index: Optional[KeywordIndex] = None) -> Optional[List[str]]:
     """
-    Securely extracts keywords from text
+    Securely extracts keywords from text, ranked by TF-IDF when a
+    KeywordIndex is given and in document order otherwise
     """
     if not validate_text_input(text):
         return None
     
     try:
-        if nlp_model:
-            doc = nlp_model(text)
-            # Extract noun phrases and important tokens
-            keywords = []
-            for token in doc:
-                if (not token.is_stop and 
-                    not token.is_punct and 
-                    token.pos_ in ['NOUN', 'PROPN', 'ADJ'] and 
-                    len(token.text) > 2):
-                    keywords.append(token.text.lower())
-            
-            # Also include noun chunks
-            for chunk in doc.noun_chunks:
-                if len(chunk.text) > 2 and not chunk.text.isspace():
-                    keywords.append(chunk.text.lower())
-            
-            # Remove duplicates while preserving order
-            seen = set()
-            unique_keywords = []
-            for kw in keywords:
-                if kw not in seen:
-                    seen.add(kw)
-                    unique_keywords.append(kw)
-            
-            return unique_keywords[:max_keywords]
-        else:
-            # Fallback using basic NLTK approach
-            from nltk.tokenize import word_tokenize
-            from nltk.corpus import stopwords
-            from nltk.tag import pos_tag
-            
-            stop_words = set(stopwords.words('english'))
-            tokens = word_tokenize(text.lower())
-            pos_tags = pos_tag(tokens)
-            
-            keywords = [
-                word for word, pos in pos_tags 
-                if word not in stop_words and 
-                pos.startswith(('NN', 'JJ')) and 
-                len(word) > 2
-            ]
-            
-            # Remove duplicates
-            unique_keywords = list(dict.fromkeys(keywords))  # Preserves order
-            return unique_keywords[:max_keywords]
+        if keyword_index is not None:
+            return keyword_index.extract(text, nlp_model, max_keywords)
+        doc = parse_text_cached(text, nlp_model) if nlp_model else None
+        return _keywords_from(text, doc, max_keywords)
     except Exception as e:
         print(f"Error during keyword extraction: {str(e)}")
         return None
 
+class NLPAnalysisSession:
+    """
+    Validates and parses a document once, then derives every analysis from
+    the same spaCy Doc
+
+    Usage:
+        session = NLPAnalysisSession(text, nlp_model)
+        if session.is_valid:
+            results = session.analyze()
+    """
+
+    def __init__(self, text: str, nlp_model=None, max_length: int = 100000):
+        self.text = text
+        self.nlp_model = nlp_model
+        self.is_valid = validate_text_input(text, max_length=max_length)
+        self._doc = None
+
+    @property
+    def doc(self):
+        """
+        The parsed spaCy Doc (None without a model or for invalid text)
+        """
+        if self._doc is None and self.is_valid and self.nlp_model:
+            self._doc = parse_text_cached(self.text, self.nlp_model)
+        return self._doc
+
+    def _run(self, label: str, func):
+        if not self.is_valid:
+            return None
+        try:
+            return func()
+        except Exception as e:
+            print(f"Error during {label}: {str(e)}")
+            return None
+
+    def tokens(self) -> Optional[List[str]]:
+        return self._run("tokenization", lambda: _tokens_from(self.text, self.doc))
+
+    def pos_tags(self) -> Optional[List[tuple]]:
+        return self._run("POS tagging", lambda: _pos_tags_from(self.text, self.doc))
+
+    def entities(self) -> Optional[List[Dict[str, Any]]]:
+        if self.is_valid and not self.nlp_model:
+            print("NER requires spaCy model. Please install en_core_web_sm model.")
+            return None
+        return self._run("NER", lambda: _entities_from(self.doc))
+
+    def keywords(self, max_keywords: int = 10) -> Optional[List[str]]:
+        return self._run("keyword extraction", lambda: _keywords_from(self.text, self.doc, max_keywords))
+
+    def summary(self, max_length: int = 1000) -> Optional[str]:
+        return self._run("text summarization", lambda: _summary_from(self.text, self.doc, max_length))
+
+    def sentiment(self) -> Optional[Dict[str, float]]:
+        if not self.is_valid:
+            return None
+        return secure_sentiment_analysis(self.text)
+
+    def analyze(self, max_keywords: int = 10, summary_length: int = 1000,
+                include_sentiment: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Runs the full analysis suite from a single parse
+        """
+        if not self.is_valid:
+            return None
+
+        results = {
+            'tokens': self.tokens(),
+            'pos_tags': self.pos_tags(),
+            'entities': self.entities() if self.nlp_model else None,
+            'keywords': self.keywords(max_keywords),
+            'summary': self.summary(summary_length)
+        }
+        if include_sentiment:
+            results['sentiment'] = self.sentiment()
+        return results
+
+def analyze_text_full(text: str, nlp_model=None, max_keywords: int = 10,
+                      summary_length: int = 1000) -> Optional[Dict[str, Any]]:
+    """
+    Securely runs tokenization, POS tagging, NER, keyword extraction,
+    summarization and sentiment analysis with a single validation and parse
+    """
+    return NLPAnalysisSession(text, nlp_model).analyze(max_keywords=max_keywords,
+                                                       summary_length=summary_length)
+
+# spaCy components each batch output depends on; components not needed for
+# the requested outputs are disabled while streaming texts through nlp.pipe
+BATCH_OUTPUT_COMPONENTS = {
+    'tokens': set(),
+    'pos_tags': {'tok2vec', 'tagger', 'attribute_ruler', 'morphologizer'},
+    'entities': {'tok2vec', 'ner', 'entity_ruler'},
+    'keywords': {'tok2vec', 'tagger', 'attribute_ruler', 'morphologizer', 'parser'},
+    'summary': {'tok2vec', 'parser', 'senter', 'sentencizer'},
+    'sentiment': set(),  # VADER runs on raw text
+}
+
+def components_to_disable(nlp_model, outputs: Iterable[str]) -> List[str]:
+    """
+    Lists pipeline components that none of the requested outputs need
+    """
+    needed = set()
+    for output in outputs:
+        if output not in BATCH_OUTPUT_COMPONENTS:
+            raise ValueError(f"Unknown output: {output}. Valid: {', '.join(BATCH_OUTPUT_COMPONENTS)}")
+        needed |= BATCH_OUTPUT_COMPONENTS[output]
+    return [name for name in nlp_model.pipe_names if name not in needed]
+
+def _batch_result(text: str, doc, outputs: Iterable[str], max_keywords: int,
+                  summary_length: int) -> Dict[str, Any]:
+    result = {}
+    for output in outputs:
+        try:
+            if output == 'tokens':
+                result['tokens'] = _tokens_from(text, doc)
+            elif output == 'pos_tags':
+                result['pos_tags'] = _pos_tags_from(text, doc)
+            elif output == 'entities':
+                result['entities'] = _entities_from(doc) if doc is not None else None
+            elif output == 'keywords':
+                result['keywords'] = _keywords_from(text, doc, max_keywords)
+            elif output == 'summary':
+                result['summary'] = _summary_from(text, doc, summary_length)
+            elif output == 'sentiment':
+                result['sentiment'] = secure_sentiment_analysis(text)
+        except Exception as e:
+            print(f"Error computing {output}: {str(e)}")
+            result[output] = None
+    return result
+
+def process_texts_batch(texts: Iterable[str], nlp_model=None,
+                        outputs: Iterable[str] = ('tokens',),
+                        batch_size: int = 256, n_process: int = 1,
+                        max_keywords: int = 10, summary_length: int = 1000,
+                        max_length: int = 100000) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Streams texts through nlp.pipe and yields one result dict per input text,
+    in input order (None for texts that fail validation)
+
+    Only the pipeline components needed for the requested outputs run, e.g.
+    tokenization alone disables the tagger, parser and NER. n_process > 1
+    parses batches in worker processes.
+    """
+    outputs = tuple(outputs)
+    disable = components_to_disable(nlp_model, outputs) if nlp_model else []
+    needs_doc = nlp_model is not None and any(output != 'sentiment' for output in outputs)
+
+    if not needs_doc:
+        for text in texts:
+            if not validate_text_input(text, max_length=max_length):
+                yield None
+                continue
+            yield _batch_result(text, None, outputs, max_keywords, summary_length)
+        return
+
+    counter = {'total': 0}
+
+    def valid_items():
+        for index, text in enumerate(texts):
+            counter['total'] = index + 1
+            if validate_text_input(text, max_length=max_length):
+                yield text, index
+
+    next_index = 0
+    for doc, index in nlp_model.pipe(valid_items(), as_tuples=True, batch_size=batch_size,
+                                     n_process=n_process, disable=disable):
+        # Emit placeholders for invalid texts skipped before this one
+        while next_index < index:
+            yield None
+            next_index += 1
+        yield _batch_result(doc.text, doc, outputs, max_keywords, summary_length)
+        next_index = index + 1
+
+    while next_index < counter['total']:
+        yield None
+        next_index += 1
+
+def secure_tokenize_batch(texts: Iterable[str], nlp_model=None, batch_size: int = 1000,
+                          n_process: int = 1) -> List[Optional[List[str]]]:
+    """
+    Securely tokenizes many texts with only the tokenizer enabled
+    """
+    return [result['tokens'] if result else None
+            for result in process_texts_batch(texts, nlp_model, ('tokens',),
+                                              batch_size=batch_size, n_process=n_process)]
+
+def secure_named_entity_recognition_batch(texts: Iterable[str], nlp_model, batch_size: int = 256,
+                                          n_process: int = 1) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Securely performs NER over many texts with only NER components enabled
+    """
+    if not nlp_model:
+        print("NER requires spaCy model. Please install en_core_web_sm model.")
+        return []
+    return [result['entities'] if result else None
+            for result in process_texts_batch(texts, nlp_model, ('entities',),
+                                              batch_size=batch_size, n_process=n_process)]
+
+# Long documents are validated once as a whole, then split into chunks that
+# each stay well under the per-text limits. Sentiment uses smaller chunks
+# because VADER scores are only meaningful over short spans.
+LONG_TEXT_MAX_LENGTH = 5000000
+LONG_TEXT_CHUNK_CHARS = 20000
+SENTIMENT_CHUNK_CHARS = 10000
+LONG_TEXT_OUTPUTS = ('tokens', 'pos_tags', 'entities', 'keywords', 'sentiment')
+
+_SENTENCE_END = re.compile(r'[.!?][\'")\]]*\s+')
+
+def _chunk_end(text: str, start: int, max_chars: int) -> int:
+    # Prefer a paragraph break, then a sentence end, then whitespace, all in
+    # the second half of the window so chunks do not become tiny
+    limit = start + max_chars
+    if limit >= len(text):
+        return len(text)
+    floor = start + max_chars // 2
+
+    paragraph = text.rfind('\n\n', floor, limit)
+    if paragraph != -1:
+        return paragraph + 2
+
+    last_sentence = None
+    for match in _SENTENCE_END.finditer(text, floor, limit):
+        last_sentence = match
+    if last_sentence is not None:
+        return last_sentence.end()
+
+    for index in range(limit - 1, floor - 1, -1):
+        if text[index].isspace():
+            return index + 1
+
+    return limit
+
+def split_text_chunks(text: str, max_chars: int = LONG_TEXT_CHUNK_CHARS) -> Iterator[tuple]:
+    """
+    Yields (offset, chunk) pairs covering the text at paragraph or sentence
+    boundaries; chunks are contiguous so offset + local index is the position
+    in the original text
+    """
+    if max_chars < 2:
+        raise ValueError("max_chars must be at least 2")
+    start = 0
+    while start < len(text):
+        end = _chunk_end(text, start, max_chars)
+        yield start, text[start:end]
+        start = end
+
+def _long_text_sentiment(text: str, chunk_chars: int) -> Dict[str, float]:
+    # Average the VADER scores of each chunk, weighted by chunk length
+    analyzer = get_sentiment_analyzer()
+    totals = {'neg': 0.0, 'neu': 0.0, 'pos': 0.0, 'compound': 0.0}
+    weight = 0
+    for _, chunk in split_text_chunks(text, chunk_chars):
+        if chunk.isspace():
+            continue
+        scores = analyzer.polarity_scores(chunk)
+        for key in totals:
+            totals[key] += scores[key] * len(chunk)
+        weight += len(chunk)
+
+    if weight == 0:
+        return {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
+    return {key: value / weight for key, value in totals.items()}
+
+def analyze_long_text(text: str, nlp_model=None,
+                      outputs: Iterable[str] = ('entities', 'keywords', 'sentiment'),
+                      chunk_chars: int = LONG_TEXT_CHUNK_CHARS,
+                      batch_size: int = 4, n_process: int = 1, max_keywords: int = 10,
+                      max_length: int = LONG_TEXT_MAX_LENGTH) -> Optional[Dict[str, Any]]:
+    """
+    Securely analyzes text longer than the per-call limits by validating it
+    once, parsing it in chunks through nlp.pipe and merging the results
+
+    Entity offsets refer to the original text, keywords are ranked by their
+    occurrence counts across all chunks (returned in keyword_scores) and
+    sentiment is the length-weighted average of the chunk scores. Only one
+    batch of parsed chunks is held in memory at a time; n_process > 1 parses
+    chunks in worker processes.
+    """
+    outputs = tuple(outputs)
+    for output in outputs:
+        if output not in LONG_TEXT_OUTPUTS:
+            raise ValueError(f"Unknown output: {output}. Valid: {', '.join(LONG_TEXT_OUTPUTS)}")
+
+    if not validate_text_input(text, max_length=max_length):
+        return None
+
+    result = {'length': len(text), 'chunks': 0}
+    doc_outputs = [output for output in outputs if output != 'sentiment']
+    if 'entities' in doc_outputs and not nlp_model:
+        print("NER requires spaCy model. Please install en_core_web_sm model.")
+        doc_outputs.remove('entities')
+        result['entities'] = None
+
+    tokens = [] if 'tokens' in doc_outputs else None
+    pos_tags = [] if 'pos_tags' in doc_outputs else None
+    entities = [] if 'entities' in doc_outputs else None
+    keyword_counts = Counter() if 'keywords' in doc_outputs else None
+
+    try:
+        chunks = split_text_chunks(text, chunk_chars)
+        if nlp_model and doc_outputs:
+            disable = components_to_disable(nlp_model, doc_outputs)
+            parsed = ((doc.text, doc, offset) for doc, offset in
+                      nlp_model.pipe(((chunk, offset) for offset, chunk in chunks), as_tuples=True,
+                                     batch_size=batch_size, n_process=n_process, disable=disable))
+        elif doc_outputs:
+            parsed = ((chunk, None, offset) for offset, chunk in chunks)
+        else:
+            parsed = ()
+
+        for chunk, doc, offset in parsed:
+            result['chunks'] += 1
+            if tokens is not None:
+                tokens.extend(_tokens_from(chunk, doc))
+            if pos_tags is not None:
+                pos_tags.extend(_pos_tags_from(chunk, doc))
+            if entities is not None:
+                for entity in _entities_from(doc):
+                    entity['start'] += offset
+                    entity['end'] += offset
+                    entities.append(entity)
+            if keyword_counts is not None:
+                keyword_counts.update(_keyword_counts_from(chunk, doc))
+
+        if tokens is not None:
+            result['tokens'] = tokens
+        if pos_tags is not None:
+            result['pos_tags'] = pos_tags
+        if entities is not None:
+            result['entities'] = entities
+        if keyword_counts is not None:
+            # Counter.most_common keeps first-appearance order among ties
+            top = keyword_counts.most_common(max_keywords)
+            result['keywords'] = [keyword for keyword, _ in top]
+            result['keyword_scores'] = dict(top)
+        if 'sentiment' in outputs:
+            result['sentiment'] = _long_text_sentiment(text, min(chunk_chars, SENTIMENT_CHUNK_CHARS))
+    except Exception as e:
+        print(f"Error during long text analysis: {str(e)}")
+        return None
+
+    return result
+
 def secure_text_similarity(text1: str, text2: str, nlp_model=None) -> Optional[float]:
     """
     Securely computes similarity between two texts
@@ -264,8 +1195,8 @@ def secure_text_similarity(text1: str, text2: str, nlp_model=None) -> Optional[f
     
     try:
         if nlp_model:
-            doc1 = nlp_model(text1)
-            doc2 = nlp_model(text2)
+            doc1 = parse_text_cached(text1, nlp_model)
+            doc2 = parse_text_cached(text2, nlp_model)
             similarity = doc1.similarity(doc2)
             return float(similarity)
         else:
@@ -287,6 +1218,251 @@ def secure_text_similarity(text1: str, text2: str, nlp_model=None) -> Optional[f
         print(f"Error during text similarity calculation: {str(e)}")
         return None
 
+# Corpus similarity search. With a spaCy model, documents are embedded once
+# (doc.vector) into an L2-normalized matrix so a batch of queries is a single
+# matrix product; without one, MinHash signatures over NLTK tokens estimate
+# Jaccard similarity and LSH banding narrows the candidates.
+SIMILARITY_INDEX_METHODS = ('vector', 'minhash')
+_MINHASH_PRIME = 4294967291  # Largest prime below 2**32
+
+def _similarity_tokens(text: str) -> set:
+    from nltk.tokenize import word_tokenize
+    return set(word_tokenize(text.lower()))
+
+class TextSimilarityIndex:
+    """
+    Top-k nearest-neighbour index over a corpus of texts
+    """
+
+    def __init__(self, nlp_model=None, method: Optional[str] = None,
+                 num_perm: int = 128, bands: int = 32, seed: int = 1):
+        method = method or ('vector' if nlp_model else 'minhash')
+        if method not in SIMILARITY_INDEX_METHODS:
+            raise ValueError(f"Unknown method: {method}. Valid: {', '.join(SIMILARITY_INDEX_METHODS)}")
+        if method == 'vector' and nlp_model is None:
+            raise ValueError("The vector method requires a spaCy model")
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        import numpy as np
+
+        self.nlp_model = nlp_model
+        self.method = method
+        self.num_perm = num_perm
+        self.bands = bands
+        self.seed = seed
+        self.ids = []
+        self._positions = {}
+        self._matrix = None  # Rows beyond len(self.ids) are spare capacity
+        self._buckets = [{} for _ in range(bands)] if method == 'minhash' else None
+
+        rng = np.random.default_rng(seed)
+        self._perm_a = rng.integers(1, _MINHASH_PRIME, size=num_perm, dtype=np.uint64)
+        self._perm_b = rng.integers(0, _MINHASH_PRIME, size=num_perm, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _minhash_signature(self, tokens: set):
+        import numpy as np
+
+        signature = np.full(self.num_perm, _MINHASH_PRIME, dtype=np.uint64)
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(token.encode('utf-8', 'surrogatepass'), digest_size=4).digest(), 'little')
+             for token in tokens),
+            dtype=np.uint64, count=len(tokens)) % _MINHASH_PRIME
+        # a, b and the hashes are all below the 32-bit prime, so a * hash + b
+        # stays below 2**64
+        for start in range(0, len(hashes), 4096):
+            block = hashes[start:start + 4096, None]
+            permuted = (block * self._perm_a + self._perm_b) % _MINHASH_PRIME
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+
+    def _embed(self, texts: Iterable[str], batch_size: int, n_process: int) -> Iterator[Any]:
+        import numpy as np
+
+        if self.method == 'minhash':
+            for text in texts:
+                yield self._minhash_signature(_similarity_tokens(text))
+            return
+
+        # doc.vector comes from static vectors or the tok2vec tensor
+        disable = [name for name in self.nlp_model.pipe_names if name != 'tok2vec']
+        for doc in self.nlp_model.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable):
+            vector = np.asarray(doc.vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            yield vector / norm if norm > 0 else vector
+
+    def _append(self, doc_id: str, row):
+        import numpy as np
+
+        count = len(self.ids)
+        if self._matrix is None:
+            self._matrix = np.empty((64, row.shape[0]), dtype=row.dtype)
+        elif count == self._matrix.shape[0]:
+            # Grow geometrically so appends stay amortized O(1)
+            grown = np.empty((count * 2, self._matrix.shape[1]), dtype=self._matrix.dtype)
+            grown[:count] = self._matrix[:count]
+            self._matrix = grown
+        self._matrix[count] = row
+        self._positions[doc_id] = count
+        self.ids.append(doc_id)
+
+        if self._buckets is not None:
+            self._bucket_insert(count, row)
+
+    def _band_keys(self, signature) -> Iterator[tuple]:
+        rows = self.num_perm // self.bands
+        for band in range(self.bands):
+            yield band, signature[band * rows:(band + 1) * rows].tobytes()
+
+    def _bucket_insert(self, position: int, signature):
+        for band, key in self._band_keys(signature):
+            self._buckets[band].setdefault(key, []).append(position)
+
+    def add_batch(self, items: Iterable[tuple], batch_size: int = 256, n_process: int = 1) -> int:
+        """
+        Indexes (doc_id, text) pairs, embedding texts in batches; returns the
+        number of documents added
+        """
+        accepted = []
+        pending_ids = set()
+        for doc_id, text in items:
+            doc_id = str(doc_id)
+            if doc_id in self._positions or doc_id in pending_ids:
+                print(f"Duplicate document id: {doc_id}")
+                continue
+            if validate_text_input(text):
+                accepted.append((doc_id, text))
+                pending_ids.add(doc_id)
+
+        rows = self._embed((text for _, text in accepted), batch_size, n_process)
+        for (doc_id, _), row in zip(accepted, rows):
+            self._append(doc_id, row)
+        return len(accepted)
+
+    def add(self, doc_id: str, text: str) -> bool:
+        """
+        Indexes a single document
+        """
+        return self.add_batch([(doc_id, text)]) == 1
+
+    def _top_k(self, scores, k: int, positions=None) -> List[Dict[str, Any]]:
+        import numpy as np
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        if positions is not None:
+            top_positions = positions[top]
+        else:
+            top_positions = top
+        return [{'id': self.ids[position], 'score': float(scores[index])}
+                for index, position in zip(top, top_positions)]
+
+    def query_batch(self, texts: Iterable[str], k: int = 10, batch_size: int = 256,
+                    n_process: int = 1) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        Finds the k most similar indexed documents for each text (None for
+        texts that fail validation)
+        """
+        import numpy as np
+
+        texts = list(texts)
+        results = [None] * len(texts)
+        valid = [index for index, text in enumerate(texts) if validate_text_input(text)]
+        if not valid:
+            return results
+        if not self.ids or k < 1:
+            for index in valid:
+                results[index] = []
+            return results
+
+        count = len(self.ids)
+        rows = self._embed((texts[index] for index in valid), batch_size, n_process)
+
+        if self.method == 'vector':
+            matrix = self._matrix[:count]
+            # Score queries in blocks to bound the size of the score matrix
+            block_size = max(1, min(256, 4000000 // count))
+            pending = []
+            for index, row in zip(valid, rows):
+                pending.append((index, row))
+                if len(pending) == block_size:
+                    self._score_vector_block(pending, matrix, k, results)
+                    pending = []
+            if pending:
+                self._score_vector_block(pending, matrix, k, results)
+            return results
+
+        for index, signature in zip(valid, rows):
+            candidates = set()
+            for band, key in self._band_keys(signature):
+                candidates.update(self._buckets[band].get(key, ()))
+            if not candidates:
+                results[index] = []
+                continue
+            positions = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+            scores = (self._matrix[positions] == signature).mean(axis=1)
+            results[index] = self._top_k(scores, k, positions)
+        return results
+
+    def _score_vector_block(self, pending: List[tuple], matrix, k: int, results: List[Any]):
+        import numpy as np
+
+        queries = np.stack([row for _, row in pending])
+        scores = queries @ matrix.T
+        for (index, _), row_scores in zip(pending, scores):
+            results[index] = self._top_k(row_scores, k)
+
+    def query(self, text: str, k: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """
+        Finds the k most similar indexed documents for a text
+        """
+        return self.query_batch([text], k=k)[0]
+
+    def save(self, path: str):
+        """
+        Writes the index to an .npz file
+        """
+        import numpy as np
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        count = len(self.ids)
+        matrix = self._matrix[:count] if self._matrix is not None else np.empty((0, 0), dtype=np.float32)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, method=np.array(self.method), ids=np.array(self.ids, dtype=str), matrix=matrix,
+                     params=np.array([self.num_perm, self.bands, self.seed], dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, nlp_model=None) -> 'TextSimilarityIndex':
+        """
+        Reads an index written by save; vector indexes need the same spaCy
+        model to embed queries
+        """
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as data:
+            num_perm, bands, seed = (int(value) for value in data['params'])
+            index = cls(nlp_model, method=str(data['method']), num_perm=num_perm, bands=bands, seed=seed)
+            ids = [str(doc_id) for doc_id in data['ids']]
+            matrix = data['matrix']
+
+        if ids:
+            index._matrix = matrix.copy()
+            index.ids = ids
+            index._positions = {doc_id: position for position, doc_id in enumerate(ids)}
+            if index._buckets is not None:
+                for position in range(len(ids)):
+                    index._bucket_insert(position, matrix[position])
+        return index
+
 def clean_text_for_nlp(text: str) -> str:
     """
     Cleans text for NLP processing, removing potential security issues
@@ -294,38 +1470,22 @@ def clean_text_for_nlp(text: str) -> str:
     if not isinstance(text, str):
         return ""
     
-    # Remove potential code injection patterns
-    cleaned_text = re.sub(r'<script[^>]*>.*?</script>', '', text, flags=re.IGNORECASE)
-    cleaned_text = re.sub(r'javascript:\s*\w+', '', cleaned_text, flags=re.IGNORECASE)
-    cleaned_text = re.sub(r'vbscript:\s*\w+', '', cleaned_text, flags=re.IGNORECASE)
-    
-    # Remove other potentially dangerous patterns
-    cleaned_text = re.sub(r'on\w+\s*=\s*["\'][^"\']*["\']', '', cleaned_text, flags=re.IGNORECASE)
-    
-    return cleaned_text
+    # Remove script blocks, script URLs and quoted event handlers
+    return scan_text_security(text, clean=True)['cleaned_text']
 
 def analyze_text_security(text: str) -> Dict[str, Any]:
     """
     Analyzes text for potential security issues
     """
-    analysis = {
-        'length': len(text),
-        'has_scripts': bool(re.search(r'<script[^>]*>.*?</script>', text, re.IGNORECASE)),
-        'has_javascript_urls': bool(re.search(r'javascript:\s*\w+', text, re.IGNORECASE)),
-        'has_event_handlers': bool(re.search(r'on\w+\s*=\s*["\'][^"\']*["\']', text, re.IGNORECASE)),
-        'has_iframes': bool(re.search(r'<iframe[^>]*>.*?</iframe>', text, re.IGNORECASE)),
-        'is_safe': True
+    analysis = scan_text_security(text)
+    return {
+        'length': analysis['length'],
+        'has_scripts': analysis['has_scripts'],
+        'has_javascript_urls': analysis['has_javascript_urls'],
+        'has_event_handlers': analysis['has_event_handlers'],
+        'has_iframes': analysis['has_iframes'],
+        'is_safe': analysis['is_safe']
     }
-    
-    # Determine if text is safe
-    analysis['is_safe'] = not (
-        analysis['has_scripts'] or 
-        analysis['has_javascript_urls'] or 
-        analysis['has_event_handlers'] or 
-        analysis['has_iframes']
-    )
-    
-    return analysis
 
 def main():
     """
@@ -338,7 +1498,7 @@ def main():
     nlp_model = initialize_nlp_models()
     
     if nlp_model:
-        print("spaCy model loaded successfully")
+        print(f"spaCy model loaded successfully ({get_model_load_times()})")
     else:
         print("spaCy model not available - using NLTK fallbacks where possible")
     
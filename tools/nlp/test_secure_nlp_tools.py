@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Tests for the secure NLP tools
+Run with: python -m pytest tools/nlp/test_secure_nlp_tools.py
+"""
+
+import os
+import random
+import re
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+secure_nlp_tools = pytest.importorskip("secure_nlp_tools")
+spacy = pytest.importorskip("spacy")
+from spacy.language import Language
+
+
+# Stand-ins for a trained pipeline's tagger and parser, which count how many
+# documents they process
+component_calls = Counter()
+
+
+@Language.component("test_tagger")
+def fake_tagger(doc):
+    component_calls['tagger'] += 1
+    for token in doc:
+        if not token.is_alpha:
+            token.pos_ = 'PUNCT'
+        elif token.is_stop:
+            token.pos_ = 'DET'
+        else:
+            token.pos_ = 'PROPN' if token.text[0].isupper() else 'NOUN'
+    return doc
+
+
+@Language.component("test_parser")
+def fake_parser(doc):
+    component_calls['parser'] += 1
+    for token in doc:
+        token.dep_ = 'ROOT'
+    return doc
+
+
+def build_pipeline():
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    nlp.add_pipe('test_tagger', name='tagger')
+    nlp.add_pipe('test_parser', name='parser')
+    ruler = nlp.add_pipe('entity_ruler')
+    ruler.add_patterns([{'label': 'ORG', 'pattern': 'Acme'}, {'label': 'GPE', 'pattern': 'Paris'}])
+    return nlp
+
+
+@pytest.fixture
+def nlp():
+    secure_nlp_tools.clear_document_cache()
+    pipeline = build_pipeline()
+    component_calls.clear()  # The entity ruler parses its phrase patterns
+    yield pipeline
+    secure_nlp_tools.clear_document_cache()
+
+
+ARTICLE = ("Acme builds rockets in Paris. The rockets launch every week. "
+           "Engineers test engines before each launch. Weather delays are rare.")
+
+
+# The per-pattern checks the single-pass scanner replaced
+def legacy_validates(text: str) -> bool:
+    return not any(re.search(pattern, text, re.IGNORECASE)
+                   for pattern in (r'<script[^>]*>.*?</script>', r'javascript:', r'on\w+\s*='))
+
+
+def legacy_clean(text: str) -> str:
+    cleaned_text = re.sub(r'<script[^>]*>.*?</script>', '', text, flags=re.IGNORECASE)
+    cleaned_text = re.sub(r'javascript:\s*\w+', '', cleaned_text, flags=re.IGNORECASE)
+    cleaned_text = re.sub(r'vbscript:\s*\w+', '', cleaned_text, flags=re.IGNORECASE)
+    return re.sub(r'on\w+\s*=\s*["\'][^"\']*["\']', '', cleaned_text, flags=re.IGNORECASE)
+
+
+def legacy_analysis(text: str) -> dict:
+    analysis = {
+        'length': len(text),
+        'has_scripts': bool(re.search(r'<script[^>]*>.*?</script>', text, re.IGNORECASE)),
+        'has_javascript_urls': bool(re.search(r'javascript:\s*\w+', text, re.IGNORECASE)),
+        'has_event_handlers': bool(re.search(r'on\w+\s*=\s*["\'][^"\']*["\']', text, re.IGNORECASE)),
+        'has_iframes': bool(re.search(r'<iframe[^>]*>.*?</iframe>', text, re.IGNORECASE)),
+    }
+    analysis['is_safe'] = not (analysis['has_scripts'] or analysis['has_javascript_urls'] or
+                               analysis['has_event_handlers'] or analysis['has_iframes'])
+    return analysis
+
+
+FRAGMENTS = ['<script>', '</script>', '<SCRIPT type="x">', '<iframe src=a>', '</iframe>',
+             'javascript:', 'JavaScript: go', 'vbscript:', 'vbscript:run', 'onclick=', 'onload = ',
+             '"x"', "'y'", 'on', 'error=', '<a href="', '">', ' ', 'alert(1)', 'text', '<', '>',
+             'scr', 'ipt', ':', '=', '\t']
+
+
+def fuzzed_texts(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 12)))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('<a href="javascript:<script></script>alert(1)">x</a>', '<a href="(1)">x</a>'),
+    ('<img on<script></script>error="alert(1)">', '<img >'),
+    ('<scr<script></script>ipt>alert(1)</script>', ''),
+])
+def test_cleaning_does_not_rejoin_payloads(text, expected):
+    cleaned = secure_nlp_tools.clean_text_for_nlp(text)
+    assert cleaned == expected
+    assert secure_nlp_tools.analyze_text_security(cleaned)['is_safe']
+
+
+@pytest.mark.parametrize("text", [
+    'Plain prose with no markup at all.',
+    'Before <script>alert(1)</script> after',
+    '<a href="javascript: alert(1)">link</a>',
+    '<body onload="init()">text</body>',
+    'Open vbscript:MsgBox now',
+    '<iframe src="x"></iframe> kept',
+])
+def test_cleaning_matches_per_pattern_regexes(text):
+    assert secure_nlp_tools.clean_text_for_nlp(text) == legacy_clean(text)
+
+
+def test_verdicts_match_per_pattern_regexes():
+    for text in fuzzed_texts(5000):
+        scan = secure_nlp_tools.scan_text_security(text)
+        assert scan['blocks_input'] == (not legacy_validates(text)), text
+        assert secure_nlp_tools.analyze_text_security(text) == legacy_analysis(text), text
+
+
+def test_cleaned_text_has_nothing_left_to_remove():
+    for text in fuzzed_texts(5000, seed=1):
+        cleaned = secure_nlp_tools.clean_text_for_nlp(text)
+        analysis = legacy_analysis(cleaned)
+        assert not (analysis['has_scripts'] or analysis['has_javascript_urls'] or
+                    analysis['has_event_handlers']), (text, cleaned)
+        assert not re.search(r'vbscript:\s*\w+', cleaned, re.IGNORECASE), (text, cleaned)
+
+
+def test_unterminated_script_tags_scan_in_linear_time():
+    text = '<script>' * 20000
+    scan = secure_nlp_tools.scan_text_security(text, clean=True)
+    assert not scan['has_scripts']
+    assert scan['cleaned_text'] == text
+
+
+def test_session_parses_once(nlp):
+    session = secure_nlp_tools.NLPAnalysisSession(ARTICLE, nlp)
+    results = session.analyze(max_keywords=4, summary_length=70, include_sentiment=False)
+
+    assert component_calls['tagger'] == 1
+    assert results['tokens'][:6] == ['Acme', 'builds', 'rockets', 'in', 'Paris', '.']
+    assert ('Acme', 'PROPN') in results['pos_tags']
+    assert [(entity['text'], entity['label'], entity['start']) for entity in results['entities']] == [
+        ('Acme', 'ORG', 0), ('Paris', 'GPE', 23)]
+    assert results['keywords'] == ['acme', 'builds', 'rockets', 'paris']
+    assert len(results['summary']) <= 70
+    assert 'sentiment' not in results
+
+    # The standalone functions reuse the session's parse
+    assert secure_nlp_tools.secure_keyword_extraction(ARTICLE, nlp, max_keywords=4) == results['keywords']
+    assert secure_nlp_tools.secure_named_entity_recognition(ARTICLE, nlp) == results['entities']
+    assert component_calls['tagger'] == 1
+
+
+def test_session_rejects_invalid_text_without_parsing(nlp):
+    session = secure_nlp_tools.NLPAnalysisSession('<script>alert(1)</script>', nlp)
+    assert not session.is_valid
+    assert session.analyze() is None
+    assert session.tokens() is None
+    assert session.doc is None
+    assert component_calls['tagger'] == 0
+
+
+BATCH_TEXTS = ['<script>x</script>', ARTICLE, 'Paris hosts Acme.', 'javascript: go', 'Rockets fly.',
+               '<iframe></iframe><script></script>']
+
+
+def test_batch_keeps_input_order_with_none_for_invalid_texts(nlp):
+    results = list(secure_nlp_tools.process_texts_batch(iter(BATCH_TEXTS), nlp, ('tokens',), batch_size=2))
+    assert [result is None for result in results] == [True, False, False, True, False, True]
+    assert results[2] == {'tokens': ['Paris', 'hosts', 'Acme', '.']}
+    assert results[4] == {'tokens': ['Rockets', 'fly', '.']}
+
+
+def test_batch_tokens_disable_every_component(nlp):
+    assert secure_nlp_tools.components_to_disable(nlp, ('tokens',)) == nlp.pipe_names
+    assert secure_nlp_tools.secure_tokenize_batch(BATCH_TEXTS[1:3], nlp) == [
+        secure_nlp_tools.secure_tokenize(text, nlp) for text in BATCH_TEXTS[1:3]]
+    # Only the standalone calls ran the tagger
+    assert component_calls['tagger'] == 2
+
+
+def test_batch_runs_only_the_components_outputs_need(nlp):
+    assert secure_nlp_tools.components_to_disable(nlp, ('keywords',)) == ['sentencizer', 'entity_ruler']
+    assert secure_nlp_tools.components_to_disable(nlp, ('entities',)) == ['sentencizer', 'tagger', 'parser']
+
+    entities = secure_nlp_tools.secure_named_entity_recognition_batch(BATCH_TEXTS, nlp)
+    assert component_calls['tagger'] == 0
+    assert [None if found is None else [entity['text'] for entity in found] for found in entities] == [
+        None, ['Acme', 'Paris'], ['Paris', 'Acme'], None, [], None]
+
+    results = list(secure_nlp_tools.process_texts_batch(
+        BATCH_TEXTS, nlp, ('keywords', 'summary'), max_keywords=3, summary_length=40))
+    assert component_calls['tagger'] == component_calls['parser'] == 3
+    assert results[2] == {'keywords': ['paris', 'hosts', 'acme'], 'summary': 'Paris hosts Acme.'}
+    assert len(results[1]['summary']) <= 40
+    assert results[1]['keywords'] == secure_nlp_tools.secure_keyword_extraction(ARTICLE, nlp, max_keywords=3)
+
+
+def test_batch_rejects_unknown_outputs():
+    with pytest.raises(ValueError):
+        secure_nlp_tools.components_to_disable(spacy.blank('en'), ('tokens', 'translation'))
+
+
+@pytest.fixture
+def model_registry(monkeypatch):
+    monkeypatch.setattr(secure_nlp_tools, '_model_registry', {})
+    monkeypatch.setattr(secure_nlp_tools, '_model_load_times', {})
+
+
+@pytest.fixture
+def saved_pipeline(tmp_path, nlp):
+    path = tmp_path / 'pipeline'
+    nlp.to_disk(path)
+    return str(path)
+
+
+def test_models_load_once_per_component_selection(model_registry, saved_pipeline):
+    full = secure_nlp_tools.get_nlp_model(saved_pipeline)
+    assert full.pipe_names == ['sentencizer', 'tagger', 'parser', 'entity_ruler']
+    assert secure_nlp_tools.get_nlp_model(saved_pipeline) is full
+
+    tagger_only = secure_nlp_tools.get_nlp_model(saved_pipeline, components=['tagger'])
+    assert tagger_only.pipe_names == ['tagger']
+    assert tagger_only is not full
+    assert secure_nlp_tools.get_nlp_model(saved_pipeline, components=('tagger',)) is tagger_only
+
+    load_times = secure_nlp_tools.get_model_load_times()
+    assert set(load_times) == {saved_pipeline, f"{saved_pipeline}[tagger]"}
+    assert all(seconds >= 0 for seconds in load_times.values())
+
+
+def test_models_load_the_components_outputs_need(model_registry, saved_pipeline):
+    ner = secure_nlp_tools.get_nlp_model(saved_pipeline, outputs=('entities',))
+    assert ner.pipe_names == ['entity_ruler']
+    assert [ent.text for ent in ner('Acme opened in Paris.').ents] == ['Acme', 'Paris']
+    assert secure_nlp_tools.get_nlp_model(saved_pipeline, outputs=('tokens',)).pipe_names == []
+
+    with pytest.raises(ValueError):
+        secure_nlp_tools.get_nlp_model(saved_pipeline, outputs=('translation',))
+
+
+def test_missing_models_are_remembered(model_registry, tmp_path):
+    missing = str(tmp_path / 'missing')
+    assert secure_nlp_tools.get_nlp_model(missing) is None
+    assert secure_nlp_tools._model_registry == {(missing, None): None}
+    assert secure_nlp_tools.get_model_load_times() == {}
+
+
+LONG_TEXT = '\n\n'.join(f"Paragraph {number}. Acme ships rockets to Paris. Crews inspect every rocket."
+                        for number in range(40))
+
+
+@pytest.mark.parametrize("max_chars", [2, 17, 60, 200, 5000])
+def test_chunks_cover_the_text_contiguously(max_chars):
+    chunks = list(secure_nlp_tools.split_text_chunks(LONG_TEXT, max_chars))
+    assert ''.join(chunk for _, chunk in chunks) == LONG_TEXT
+    assert all(0 < len(chunk) <= max_chars for _, chunk in chunks)
+    assert all(LONG_TEXT[offset:offset + len(chunk)] == chunk for offset, chunk in chunks)
+
+
+def test_chunks_end_at_paragraphs_then_sentences():
+    chunks = [chunk for _, chunk in secure_nlp_tools.split_text_chunks(LONG_TEXT, 200)]
+    assert all(chunk.endswith('\n\n') for chunk in chunks[:-1])
+
+    text = 'One sentence here. Another sentence follows. ' * 20
+    chunks = [chunk for _, chunk in secure_nlp_tools.split_text_chunks(text, 100)]
+    assert all(chunk.endswith('. ') for chunk in chunks)
+
+    with pytest.raises(ValueError):
+        list(secure_nlp_tools.split_text_chunks(text, 1))
+
+
+def test_long_text_results_refer_to_the_original_text(nlp):
+    result = secure_nlp_tools.analyze_long_text(LONG_TEXT, nlp, outputs=('entities', 'keywords'),
+                                                chunk_chars=300, max_keywords=3)
+    assert result['length'] == len(LONG_TEXT)
+    assert result['chunks'] == component_calls['tagger'] > 1
+    assert len(result['entities']) == 80
+    assert all(LONG_TEXT[entity['start']:entity['end']] == entity['text'] for entity in result['entities'])
+    # Each word counts as a token and as a noun chunk; ties keep text order
+    assert result['keywords'] == ['paragraph', 'acme', 'ships']
+    assert result['keyword_scores'] == {'paragraph': 80, 'acme': 80, 'ships': 80}
+
+
+def test_long_text_is_validated_as_a_whole(nlp):
+    assert secure_nlp_tools.analyze_long_text(LONG_TEXT + '<script>x</script>', nlp) is None
+    assert secure_nlp_tools.analyze_long_text('x' * 200, nlp, max_length=100) is None
+    with pytest.raises(ValueError):
+        secure_nlp_tools.analyze_long_text(LONG_TEXT, nlp, outputs=('summary',))
+    assert component_calls['tagger'] == 0
+
+
+@Language.component("test_tok2vec")
+def fake_tok2vec(doc):
+    # Hashed bag-of-words vectors stand in for a model's embeddings
+    import numpy as np
+
+    vector = np.zeros(64, dtype=np.float32)
+    for token in doc:
+        if token.is_alpha:
+            vector[int(secure_nlp_tools._text_digest(token.lower_), 16) % 64] += 1
+    doc.user_hooks['vector'] = lambda doc: vector
+    return doc
+
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    # Whitespace tokens keep the MinHash tests independent of NLTK data
+    monkeypatch.setattr(secure_nlp_tools, '_similarity_tokens', lambda text: set(text.lower().split()))
+
+
+def corpus(count: int):
+    rng = random.Random(3)
+    words = [f"word{number}" for number in range(500)]
+    return [(f"doc-{number}", ' '.join(rng.sample(words, 30))) for number in range(count)]
+
+
+def test_minhash_index_finds_near_duplicates(word_tokens, tmp_path):
+    documents = corpus(150)
+    index = secure_nlp_tools.TextSimilarityIndex()
+    assert index.method == 'minhash'
+    assert index.add_batch(documents + [('doc-0', 'duplicate id'), ('bad', '<script>x</script>')]) == 150
+    assert len(index) == 150
+    assert not index.add('doc-1', 'another duplicate id')
+
+    # Dropping 3 of 30 words keeps a Jaccard similarity of 0.9
+    near_duplicate = ' '.join(documents[42][1].split()[3:])
+    matches = index.query(near_duplicate, k=3)
+    assert matches[0]['id'] == 'doc-42'
+    assert matches[0]['score'] == pytest.approx(0.9, abs=0.1)
+    assert len(matches) <= 3
+
+    assert index.query_batch(['<script>x</script>', 'unrelated words entirely'], k=3) == [None, []]
+
+    index.save(tmp_path / 'index.npz')
+    loaded = secure_nlp_tools.TextSimilarityIndex.load(tmp_path / 'index.npz')
+    assert loaded.ids == index.ids
+    assert loaded.query(near_duplicate, k=3) == matches
+    assert loaded.add('doc-new', near_duplicate)
+    assert loaded.query(near_duplicate, k=1)[0] == {'id': 'doc-new', 'score': 1.0}
+
+
+def test_vector_index_ranks_by_cosine_similarity(nlp, tmp_path):
+    nlp.add_pipe('test_tok2vec', name='tok2vec', first=True)
+    index = secure_nlp_tools.TextSimilarityIndex(nlp)
+    assert index.method == 'vector'
+    index.add_batch([('rockets', 'Rockets launch from the pad'), ('bakery', 'Bread rises in the oven'),
+                     ('launch', 'The rockets launch every week')], batch_size=2)
+    # Only tok2vec runs to embed documents
+    assert component_calls['tagger'] == 0
+
+    matches = index.query('Rockets launch from the pad', k=2)
+    assert [match['id'] for match in matches] == ['rockets', 'launch']
+    assert matches[0]['score'] == pytest.approx(1.0)
+
+    index.save(tmp_path / 'vectors.npz')
+    loaded = secure_nlp_tools.TextSimilarityIndex.load(tmp_path / 'vectors.npz', nlp)
+    assert loaded.query('Rockets launch from the pad', k=2) == matches
+
+
+def test_similarity_index_rejects_bad_parameters():
+    with pytest.raises(ValueError):
+        secure_nlp_tools.TextSimilarityIndex(method='vector')
+    with pytest.raises(ValueError):
+        secure_nlp_tools.TextSimilarityIndex(num_perm=100, bands=32)
+    with pytest.raises(ValueError):
+        secure_nlp_tools.TextSimilarityIndex(method='exact')
+
+
+REPORT = ("Rocket engines need careful testing. "
+          "Engineers test rocket engines on a stand before launch. "
+          "The cafeteria serves soup on Fridays. "
+          "Every rocket engine test records thrust and temperature.")
+
+
+def test_textrank_keeps_the_central_sentences_in_order():
+    sentences = secure_nlp_tools._sentences_from(REPORT, None)
+    for method in ('textrank', 'tfidf'):
+        summary = secure_nlp_tools.secure_text_summarization(REPORT, max_length=120, method=method)
+        chosen = secure_nlp_tools._sentences_from(summary, None)
+        assert len(chosen) == 2
+        assert 'cafeteria' not in summary
+        assert chosen == [sentence for sentence in sentences if sentence in chosen]
+    assert secure_nlp_tools.secure_text_summarization(REPORT, max_length=40, method='lead') == (
+        "Rocket engines need careful testing.")
+
+
+def test_summaries_fit_the_length_budget():
+    assert secure_nlp_tools.secure_text_summarization(REPORT, max_length=len(REPORT)) == REPORT
+    for max_length in (10, 40, 100, 150):
+        assert len(secure_nlp_tools.secure_text_summarization(REPORT, max_length=max_length)) <= max_length
+    # Sentences made only of stop words fall back to leading sentences
+    assert secure_nlp_tools.secure_text_summarization("It is. So it was. And then.", max_length=10) == "It is."
+    assert secure_nlp_tools.secure_text_summarization(REPORT, method='abstractive') is None
+    assert secure_nlp_tools.secure_text_summarization('<script>x</script>') is None
+
+
+def test_fitted_summarizer_scores_batches_like_single_texts(nlp):
+    documents = [REPORT, ARTICLE, "Short text.", '<script>x</script>']
+    summarizer = secure_nlp_tools.ExtractiveSummarizer(method='tfidf').fit(documents)
+    summaries = summarizer.summarize_batch(documents, max_length=80, nlp_model=nlp)
+    assert summaries == [summarizer.summarize(text, max_length=80) for text in documents]
+    assert summaries[2] == "Short text."
+    assert summaries[3] is None
+
+    # Sentence splitting needs neither the tagger nor the entity ruler
+    assert component_calls['tagger'] == 0
+    assert component_calls['parser'] == 2
+
+    with pytest.raises(ValueError):
+        secure_nlp_tools.ExtractiveSummarizer(method='lead')
+
+
+def test_keyword_index_counts_each_document_once(nlp, tmp_path):
+    db_path = str(tmp_path / 'keywords.sqlite3')
+    with secure_nlp_tools.KeywordIndex(db_path) as index:
+        added = index.add_documents([(1, 'Rockets launch rockets.'), (2, 'Rockets reach Paris.'),
+                                     (2, 'Duplicate in the batch.'), (3, '<script>x</script>')], nlp)
+        assert added == 2
+        assert not index.add_document('1', 'Already indexed.', nlp)
+        assert index.add_document('4', 'Rockets carry satellites.', nlp)
+
+    with secure_nlp_tools.KeywordIndex(db_path) as index:
+        assert index.document_count == 3
+        # Document frequency counts documents, not occurrences
+        assert index._document_frequencies(['rockets', 'paris', 'launch', 'unseen']) == {
+            'rockets': 3, 'paris': 1, 'launch': 1}
+
+
+def test_keyword_index_ranks_rare_terms_first(nlp):
+    with secure_nlp_tools.KeywordIndex(':memory:') as index:
+        index.add_documents(enumerate(['Rockets launch daily.', 'Rockets need fuel.',
+                                       'Rockets reach orbit.', 'Paris hosts rockets.']), nlp)
+        text = 'Rockets leave Paris. Rockets return.'
+        # Unseen terms rank above rare ones, and those above the frequent
+        # 'rockets' despite its higher count in the text
+        expected = ['leave', 'return', 'paris', 'rockets']
+        assert index.extract(text, nlp, max_keywords=4) == expected
+
+        scored = index.extract(text, nlp, with_scores=True)
+        scores = [item['score'] for item in scored]
+        assert scores == sorted(scores, reverse=True)
+        assert index.extract_batch(['<script>x</script>', text], nlp, max_keywords=4) == [None, expected]
+        assert secure_nlp_tools.secure_keyword_extraction(text, nlp, max_keywords=4,
+                                                          keyword_index=index) == expected